@@ -1,37 +1,63 @@
 import os
 import inspect
-import gradio as gr
-from packaging.version import Version
-
-from src.webapp import app, CUSTOM_CSS, custom_css
 
 
 if __name__ == "__main__":
-    port = int(os.getenv("PORT", "7860"))
+    # Imports stay under the guard: RENDER_BACKEND=process spawns workers
+    # that re-import this module and must not build the UI.
+    from src import startup
 
-    launch_kwargs = dict(
-        server_name="0.0.0.0",
-        server_port=port,
-        css=(CUSTOM_CSS + "\n" + custom_css),
-    )
+    import gradio as gr
+    from packaging.version import Version
 
-    # ✅ Disable queue in a version-safe way (prevents launch() crash)
-    sig = inspect.signature(app.launch)
-    if "enable_queue" in sig.parameters:
-        launch_kwargs["enable_queue"] = False
-    elif "queue" in sig.parameters:
-        launch_kwargs["queue"] = False
+    startup.mark("import gradio")
 
-    # Gradio 6+ uses footer_links instead of show_api
-    if Version(gr.__version__) >= Version("6.0.0"):
-        launch_kwargs["footer_links"] = []
-    else:
-        launch_kwargs["show_api"] = False
+    from src.ingest import MAX_UPLOAD_MB
+    from src.webapp import app, CUSTOM_CSS, custom_css
 
-    app.launch(**launch_kwargs)
+    port = int(os.getenv("PORT", "7860"))
+    css = CUSTOM_CSS + "\n" + custom_css
+    # Oversized uploads are refused by the upload route, before they hit disk
+    max_file_size = f"{MAX_UPLOAD_MB}mb"
 
+    if Version(gr.__version__) >= Version("6.0.0"):
+        # Gradio mounted on our own FastAPI app, so the platform health
+        # check gets a route that never touches the UI (/ renders the
+        # whole page config and used to be what Fly polled).
+        import uvicorn
+        from fastapi import FastAPI
 
+        server = FastAPI()
 
+        @server.get("/healthz")
+        def healthz():
+            return {"ok": True, "uptime_s": round(startup.elapsed_s(), 1), "startup": startup.breakdown()}
 
+        server = gr.mount_gradio_app(server, app, path="/", css=css, footer_links=[],
+                                    max_file_size=max_file_size)
+        startup.mark("mount")
+        print(startup.report(), flush=True)
 
+        uvicorn.run(server, host="0.0.0.0", port=port)
+    else:
+        launch_kwargs = dict(
+            server_name="0.0.0.0",
+            server_port=port,
+            css=css,
+        )
+
+        # ✅ Disable queue in a version-safe way (prevents launch() crash)
+        sig = inspect.signature(app.launch)
+        if "enable_queue" in sig.parameters:
+            launch_kwargs["enable_queue"] = False
+        elif "queue" in sig.parameters:
+            launch_kwargs["queue"] = False
+
+        if "max_file_size" in sig.parameters:
+            launch_kwargs["max_file_size"] = max_file_size
+
+        # Older Gradio: no /healthz (health checks fall back to /)
+        launch_kwargs["show_api"] = False
 
+        print(startup.report(), flush=True)
+        app.launch(**launch_kwargs)
@@ -0,0 +1,328 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+
+import httpx
+
+# ---------------------------------------------------------
+# Job queue: runners pull work instead of having it pushed
+#
+# Producers enqueue() jobs; any number of runners lease() the oldest
+# ready job, heartbeat() while it runs and finish it with ack() (done,
+# or failed for good with an error) or release() (back to the queue).
+# A lease that isn't renewed within lease_s expires and the job is
+# leased again by the next runner that asks, so a runner that dies
+# mid-job loses nothing. Every lease carries a fresh token; heartbeats,
+# acks and releases with a stale token are refused (returns False /
+# None), so a runner that lost its lease can't overwrite the new
+# holder's outcome.
+#
+# Attempts are counted per lease. A release with an error (or an
+# expired lease) that used up QUEUE_MAX_ATTEMPTS fails the job; a
+# release without an error (runner shutting down) gives the attempt
+# back. Failed retries wait QUEUE_RETRY_BASE_S * 2^(attempt-1).
+# Nobody runs a job whose last lease expired, so lease() hands the jobs
+# it fails that way to on_expired (after the commit): the host tells
+# their producers.
+#
+# Two implementations with the same methods:
+#   SQLiteJobQueue  one SQLite file (WAL), shared by every process on
+#                   the machine; the runner hosting it serves it over
+#                   /queue/* for runners elsewhere (main.py)
+#   HttpJobQueue    client for those /queue/* endpoints
+# Both are blocking; call them off the event loop.
+# ---------------------------------------------------------
+LEASE_S = float(os.getenv("LEASE_S", "60"))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))
+QUEUE_RETRY_BASE_S = float(os.getenv("QUEUE_RETRY_BASE_S", "5"))
+
+QUEUED, LEASED, DONE, FAILED, CANCELLED = "queued", "leased", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+@dataclass(frozen=True)
+class Lease:
+    job_id: str
+    token: str
+    runner_id: str
+    attempt: int
+    expires_at: float
+    job: dict
+
+
+def retry_delay(attempt: int) -> float:
+    return QUEUE_RETRY_BASE_S * 2 ** max(0, attempt - 1)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    job TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_token TEXT,
+    runner_id TEXT,
+    lease_expires_at REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at);
+CREATE INDEX IF NOT EXISTS jobs_leased ON jobs (status, lease_expires_at);
+"""
+
+
+class SQLiteJobQueue:
+    """The queue in one SQLite file. Safe across threads and processes."""
+
+    def __init__(self, path: str, max_attempts: int = QUEUE_MAX_ATTEMPTS, on_expired=None):
+        """on_expired(jobs): jobs failed by an expired lease, [{"job_id", "job", "attempts"}]."""
+        self.path = path
+        self.max_attempts = max_attempts
+        self.on_expired = on_expired
+        self._lock = threading.Lock()
+        # Autocommit mode: every write below is one explicit IMMEDIATE transaction
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def _write(self, fn):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._db, time.time())
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return out
+
+    def enqueue(self, job: dict, delay_s: float = 0.0) -> str:
+        """Add a job (keyed by job["job_id"]; enqueueing the same id twice is a no-op)."""
+        job_id = str(job.get("job_id") or uuid.uuid4())
+        job = dict(job, job_id=job_id)
+
+        def op(db, now):
+            db.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, job, status, available_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, json.dumps(job, separators=(",", ":")), QUEUED, now + delay_s, now, now),
+            )
+            return job_id
+
+        return self._write(op)
+
+    def _expire_leases(self, db, now: float) -> list[dict]:
+        """Re-queue expired leases (or fail them, out of attempts). Returns the failed jobs."""
+        failed = db.execute(
+            "SELECT job_id, job, attempts FROM jobs WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+            (LEASED, now, self.max_attempts),
+        ).fetchall()
+        db.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+            " error = CASE WHEN attempts >= ? THEN 'lease expired' ELSE error END,"
+            " lease_token = NULL, available_at = ?, updated_at = ?"
+            " WHERE status = ? AND lease_expires_at < ?",
+            (self.max_attempts, FAILED, QUEUED, self.max_attempts, now, now, LEASED, now),
+        )
+        return [{"job_id": r["job_id"], "job": json.loads(r["job"]), "attempts": r["attempts"]} for r in failed]
+
+    def lease(self, runner_id: str, lease_s: float = LEASE_S) -> Lease | None:
+        """Oldest ready job, leased to runner_id for lease_s (None if nothing is ready)."""
+        expired = []
+
+        def op(db, now):
+            expired.extend(self._expire_leases(db, now))
+            row = db.execute(
+                "SELECT job_id, job, attempts FROM jobs WHERE status = ? AND available_at <= ?"
+                " ORDER BY available_at, created_at LIMIT 1",
+                (QUEUED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            token = uuid.uuid4().hex
+            db.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_token = ?, runner_id = ?,"
+                " lease_expires_at = ?, updated_at = ? WHERE job_id = ?",
+                (LEASED, token, runner_id, now + lease_s, now, row["job_id"]),
+            )
+            return Lease(row["job_id"], token, runner_id, row["attempts"] + 1, now + lease_s, json.loads(row["job"]))
+
+        lease = self._write(op)
+        if expired and self.on_expired:
+            self.on_expired(expired)
+        return lease
+
+    def heartbeat(self, lease: Lease, lease_s: float = LEASE_S) -> bool:
+        """Extend the lease. False = lost (expired and re-leased, finished or cancelled): stop working."""
+
+        def op(db, now):
+            cur = db.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ?"
+                " WHERE job_id = ? AND lease_token = ? AND status = ?",
+                (now + lease_s, now, lease.job_id, lease.token, LEASED),
+            )
+            return cur.rowcount == 1
+
+        return self._write(op)
+
+    def ack(self, lease: Lease, result: dict | None = None, error: str | None = None) -> bool:
+        """Finish the job: done with result, or failed for good with error (no retry)."""
+
+        def op(db, now):
+            cur = db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_token = NULL, updated_at = ?"
+                " WHERE job_id = ? AND lease_token = ? AND status = ?",
+                (FAILED if error else DONE, json.dumps(result) if result is not None else None, error, now,
+                 lease.job_id, lease.token, LEASED),
+            )
+            return cur.rowcount == 1
+
+        return self._write(op)
+
+    def release(self, lease: Lease, error: str | None = None, delay_s: float | None = None) -> str | None:
+        """
+        Give the job back. With an error it is retried after a backoff
+        (or fails once attempts are used up); without one the attempt
+        doesn't count. Returns the job's new status (None = lease lost).
+        """
+
+        def op(db, now):
+            row = db.execute(
+                "SELECT attempts FROM jobs WHERE job_id = ? AND lease_token = ? AND status = ?",
+                (lease.job_id, lease.token, LEASED),
+            ).fetchone()
+            if row is None:
+                return None
+            attempts = row["attempts"] if error else row["attempts"] - 1
+            status = FAILED if error and attempts >= self.max_attempts else QUEUED
+            delay = delay_s if delay_s is not None else retry_delay(attempts) if error else 0.0
+            db.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, error = ?, lease_token = NULL,"
+                " available_at = ?, updated_at = ? WHERE job_id = ?",
+                (status, attempts, error, now + delay, now, lease.job_id),
+            )
+            return status
+
+        return self._write(op)
+
+    def cancel(self, job_id: str) -> str | None:
+        """Cancel a queued or leased job (the holder's next heartbeat fails). Returns the status."""
+
+        def op(db, now):
+            db.execute(
+                "UPDATE jobs SET status = ?, lease_token = NULL, updated_at = ? WHERE job_id = ? AND status IN (?, ?)",
+                (CANCELLED, now, job_id, QUEUED, LEASED),
+            )
+            row = db.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            return row["status"] if row else None
+
+        return self._write(op)
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT job_id, status, attempts, runner_id, lease_expires_at, result, error, created_at, updated_at"
+                " FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        out = dict(row)
+        out["result"] = json.loads(out["result"]) if out["result"] else None
+        return out
+
+    def stats(self) -> dict:
+        """Jobs per status, plus how many are ready now and the oldest ready job's wait."""
+        now = time.time()
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            ready, oldest = self._db.execute(
+                "SELECT COUNT(*), MIN(available_at) FROM jobs WHERE status = ? AND available_at <= ?",
+                (QUEUED, now),
+            ).fetchone()
+        out = {status: counts.get(status, 0) for status in (QUEUED, LEASED, *FINISHED)}
+        out["ready"] = ready
+        out["oldest_ready_s"] = round(now - oldest, 3) if oldest else 0.0
+        return out
+
+    def purge(self, older_than_s: float) -> int:
+        """Drop finished jobs not touched for older_than_s. Returns how many."""
+
+        def op(db, now):
+            cur = db.execute(
+                f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED))}) AND updated_at < ?",
+                (*FINISHED, now - older_than_s),
+            )
+            return cur.rowcount
+
+        return self._write(op)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class HttpJobQueue:
+    """Same methods over the /queue/* endpoints of the runner that hosts the SQLite queue."""
+
+    def __init__(self, base_url: str, token: str, timeout: float = 10.0):
+        self.base_url = base_url.rstrip("/")
+        self._client = httpx.Client(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {token}"} if token else {},
+            timeout=timeout,
+        )
+
+    def _post(self, path: str, body: dict) -> dict:
+        r = self._client.post(path, json=body)
+        r.raise_for_status()
+        return r.json()
+
+    def enqueue(self, job: dict, delay_s: float = 0.0) -> str:
+        return self._post("/queue/jobs", {"job": job, "delay_s": delay_s})["job_id"]
+
+    def lease(self, runner_id: str, lease_s: float = LEASE_S) -> Lease | None:
+        lease = self._post("/queue/lease", {"runner_id": runner_id, "lease_s": lease_s})["lease"]
+        return Lease(**lease) if lease else None
+
+    def heartbeat(self, lease: Lease, lease_s: float = LEASE_S) -> bool:
+        return self._post(f"/queue/jobs/{lease.job_id}/heartbeat", {"token": lease.token, "lease_s": lease_s})["ok"]
+
+    def ack(self, lease: Lease, result: dict | None = None, error: str | None = None) -> bool:
+        body = {"token": lease.token, "result": result, "error": error}
+        return self._post(f"/queue/jobs/{lease.job_id}/ack", body)["ok"]
+
+    def release(self, lease: Lease, error: str | None = None, delay_s: float | None = None) -> str | None:
+        body = {"token": lease.token, "error": error, "delay_s": delay_s}
+        return self._post(f"/queue/jobs/{lease.job_id}/release", body)["status"]
+
+    def cancel(self, job_id: str) -> str | None:
+        return self._post(f"/queue/jobs/{job_id}/cancel", {})["status"]
+
+    def get(self, job_id: str) -> dict | None:
+        r = self._client.get(f"/queue/jobs/{job_id}")
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.json()
+
+    def stats(self) -> dict:
+        r = self._client.get("/queue")
+        r.raise_for_status()
+        return r.json()
+
+    def close(self):
+        self._client.close()
+
+
+def lease_dict(lease: Lease | None) -> dict | None:
+    return asdict(lease) if lease else None
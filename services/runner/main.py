@@ -1,18 +1,72 @@
 import os
+import re
 import json
+import uuid
+import shutil
+import asyncio
+import tempfile
 import hashlib
+import socket
+import threading
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
-import boto3
-from botocore.config import Config
 from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 import httpx
-from PIL import Image
+from PIL import Image, ImageCms
 from io import BytesIO
 
-JPEG_QUALITY = 80
+from job_queue import FAILED, LEASE_S, QUEUED, HttpJobQueue, Lease, SQLiteJobQueue, lease_dict
+from print_sets import (
+    GROUP_ORDER,
+    RenderCancelled,
+    add_watermark,
+    check_cancelled,
+    normalize_image,
+    render_items,
+    render_print_set,
+    shutdown_process_pool,
+    warm_process_pool,
+)
+from profiling import PROFILE_HEADER, profile_request, wanted as profile_wanted
+from progress import JobProgress, send_event
+from zip_assembly import make_entries_from_files, write_zip
+from source_cache import get_source_cache, validators
+from tier_grant import verify_tier_grant
+from storage import copy_object, get_json, put_json, reset_client, upload_file, upload_stats
+from warmup import WarmUp, process_age_s
+
 DPI = (300, 300)
 
+# Same profiles as src/encode.py in the webapp (separate image -> keep in sync)
+DEFAULT_ENCODE_PROFILE = "balanced"
+ENCODE_PROFILES = {
+    "fast": {
+        "quality": 80,
+        "subsampling": "4:2:0",
+        "optimize": False,
+        "progressive": False,
+        "zip_compression": zipfile.ZIP_STORED,
+    },
+    "balanced": {
+        "quality": 80,
+        "subsampling": "4:2:0",
+        "optimize": True,
+        "progressive": False,
+        "zip_compression": zipfile.ZIP_STORED,
+    },
+    "smallest": {
+        "quality": 76,
+        "subsampling": "4:2:0",
+        "optimize": True,
+        "progressive": True,
+        "zip_compression": zipfile.ZIP_DEFLATED,
+    },
+}
+
 PRESET_LONG_SIDE = {
     "thumb_1024": 1024,
     "etsy_3000px": 3000,
@@ -30,60 +84,421 @@ def _fit_long_side(w: int, h: int, long_side: int) -> tuple[int, int]:
     return int(new_w), int(new_h)
 
 
-def _jpeg_size_bytes(img: Image.Image) -> int:
-    buf = BytesIO()
-    img.save(buf, format="JPEG", quality=JPEG_QUALITY, optimize=True)
-    return len(buf.getvalue())
+def get_encode_profile(name: str | None) -> dict:
+    key = (name or DEFAULT_ENCODE_PROFILE).strip().lower()
+    if key not in ENCODE_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown encode_profile '{name}' (use one of: {', '.join(ENCODE_PROFILES)})",
+        )
+    return ENCODE_PROFILES[key]
 
 
-def build_presets(im: Image.Image, presets: list[str] | None):
-    names = presets or ["thumb_1024", "etsy_3000px", "etsy_6000px"]
-    out = []
-    for name in names:
-        if name not in PRESET_LONG_SIDE:
-            continue
+def _jpeg_kwargs(profile: dict) -> dict:
+    return {
+        "quality": profile["quality"],
+        "subsampling": profile["subsampling"],
+        "optimize": profile["optimize"],
+        "progressive": profile["progressive"],
+    }
+
+
+DEFAULT_PRESETS = ["thumb_1024", "etsy_3000px", "etsy_6000px"]
+
+
+def resolve_presets(presets: list[str] | None) -> list[str]:
+    """Requested presets (default set if none), unknown names dropped."""
+    return [name for name in (presets or DEFAULT_PRESETS) if name in PRESET_LONG_SIDE]
+
+
+def render_presets(im: Image.Image, presets: list[str] | None, out_dir: str, profile: dict, on_preset=None,
+                   cancel=None):
+    """
+    Resize + write one JPEG per preset into out_dir. Returns (meta, paths).
+    on_preset(meta_entry) is called after each file is written.
+    """
+    meta = []
+    paths = []
+    for name in resolve_presets(presets):
+        check_cancelled(cancel)
         long_side = PRESET_LONG_SIDE[name]
         w, h = im.size
         nw, nh = _fit_long_side(w, h, long_side)
         resized = im.resize((nw, nh), Image.LANCZOS)
-        out.append({
+        jpg_path = os.path.join(out_dir, f"{name}.jpg")
+        resized.save(jpg_path, format="JPEG", dpi=DPI, **_jpeg_kwargs(profile))
+        meta.append({
             "name": name,
             "width": nw,
             "height": nh,
-            "jpeg_bytes": _jpeg_size_bytes(resized),
+            "jpeg_bytes": os.path.getsize(jpg_path),
         })
-    return out
+        paths.append(jpg_path)
+        if on_preset:
+            on_preset(meta[-1])
+    return meta, paths
+
+
+def _zip_files(zip_path: str, files: list[tuple[str, str]], profile: dict) -> int:
+    """[(arcname, path)] -> one ZIP; entries are read + checksummed in parallel."""
+    return write_zip(zip_path, make_entries_from_files(files, profile["zip_compression"]))
 
 
 def upload_zip_to_r2(zip_path: str, key: str) -> dict:
-    account_id = os.environ["R2_ACCOUNT_ID"]
-    access_key = os.environ["R2_ACCESS_KEY_ID"]
-    secret_key = os.environ["R2_SECRET_ACCESS_KEY"]
-    bucket = os.environ["R2_BUCKET"]
-
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=f"https://{account_id}.r2.cloudflarestorage.com",
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        region_name="auto",
-        config=Config(signature_version="s3v4"),
-    )
+    """Upload via the pooled client (storage.py). Returns timing metrics."""
+    return upload_file(zip_path, key, content_type="application/zip")
+
+
+def _upload_timing(upload: dict) -> dict:
+    return {k: upload[k] for k in ("bytes", "seconds", "mb_per_s", "attempts")}
+
+
+# ---------------------------------------------------------
+# Content-addressed outputs
+#
+# Outputs are stored under cas/{key}/, key = sha256 of the source image
+# bytes + what was asked for (presets / print groups + tier) + the encode
+# settings. cas/{key}/result.json is written last and marks a complete
+# set. A repeat job finds it, skips decode/render/upload and gets its
+# jobs/{job_id}/ keys as server-side copies (the worker keeps reading
+# jobs/{job_id}/...).
+# ---------------------------------------------------------
+CAS_DEDUPE = os.getenv("CAS_DEDUPE", "1").strip() == "1"
+
+# Bump when rendering changes output bytes for the same inputs.
+RENDER_VERSION = 2
+
+
+def cas_prefix(source_sha256: str, spec: dict) -> str:
+    raw = json.dumps(
+        {"render_version": RENDER_VERSION, "source": source_sha256, **spec},
+        separators=(",", ":"),
+        sort_keys=True,
+    ).encode("utf-8")
+    return f"cas/{hashlib.sha256(raw).hexdigest()}"
+
+
+async def cas_lookup(prefix: str | None) -> dict | None:
+    if not prefix:
+        return None
+    try:
+        return await asyncio.to_thread(get_json, f"{prefix}/result.json")
+    except Exception as e:
+        # Storage hiccup on lookup -> render as if it was a miss
+        print(f"cas lookup failed prefix={prefix}: {_error_text(e)}")
+        return None
+
+
+async def alias_files(prefix: str, job_id: str, names: list[str]) -> list[str]:
+    """Job-scoped copies of cas/{key}/{name} -> jobs/{job_id}/{name}."""
+    keys = [f"jobs/{job_id}/{name}" for name in names]
+    await asyncio.gather(*(
+        asyncio.to_thread(copy_object, f"{prefix}/{name}", key)
+        for name, key in zip(names, keys)
+    ))
+    return keys
+
+
+async def publish_files(job_id: str, files: list[tuple[str, str]], prefix: str | None) -> list[dict]:
+    """
+    Upload (name, path) pairs side by side. With a CAS prefix the bytes go
+    to cas/{key}/{name} and the job gets an alias. Returns upload metrics
+    with "key" = the jobs/{job_id}/{name} key.
+    """
+    uploads = await asyncio.gather(*(
+        asyncio.to_thread(upload_zip_to_r2, path, f"{prefix or f'jobs/{job_id}'}/{name}")
+        for name, path in files
+    ))
+    if prefix:
+        keys = await alias_files(prefix, job_id, [name for name, _ in files])
+        uploads = [dict(u, key=key) for u, key in zip(uploads, keys)]
+    return uploads
+
+
+# ---------------------------------------------------------
+# Download + decode (shared by single and batch jobs)
+# ---------------------------------------------------------
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+MAX_IMAGE_PX = 15000
+
+DOWNLOAD_HEADERS = {
+    "User-Agent": "SnapToSizeRunner/1.0 (+https://snaptosize.com)",
+    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+def _http_client() -> httpx.AsyncClient:
+    timeout = httpx.Timeout(20.0, connect=10.0)
+    return httpx.AsyncClient(timeout=timeout, follow_redirects=True)
+
+
+_download_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Pooled client for source downloads, one per process: jobs reuse its
+    TLS context and keep-alive connections. Idle connections expire
+    after httpx's keep-alive window, so none survive a suspend.
+    """
+    global _download_client
+    if _download_client is None:
+        _download_client = _http_client()
+    return _download_client
+
+
+async def close_http_client():
+    global _download_client
+    client, _download_client = _download_client, None
+    if client is not None:
+        await client.aclose()
+
+
+async def _get_image(client: httpx.AsyncClient, image_url: str, headers: dict | None = None) -> httpx.Response:
+    r = await client.get(image_url, headers={**DOWNLOAD_HEADERS, **(headers or {})})
+    if r.status_code == 403:
+        raise HTTPException(status_code=400, detail="image_url blocked by host (403). Use another URL or upload.")
+    if r.status_code != 304:
+        r.raise_for_status()
+
+    if len(r.content) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large (max 25MB)")
+    return r
+
+
+async def fetch_image(client: httpx.AsyncClient, image_url: str) -> tuple[bytes, dict]:
+    """
+    Download the source through the source cache (source_cache.py). Returns
+    (bytes, source) with source = {"cache", "sha256", "format", "width",
+    "height"}. A fresh download is probed here (size + header dimensions,
+    before any decode); a cache hit (304) was probed when it was stored.
+    """
+    cache = get_source_cache()
+    entry = await asyncio.to_thread(cache.lookup, image_url) if cache else None
+    r = await _get_image(client, image_url, validators(entry))
+    if r.status_code == 304 and entry:
+        content = await asyncio.to_thread(cache.read, entry)
+        if content is not None:
+            return content, {"cache": "hit", **{k: entry[k] for k in ("sha256", "format", "width", "height")}}
+    if r.status_code == 304:
+        r = await _get_image(client, image_url)  # nothing to revalidate against (evicted meanwhile)
+
+    content = r.content
+    source = {"sha256": hashlib.sha256(content).hexdigest(), **probe_image(content)}
+    if cache is None:
+        return content, dict(source, cache="off")
+    cache.count("changed" if entry else "misses")
+    info = {k: source[k] for k in ("format", "width", "height")}
+    stored = await asyncio.to_thread(cache.store, image_url, content, r.headers, info, source["sha256"])
+    return content, dict(source, cache=("changed" if entry else "miss") if stored else "uncacheable")
+
+
+def _check_dimensions(img: Image.Image):
+    if img.width > MAX_IMAGE_PX or img.height > MAX_IMAGE_PX:
+        raise HTTPException(status_code=413, detail="Image dimensions too large (max 15000px)")
+
+
+def probe_image(content: bytes) -> dict:
+    """Header-only check (no pixel decode): format + dimensions, 413 if too large."""
+    with Image.open(BytesIO(content)) as img:
+        _check_dimensions(img)
+        return {"format": img.format, "width": img.width, "height": img.height}
+
+
+def open_image(content: bytes, probed: bool = False) -> Image.Image:
+    """Decode the source. probed = fetch_image already checked it (skip the header check)."""
+    img = Image.open(BytesIO(content))
+    if not probed:
+        _check_dimensions(img)  # before the decode, not after
+    img.load()
+    return img
+
+
+def image_meta(img: Image.Image, content: bytes) -> dict:
+    return {
+        "format": img.format,
+        "mode": img.mode,
+        "width": img.width,
+        "height": img.height,
+        "download_bytes": len(content),
+    }
 
-    extra = {"ContentType": "application/zip"}
-    s3.upload_file(zip_path, bucket, key, ExtraArgs=extra)
-    return {"bucket": bucket, "key": key}
 
+def _error_text(e: Exception) -> str:
+    if isinstance(e, HTTPException):
+        return str(e.detail)
+    msg = str(e).splitlines()[0] if str(e) else ""
+    return f"{type(e).__name__}: {msg}"
 
-app = FastAPI()
+
+# ---------------------------------------------------------
+# Batch jobs: payload.image_urls = [...]
+# Downloads run concurrently (bounded) and feed the render stage
+# through a bounded queue, so network I/O overlaps CPU work.
+# One bad URL only fails its own entry.
+# ---------------------------------------------------------
+MAX_BATCH_IMAGES = 50
+BATCH_DOWNLOAD_CONCURRENCY = int(os.getenv("BATCH_DOWNLOAD_CONCURRENCY", "4"))
+BATCH_QUEUE_SIZE = int(os.getenv("BATCH_QUEUE_SIZE", "2"))  # downloaded, waiting for render
+
+
+def _render_batch_item(index: int, image_url: str, content: bytes, presets, work_dir: str, profile: dict,
+                       cancel=None) -> dict:
+    img = open_image(content, probed=True)
+    item_dir = os.path.join(work_dir, f"img{index:03d}")
+    os.makedirs(item_dir, exist_ok=True)
+    meta, paths = render_presets(img, presets, item_dir, profile, cancel=cancel)
+    return {
+        "index": index,
+        "image_url": image_url,
+        "ok": True,
+        "image": image_meta(img, content),
+        "presets": meta,
+        "paths": paths,
+    }
+
+
+async def run_batch(image_urls: list[str], presets, work_dir: str, profile: dict,
+                    progress: JobProgress | None = None, cancel=None) -> list[dict]:
+    results = [None] * len(image_urls)
+    queue = asyncio.Queue(maxsize=BATCH_QUEUE_SIZE)
+    download_slots = asyncio.Semaphore(BATCH_DOWNLOAD_CONCURRENCY)
+    finished = 0
+
+    def _failed(index, url, e):
+        return {"index": index, "image_url": url, "ok": False, "error": _error_text(e)}
+
+    def _finish(index, result):
+        nonlocal finished
+        results[index] = result
+        finished += 1
+        if progress:
+            progress.emit("image", index=index, ok=result["ok"], error=result.get("error"),
+                          done=finished, total=len(image_urls))
+
+    async def fetch(client, index, url):
+        # Slot is held until the render stage accepts the bytes -> bounded memory
+        async with download_slots:
+            if cancel is not None and cancel.is_set():
+                return
+            try:
+                content, _ = await fetch_image(client, url)
+            except Exception as e:
+                _finish(index, _failed(index, url, e))
+                return
+            await queue.put((index, url, content))
+
+    async def render_stage():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            index, url, content = item
+            if cancel is not None and cancel.is_set():
+                continue  # keep draining: fetchers must not block on a full queue
+            try:
+                result = await asyncio.to_thread(
+                    _render_batch_item, index, url, content, presets, work_dir, profile, cancel
+                )
+            except RenderCancelled:
+                continue
+            except Exception as e:
+                result = _failed(index, url, e)
+            _finish(index, result)
+
+    client = get_http_client()
+    renderer = asyncio.create_task(render_stage())
+    await asyncio.gather(*(fetch(client, i, url) for i, url in enumerate(image_urls)))
+    await queue.put(None)
+    await renderer
+
+    check_cancelled(cancel)
+    return results
+
+
+# ---------------------------------------------------------
+# Warm start (warmup.py): what the first job after a boot or resume
+# would otherwise pay for, run before it arrives.
+# ---------------------------------------------------------
+def _warm_codecs():
+    """Plugin registry + JPEG encoder/decoder."""
+    Image.init()
+    buf = BytesIO()
+    Image.new("RGB", (64, 64), (180, 120, 60)).save(buf, format="JPEG", **_jpeg_kwargs(get_encode_profile(None)))
+    open_image(buf.getvalue())
+
+
+def _warm_render():
+    """Tiny job through the real path: sRGB transform, resize, watermark, JPEG, ZIP."""
+    profile = get_encode_profile(None)
+    im = Image.new("RGB", (64, 64), (40, 90, 160))
+    im.info["icc_profile"] = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+    im = normalize_image(im)
+    add_watermark(im)
+    with tempfile.TemporaryDirectory(prefix="warmup_") as work_dir:
+        _, paths = render_presets(im, ["thumb_1024"], work_dir, profile)
+        _zip_files(os.path.join(work_dir, "warmup.zip"), [(os.path.basename(p), p) for p in paths], profile)
+
+
+def _warm_storage():
+    """Pooled S3 client + an open connection (GET of a missing key)."""
+    if os.getenv("R2_BUCKET"):
+        get_json("warmup/ping.json")
+
+
+async def _warm_http():
+    get_http_client()
+
+
+async def _reset_connections():
+    # urllib3 (boto3) has no keep-alive expiry: a connection dropped while
+    # suspended would hang until the read timeout
+    reset_client()
+
+
+WARM = WarmUp(
+    [
+        ("codecs", _warm_codecs),
+        ("render", _warm_render),
+        ("render_processes", warm_process_pool),
+        ("http_client", _warm_http),
+        ("storage", _warm_storage),
+    ],
+    on_resume=_reset_connections,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    WARM.boot_s = process_age_s()
+    WARM.begin()
+    queue_workers = start_queue_workers()
+    yield
+    await stop_queue_workers(queue_workers)
+    await WARM.stop()
+    await close_http_client()
+    shutdown_process_pool()  # RENDER_PROCESSES workers would outlive us
+
+
+app = FastAPI(lifespan=lifespan)
 RUNNER_TOKEN = os.getenv("RUNNER_TOKEN", "").strip()
 
 @app.get("/health")
 def health():
-    return {"ok": True}
+    out = {"ok": True, "uploads": upload_stats()}
+    if get_source_cache():
+        out["source_cache"] = get_source_cache().usage()
+    if QUEUE_DB:
+        out["queue"] = get_job_queue().stats()
+    return out
 
-@app.post("/generate")
-async def generate(request: Request, authorization: str | None = Header(default=None)):
+@app.get("/ready")
+def ready():
+    """200 once warmed up (503 while warming); the warm-up timing breakdown either way."""
+    return JSONResponse(WARM.report(), status_code=200 if WARM.ready else 503)
+
+def check_auth(authorization: str | None):
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing/invalid Authorization header")
 
@@ -91,7 +506,162 @@ async def generate(request: Request, authorization: str | None = Header(default=
     if not RUNNER_TOKEN or token != RUNNER_TOKEN:
         raise HTTPException(status_code=403, detail="Invalid token")
 
+
+# ---------------------------------------------------------
+# Cancellation
+#
+# Every /generate and /render job has a cancel event, registered under
+# its job id. It is set when the caller goes away (connection polled
+# every DISCONNECT_POLL_S; NDJSON stream closed) or by POST
+# /cancel/{job_id}. Render threads stop at their next size (or preset /
+# batch image), the job's /tmp dir is removed and the job ends with 409.
+# ---------------------------------------------------------
+DISCONNECT_POLL_S = float(os.getenv("DISCONNECT_POLL_S", "1"))
+_RUNNING_JOBS: dict[str, threading.Event] = {}
+
+
+async def _watch_disconnect(request: Request, cancel: threading.Event, job_id: str):
+    while not cancel.is_set():
+        if await request.is_disconnected():
+            print(f"client gone, cancelling job={job_id}")
+            cancel.set()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_S)
+
+
+@app.post("/cancel/{job_id}")
+def cancel_job(job_id: str, authorization: str | None = Header(default=None)):
+    check_auth(authorization)
+    cancel = _RUNNING_JOBS.get(job_id)
+    if cancel is None:
+        raise HTTPException(status_code=404, detail="No running job with that id")
+    cancel.set()
+    return {"ok": True, "job_id": job_id}
+
+
+@app.post("/generate")
+async def generate(
+    request: Request,
+    authorization: str | None = Header(default=None),
+    accept: str | None = Header(default=None),
+):
+    """
+    Run one job. With payload.progress_url, progress events are POSTed
+    there as the job advances. With "Accept: application/x-ndjson" the
+    response streams the same events, one JSON object per line, and ends
+    with {"stage": "result", "result": {...}} (or {"stage": "error"}).
+    Profiled on demand (profiling.py: PROFILE_SAMPLE_RATE / X-Profile-Token).
+    Cancelled when the caller disconnects or via POST /cancel/{job_id}.
+    """
+    check_auth(authorization)
     job = await request.json()
+    profile = profile_wanted(request.headers.get(PROFILE_HEADER))
+    cancel = threading.Event()
+
+    if "application/x-ndjson" in (accept or ""):
+        return StreamingResponse(_stream_job(job, profile, cancel), media_type="application/x-ndjson")
+
+    progress = _job_progress(job)
+    watcher = asyncio.create_task(_watch_disconnect(request, cancel, job.get("job_id") or "unknown"))
+    try:
+        return await _run_job(job, progress, profile, cancel)
+    finally:
+        watcher.cancel()
+        await progress.close()
+
+
+def _job_progress(job: dict, stream: asyncio.Queue | None = None) -> JobProgress:
+    payload = job.get("payload") or {}
+    return JobProgress(job.get("job_id") or "unknown", payload.get("progress_url"), RUNNER_TOKEN, stream)
+
+
+async def _stream_job(job: dict, profile: bool = False, cancel: threading.Event | None = None):
+    events = asyncio.Queue()
+    progress = _job_progress(job, events)
+    cancel = cancel or threading.Event()
+
+    async def run():
+        try:
+            return await _run_job(job, progress, profile, cancel)
+        finally:
+            await progress.close()
+            events.put_nowait(None)
+
+    task = asyncio.create_task(run())
+    try:
+        while (event := await events.get()) is not None:
+            yield json.dumps(event, separators=(",", ":")) + "\n"
+    finally:
+        if not task.done():
+            # Stream closed by the client: stop the job, nobody reads the result
+            cancel.set()
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    try:
+        final = {"stage": "result", "result": task.result()}
+    except Exception as e:
+        status = e.status_code if isinstance(e, HTTPException) else 500
+        final = {"stage": "error", "status": status, "error": _error_text(e)}
+    yield json.dumps(final, separators=(",", ":")) + "\n"
+
+
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+JOB_WORK_ROOT = "/tmp"
+
+
+def job_work_dir(job_id: str) -> str:
+    """
+    Scratch dir of a job, JOB_WORK_ROOT/{job_id}. job_id comes from the
+    request body: anything but a plain name directly under the root
+    ("..", "a/b", ...) is refused, since the dir is removed recursively.
+    """
+    root = os.path.realpath(JOB_WORK_ROOT)
+    name = job_id if isinstance(job_id, str) else ""
+    if not _SAFE_NAME.match(name) or os.path.dirname(os.path.realpath(os.path.join(root, name))) != root:
+        raise HTTPException(status_code=400, detail="job_id must be a plain name ([A-Za-z0-9._-])")
+    return os.path.join(root, name)
+
+
+def _job_profile_meta(job: dict) -> dict:
+    payload = job.get("payload") or {}
+    return {
+        "job_id": job.get("job_id"),
+        "mode": "batch" if payload.get("image_urls") else "print_set" if payload.get("print_groups") else "presets",
+        "tier": payload.get("tier"),
+        "groups": payload.get("print_groups"),
+        "images": len(payload.get("image_urls") or []) or 1,
+        "encode_profile": payload.get("encode_profile") or DEFAULT_ENCODE_PROFILE,
+    }
+
+
+async def _run_job(job: dict, progress: JobProgress, profile: bool = False,
+                   cancel: threading.Event | None = None) -> dict:
+    job_id = job.get("job_id") or "unknown"
+    work_dir = job_work_dir(job_id)  # refuse a bad job_id before any work
+    cancel = cancel or threading.Event()
+    await WARM.ensure()
+    _RUNNING_JOBS[job_id] = cancel
+    try:
+        if not profile:
+            return await run_job(job, progress, cancel)
+        with profile_request("generate", _job_profile_meta(job)) as meta:
+            out = await run_job(job, progress, cancel)
+            if meta is not None:
+                meta.update({k: out[k] for k in ("image", "cache", "zip_bytes", "images_ok") if k in out})
+            return out
+    except (RenderCancelled, asyncio.CancelledError) as e:
+        cancel.set()  # task cancelled: render threads still need the signal
+        shutil.rmtree(work_dir, ignore_errors=True)
+        print(f"job cancelled job={job_id}")
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        progress.emit("cancelled")
+        raise HTTPException(status_code=409, detail="Job cancelled")
+    finally:
+        if _RUNNING_JOBS.get(job_id) is cancel:
+            del _RUNNING_JOBS[job_id]
+
+
+async def run_job(job: dict, progress: JobProgress, cancel=None) -> dict:
     raw = json.dumps(job, separators=(",", ":"), sort_keys=True).encode("utf-8")
     digest = hashlib.sha256(raw).hexdigest()
 
@@ -106,40 +676,68 @@ async def generate(request: Request, authorization: str | None = Header(default=
         "sha256": digest,
     }
 
+    image_urls = payload.get("image_urls")
+    if image_urls:
+        return await generate_batch(job, payload, out, progress, cancel)
+
     if not image_url:
         out["note"] = "No image_url provided yet"
         return out
 
+    profile_name = payload.get("encode_profile") or DEFAULT_ENCODE_PROFILE
+    profile = get_encode_profile(profile_name)
+    out["encode_profile"] = profile_name
+    print_groups = validate_print_groups(payload.get("print_groups"))
+    tier = validate_tier(payload.get("tier"), payload.get("tier_grant"), image_url)
+
     # Download image (hard limits)
-    timeout = httpx.Timeout(20.0, connect=10.0)
-    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-        headers = {
-            "User-Agent": "SnapToSizeRunner/1.0 (+https://snaptosize.com)",
-            "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
-            "Accept-Language": "en-US,en;q=0.9",
-        }
-        r = await client.get(image_url, headers=headers)
-        if r.status_code == 403:
-            raise HTTPException(status_code=400, detail="image_url blocked by host (403). Use another URL or upload.")
-        r.raise_for_status()
-        content = r.content
+    content, source = await fetch_image(get_http_client(), image_url)
+    progress.emit("downloaded", bytes=len(content), cache=source["cache"])
+    check_cancelled(cancel)
 
-    if len(content) > 25 * 1024 * 1024:
-        raise HTTPException(status_code=413, detail="Image too large (max 25MB)")
+    job_id = job.get("job_id") or "unknown"
+    source_sha256 = source["sha256"]
+    out["source_sha256"] = source_sha256
+    out["source_cache"] = source["cache"]
 
-    img = Image.open(BytesIO(content))
-    img.load()
+    if print_groups:
+        spec = {"kind": "print_set", "groups": print_groups, "tier": tier}
+    else:
+        presets = resolve_presets(payload.get("presets"))
+        spec = {"kind": "presets", "presets": {name: PRESET_LONG_SIDE[name] for name in presets}}
+    spec["encode"] = profile
+    prefix = cas_prefix(source_sha256, spec) if CAS_DEDUPE else None
 
-    if img.width > 15000 or img.height > 15000:
-        raise HTTPException(status_code=413, detail="Image dimensions too large (max 15000px)")
+    hit = await cas_lookup(prefix)
+    if hit:
+        try:
+            names = [a["name"] for a in hit["archives"]] if print_groups else ["etsy_pack_v1.zip"]
+            keys = await alias_files(prefix, job_id, names)
+        except Exception as e:
+            # result.json outlived its archives (evicted/deleted): render as a
+            # miss, cas_store below writes a fresh set over the stale one
+            print(f"cas hit unusable prefix={prefix}: {_error_text(e)}")
+            hit = None
+    if hit:
+        print(f"cas hit prefix={prefix} job={job_id}")
+        out.update(hit)
+        out["cache"] = "hit"
+        if print_groups:
+            for i, (a, key) in enumerate(zip(out["archives"], keys)):
+                a["r2_key"] = key
+                progress.emit("artifact", index=i, name=a["name"], r2_key=key,
+                              bytes=a["zip_bytes"], done=i + 1, total=len(keys))
+        else:
+            out["r2_key"] = keys[0]
+        return out
+    out["cache"] = "miss" if prefix else "off"
 
-    out["image"] = {
-        "format": img.format,
-        "mode": img.mode,
-        "width": img.width,
-        "height": img.height,
-        "download_bytes": len(content),
-    }
+    img = open_image(content, probed=True)
+    out["image"] = image_meta(img, content)
+    progress.emit("decoded", width=img.width, height=img.height)
+
+    if print_groups:
+        return await generate_print_set(job, out, img, print_groups, tier, profile, prefix, progress, cancel)
 
     # Minimal "compute": create a small thumbnail in-memory and report size (no return of bytes)
     thumb = img.copy()
@@ -152,40 +750,601 @@ async def generate(request: Request, authorization: str | None = Header(default=
         "jpeg_bytes": buf.tell(),
     }
 
-    presets = payload.get("presets")
-    preset_meta = build_presets(img, presets)
-    out["presets"] = preset_meta
-
-    # Write JPGs to disk and ZIP them
-    job_id = job.get("job_id") or "unknown"
-    work_dir = f"/tmp/{job_id}"
+    # Write JPGs to disk and ZIP them (off the event loop)
+    work_dir = job_work_dir(job_id)
     os.makedirs(work_dir, exist_ok=True)
 
-    out_jpg_paths = []
-    preset_names = [p["name"] for p in preset_meta]
-    for name in preset_names:
-        if name not in PRESET_LONG_SIDE:
-            continue
-        long_side = PRESET_LONG_SIDE[name]
-        w, h = img.size
-        nw, nh = _fit_long_side(w, h, long_side)
-        resized = img.resize((nw, nh), Image.LANCZOS)
-        jpg_path = os.path.join(work_dir, f"{name}.jpg")
-        resized.save(jpg_path, format="JPEG", quality=JPEG_QUALITY, dpi=DPI, optimize=True)
-        out_jpg_paths.append(jpg_path)
+    total = len(presets)
+    done = 0
+
+    def on_preset(meta):
+        nonlocal done
+        done += 1
+        progress.emit_threadsafe("rendered", name=meta["name"], bytes=meta["jpeg_bytes"],
+                                 done=done, total=total)
+
+    preset_meta, out_jpg_paths = await asyncio.to_thread(
+        render_presets, img, presets, work_dir, profile, on_preset, cancel
+    )
+    out["presets"] = preset_meta
 
     zip_path = os.path.join(work_dir, "etsy_pack_v1.zip")
-    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
-        for p in out_jpg_paths:
-            z.write(p, arcname=os.path.basename(p))
+    await asyncio.to_thread(
+        _zip_files, zip_path, [(os.path.basename(p), p) for p in out_jpg_paths], profile
+    )
 
+    check_cancelled(cancel)
     zip_bytes = os.path.getsize(zip_path)
     out["zip_path"] = zip_path
     out["zip_bytes"] = zip_bytes
 
-    r2_key = f"jobs/{job_id}/etsy_pack_v1.zip"
-    upload_zip_to_r2(zip_path, r2_key)
-    print(f"uploaded to R2 key={r2_key}")
-    out["r2_key"] = r2_key
+    [upload] = await publish_files(job_id, [("etsy_pack_v1.zip", zip_path)], prefix)
+    out["r2_key"] = upload["key"]
+    out["upload"] = _upload_timing(upload)
+    progress.emit("artifact", index=0, name="etsy_pack_v1.zip", r2_key=upload["key"],
+                  bytes=zip_bytes, done=1, total=1)
 
+    if prefix:
+        await cas_store(prefix, out, ("image", "thumbnail", "presets", "zip_bytes"))
     return out
+
+
+async def cas_store(prefix: str, out: dict, fields):
+    """Write cas/{key}/result.json (the response fields a repeat job reuses)."""
+    result = {k: out[k] for k in fields}
+    try:
+        await asyncio.to_thread(put_json, f"{prefix}/result.json", result)
+    except Exception as e:
+        # The job itself succeeded; only dedupe for the next one is lost
+        print(f"cas store failed prefix={prefix}: {_error_text(e)}")
+
+
+# ---------------------------------------------------------
+# Print-set jobs: payload.print_groups = ["2x3", "ISO", ...]
+# Same catalogue/naming as the webapp Batch ZIP, one ZIP per group.
+# tier "free" = watermarked previews (long side capped), like the webapp.
+# "pro" only with a tier_grant the webapp signed for this image_url
+# (tier_grant.py); anything else renders free.
+# ---------------------------------------------------------
+def validate_print_groups(groups) -> list[str]:
+    if not groups:
+        return []
+    if isinstance(groups, str):
+        groups = [groups]
+    unknown = [g for g in groups if g not in GROUP_ORDER]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown print_groups {unknown} (use: {', '.join(GROUP_ORDER)})",
+        )
+    return [g for g in GROUP_ORDER if g in groups]
+
+
+def validate_tier(tier, grant, image_url: str) -> str:
+    tier = tier.strip().lower() if isinstance(tier, str) else ""
+    if tier != "pro":
+        return "free"
+    if not verify_tier_grant(grant, image_url):
+        raise HTTPException(status_code=403, detail="tier 'pro' needs a valid tier_grant")
+    return tier
+
+
+async def generate_print_set(
+    job: dict,
+    out: dict,
+    img: Image.Image,
+    groups: list[str],
+    tier: str,
+    profile: dict,
+    prefix: str | None = None,
+    progress: JobProgress | None = None,
+    cancel=None,
+) -> dict:
+    job_id = job.get("job_id") or "unknown"
+    work_dir = job_work_dir(job_id)
+    os.makedirs(work_dir, exist_ok=True)
+
+    free = tier == "free"
+    im = await asyncio.to_thread(normalize_image, img)
+
+    # Each group ZIP starts uploading as soon as it is written (while the
+    # next groups render) and is reported as an artifact once stored, so
+    # the first files are downloadable before the whole set is done.
+    loop = asyncio.get_running_loop()
+    pending = []
+    published = 0
+
+    async def publish(index: int, archive: dict) -> dict:
+        nonlocal published
+        [upload] = await publish_files(job_id, [(archive["name"], archive["path"])], prefix)
+        published += 1
+        if progress:
+            progress.emit("artifact", index=index, group=archive["group"], name=archive["name"],
+                          r2_key=upload["key"], bytes=archive["zip_bytes"],
+                          done=published, total=len(groups))
+        return upload
+
+    def on_archive(archive: dict):
+        if progress:
+            progress.emit_threadsafe("rendered", group=archive["group"], name=archive["name"],
+                                     bytes=archive["zip_bytes"], files=len(archive["files"]),
+                                     done=len(pending) + 1, total=len(groups))
+        pending.append(asyncio.run_coroutine_threadsafe(publish(len(pending), archive), loop))
+
+    try:
+        archives = await asyncio.to_thread(
+            render_print_set,
+            im,
+            groups,
+            work_dir,
+            _jpeg_kwargs(profile),
+            profile["zip_compression"],
+            watermark=free,
+            preview=free,
+            on_archive=on_archive,
+            cancel=cancel,
+        )
+    finally:
+        # Never leave uploads running past a failed render
+        uploads = await asyncio.gather(*map(asyncio.wrap_future, pending), return_exceptions=True)
+    for upload in uploads:
+        if isinstance(upload, BaseException):
+            raise upload
+
+    for a, upload in zip(archives, uploads):
+        a["r2_key"] = upload["key"]
+        a["zip_path"] = a.pop("path")
+        a["upload"] = _upload_timing(upload)
+
+    out["tier"] = tier
+    out["archives"] = archives
+
+    if prefix:
+        cached = dict(out, archives=[
+            {k: a[k] for k in ("group", "name", "zip_bytes", "files")} for a in archives
+        ])
+        await cas_store(prefix, cached, ("image", "tier", "archives"))
+    return out
+
+
+async def generate_batch(job: dict, payload: dict, out: dict, progress: JobProgress | None = None,
+                         cancel=None) -> dict:
+    """Many images per job -> one pack with a folder per image + per-image results."""
+    image_urls = [str(u).strip() for u in payload.get("image_urls") or []]
+    if len(image_urls) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=413, detail=f"Too many images (max {MAX_BATCH_IMAGES} per batch)")
+
+    profile_name = payload.get("encode_profile") or DEFAULT_ENCODE_PROFILE
+    profile = get_encode_profile(profile_name)
+    out["encode_profile"] = profile_name
+
+    job_id = job.get("job_id") or "unknown"
+    work_dir = job_work_dir(job_id)
+    os.makedirs(work_dir, exist_ok=True)
+
+    results = await run_batch(image_urls, payload.get("presets"), work_dir, profile, progress, cancel)
+
+    ok_results = [r for r in results if r["ok"]]
+    out["images_ok"] = len(ok_results)
+    out["images_failed"] = len(results) - len(ok_results)
+
+    if ok_results:
+        zip_path = os.path.join(work_dir, "etsy_pack_v1.zip")
+        files = [
+            (f"img{r['index']:03d}/{os.path.basename(p)}", p)
+            for r in ok_results
+            for p in r["paths"]
+        ]
+        await asyncio.to_thread(_zip_files, zip_path, files, profile)
+        check_cancelled(cancel)
+
+        out["zip_path"] = zip_path
+        out["zip_bytes"] = os.path.getsize(zip_path)
+
+        r2_key = f"jobs/{job_id}/etsy_pack_v1.zip"
+        upload = await asyncio.to_thread(upload_zip_to_r2, zip_path, r2_key)
+        print(f"uploaded to R2 key={r2_key} images_ok={len(ok_results)}/{len(results)}")
+        out["r2_key"] = r2_key
+        out["upload"] = _upload_timing(upload)
+        if progress:
+            progress.emit("artifact", index=0, name="etsy_pack_v1.zip", r2_key=r2_key,
+                          bytes=out["zip_bytes"], done=1, total=1)
+
+    for r in results:
+        r.pop("paths", None)
+    out["images"] = results
+    return out
+
+
+# ---------------------------------------------------------
+# Direct render for the webapp's remote render backend
+# (src/render_backend.py). Body = original upload bytes,
+# X-Render-Job = job JSON. Results stay on local disk and are
+# fetched via /artifacts, then deleted by the caller. Dirs a caller
+# never deleted (it crashed, the DELETE failed) are swept once older
+# than RENDER_ARTIFACT_TTL_S.
+# ---------------------------------------------------------
+RENDER_ARTIFACT_TTL_S = float(os.getenv("RENDER_ARTIFACT_TTL_S", "3600"))
+
+
+def _artifact_dir(job_id: str) -> str:
+    if not _SAFE_NAME.match(job_id or ""):
+        raise HTTPException(status_code=404, detail="Not found")
+    return f"/tmp/render_{job_id}"
+
+
+def sweep_artifacts(max_age_s: float = RENDER_ARTIFACT_TTL_S) -> int:
+    """Remove /tmp/render_* dirs not touched for max_age_s. Returns how many."""
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for entry in os.scandir("/tmp"):
+        if not entry.name.startswith("render_") or not entry.is_dir(follow_symlinks=False):
+            continue
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        removed += 1
+    if removed:
+        print(f"swept {removed} stale render dir(s)")
+    return removed
+
+
+@app.post("/render")
+async def render(
+    request: Request,
+    authorization: str | None = Header(default=None),
+    x_render_job: str | None = Header(default=None),
+    x_render_id: str | None = Header(default=None),
+):
+    """X-Render-Id (optional) = job id to use, so the caller can POST /cancel/{id}."""
+    check_auth(authorization)
+    try:
+        job = json.loads(x_render_job or "")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Missing/invalid X-Render-Job header")
+
+    profile = get_encode_profile(job.get("encode_profile"))
+    kind = job.get("kind")
+    if kind not in ("print_set", "items"):
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {kind}")
+
+    content = await request.body()
+    if len(content) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large (max 25MB)")
+
+    await asyncio.to_thread(sweep_artifacts)
+    job_id = x_render_id if x_render_id and _SAFE_NAME.match(x_render_id) else uuid.uuid4().hex
+    work_dir = _artifact_dir(job_id)
+    os.makedirs(work_dir, exist_ok=True)
+
+    await WARM.ensure()
+    cancel = threading.Event()
+    _RUNNING_JOBS[job_id] = cancel
+    watcher = asyncio.create_task(_watch_disconnect(request, cancel, job_id))
+    try:
+        names = await _render_job(job, kind, content, work_dir, profile, cancel)
+    except RenderCancelled:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        print(f"render cancelled job={job_id}")
+        raise HTTPException(status_code=409, detail="Job cancelled")
+    except BaseException:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    finally:
+        watcher.cancel()
+        if _RUNNING_JOBS.get(job_id) is cancel:
+            del _RUNNING_JOBS[job_id]
+
+    return {
+        "ok": True,
+        "job_id": job_id,
+        "files": [
+            {
+                "name": name,
+                "url": f"/artifacts/{job_id}/{name}",
+                "bytes": os.path.getsize(os.path.join(work_dir, name)),
+            }
+            for name in names
+        ],
+    }
+
+
+async def _render_job(job: dict, kind: str, content: bytes, work_dir: str, profile: dict,
+                      cancel: threading.Event) -> list[str]:
+    img = open_image(content)
+    im = await asyncio.to_thread(normalize_image, img)
+    check_cancelled(cancel)
+
+    if kind == "print_set":
+        archives = await asyncio.to_thread(
+            render_print_set,
+            im,
+            validate_print_groups(job.get("groups")),
+            work_dir,
+            _jpeg_kwargs(profile),
+            profile["zip_compression"],
+            watermark=bool(job.get("watermark")),
+            preview=bool(job.get("preview")),
+            crops=job.get("crops"),
+            max_zip_bytes=job.get("max_zip_bytes"),
+            cancel=cancel,
+        )
+        return [a["name"] for a in archives]
+    return await asyncio.to_thread(
+        render_items,
+        im,
+        job.get("items") or [],
+        work_dir,
+        _jpeg_kwargs(profile),
+        profile["zip_compression"],
+        as_zip=bool(job.get("as_zip")),
+        crops=job.get("crops"),
+        cancel=cancel,
+    )
+
+
+@app.get("/artifacts/{job_id}/{name}")
+def get_artifact(job_id: str, name: str, authorization: str | None = Header(default=None)):
+    check_auth(authorization)
+    if not _SAFE_NAME.match(name):
+        raise HTTPException(status_code=404, detail="Not found")
+    path = os.path.join(_artifact_dir(job_id), name)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Not found")
+    media_type = "application/zip" if name.endswith(".zip") else "image/jpeg"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+
+@app.delete("/artifacts/{job_id}")
+def delete_artifacts(job_id: str, authorization: str | None = Header(default=None)):
+    check_auth(authorization)
+    shutil.rmtree(_artifact_dir(job_id), ignore_errors=True)
+    return {"ok": True}
+
+
+
+# ---------------------------------------------------------
+# Pull-based jobs (job_queue.py)
+#
+# QUEUE_DB=<path>: this runner hosts the queue (SQLite) and serves it
+# under /queue/* for producers and other runners (bearer token).
+# QUEUE_URL=<runner url>: use the queue hosted there. With either,
+# QUEUE_WORKERS loops (default 1) lease jobs and run them exactly like
+# /generate, so adding a runner adds capacity and a burst waits in the
+# queue instead of timing out. Nobody waits on a response: progress
+# goes to payload.progress_url as usual and ends with a "result" or
+# "error" event. A heartbeat every LEASE_S/3 keeps the lease; losing it
+# (expired, cancelled in the queue) cancels the job here. 4xx errors
+# fail the job at once, anything else is retried with backoff. On
+# shutdown running jobs go back to the queue. A job whose last lease
+# expires (its runner died) gets its "error" event from the runner
+# hosting the queue, sent from a background thread so a slow progress
+# endpoint never holds up a lease. The hosting runner also drops
+# finished jobs older than QUEUE_RETENTION_S every QUEUE_PURGE_S.
+# ---------------------------------------------------------
+QUEUE_DB = os.getenv("QUEUE_DB", "").strip()
+QUEUE_URL = os.getenv("QUEUE_URL", "").strip()
+QUEUE_WORKERS = int(os.getenv("QUEUE_WORKERS", "1" if QUEUE_DB or QUEUE_URL else "0"))
+QUEUE_POLL_S = float(os.getenv("QUEUE_POLL_S", "1"))
+QUEUE_RETENTION_S = float(os.getenv("QUEUE_RETENTION_S", "604800"))  # 7 days; 0 = keep forever
+QUEUE_PURGE_S = float(os.getenv("QUEUE_PURGE_S", "3600"))
+RUNNER_ID = os.getenv("RUNNER_ID") or os.getenv("FLY_MACHINE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+_job_queue = None
+# One thread, so expired reports go out in order and a dead endpoint can't pile up threads
+_expired_reporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="queue-expired")
+
+
+def get_job_queue():
+    """The queue this runner uses (None when neither QUEUE_DB nor QUEUE_URL is set)."""
+    global _job_queue
+    if _job_queue is None:
+        if QUEUE_DB:
+            _job_queue = SQLiteJobQueue(QUEUE_DB, on_expired=_report_expired_later)
+        elif QUEUE_URL:
+            _job_queue = HttpJobQueue(QUEUE_URL, RUNNER_TOKEN)
+    return _job_queue
+
+
+def _report_expired_later(jobs: list[dict]):
+    """on_expired for the hosted queue: lease() returns without waiting on the callbacks."""
+    _expired_reporter.submit(_report_expired, jobs)
+
+
+def _report_expired(jobs: list[dict]):
+    """Jobs failed by an expired lease: nobody else will send their final event (blocking)."""
+    for j in jobs:
+        error = f"lease expired after {j['attempts']} attempt(s)"
+        print(f"job failed job={j['job_id']}: {error}")
+        payload = j["job"].get("payload") or {}
+        send_event(j["job_id"], payload.get("progress_url"), RUNNER_TOKEN, "error", status=500, error=error)
+
+
+def _hosted_queue(authorization: str | None) -> SQLiteJobQueue:
+    check_auth(authorization)
+    if not QUEUE_DB:
+        raise HTTPException(status_code=404, detail="No job queue on this runner")
+    return get_job_queue()
+
+
+def _lease_of(job_id: str, body: dict) -> Lease:
+    """Enough of a Lease for heartbeat/ack/release (they match on id + token)."""
+    return Lease(job_id, str(body.get("token") or ""), "", 0, 0.0, {})
+
+
+@app.post("/queue/jobs")
+def queue_enqueue(body: dict, authorization: str | None = Header(default=None)):
+    """Body = {"job": {...same as /generate...}, "delay_s"}. Idempotent per job_id."""
+    queue = _hosted_queue(authorization)
+    job = body.get("job")
+    if not isinstance(job, dict):
+        raise HTTPException(status_code=400, detail="Missing job")
+    return {"ok": True, "job_id": queue.enqueue(job, float(body.get("delay_s") or 0))}
+
+
+@app.post("/queue/lease")
+def queue_lease(body: dict, authorization: str | None = Header(default=None)):
+    queue = _hosted_queue(authorization)
+    runner_id = str(body.get("runner_id") or "unknown")
+    return {"lease": lease_dict(queue.lease(runner_id, float(body.get("lease_s") or LEASE_S)))}
+
+
+@app.post("/queue/jobs/{job_id}/heartbeat")
+def queue_heartbeat(job_id: str, body: dict, authorization: str | None = Header(default=None)):
+    queue = _hosted_queue(authorization)
+    return {"ok": queue.heartbeat(_lease_of(job_id, body), float(body.get("lease_s") or LEASE_S))}
+
+
+@app.post("/queue/jobs/{job_id}/ack")
+def queue_ack(job_id: str, body: dict, authorization: str | None = Header(default=None)):
+    queue = _hosted_queue(authorization)
+    return {"ok": queue.ack(_lease_of(job_id, body), body.get("result"), body.get("error"))}
+
+
+@app.post("/queue/jobs/{job_id}/release")
+def queue_release(job_id: str, body: dict, authorization: str | None = Header(default=None)):
+    queue = _hosted_queue(authorization)
+    delay_s = body.get("delay_s")
+    status = queue.release(_lease_of(job_id, body), body.get("error"), None if delay_s is None else float(delay_s))
+    return {"ok": status is not None, "status": status}
+
+
+@app.post("/queue/jobs/{job_id}/cancel")
+def queue_cancel(job_id: str, authorization: str | None = Header(default=None)):
+    status = _hosted_queue(authorization).cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"ok": True, "status": status}
+
+
+@app.get("/queue/jobs/{job_id}")
+def queue_job(job_id: str, authorization: str | None = Header(default=None)):
+    state = _hosted_queue(authorization).get(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return state
+
+
+@app.get("/queue")
+def queue_stats(authorization: str | None = Header(default=None)):
+    return _hosted_queue(authorization).stats()
+
+
+def start_queue_workers() -> list[asyncio.Task]:
+    queue = get_job_queue()
+    if queue is None:
+        return []
+    tasks = []
+    if QUEUE_DB and QUEUE_RETENTION_S > 0:
+        tasks.append(asyncio.create_task(_purge_queue(queue)))
+    if QUEUE_WORKERS > 0:
+        print(f"pulling jobs from {QUEUE_DB or QUEUE_URL} runner={RUNNER_ID} workers={QUEUE_WORKERS}")
+        tasks += [asyncio.create_task(_queue_worker(queue)) for _ in range(QUEUE_WORKERS)]
+    return tasks
+
+
+async def stop_queue_workers(tasks: list[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _purge_queue(queue: SQLiteJobQueue):
+    """Drop finished jobs older than QUEUE_RETENTION_S, every QUEUE_PURGE_S (hosting runner only)."""
+    while True:
+        try:
+            purged = await asyncio.to_thread(queue.purge, QUEUE_RETENTION_S)
+        except Exception as e:
+            print(f"queue purge failed: {_error_text(e)}")
+        else:
+            if purged:
+                print(f"queue purged {purged} finished job(s) older than {QUEUE_RETENTION_S:.0f}s")
+        await asyncio.sleep(QUEUE_PURGE_S)
+
+
+async def _queue_worker(queue):
+    while True:
+        try:
+            lease = await asyncio.to_thread(queue.lease, RUNNER_ID, LEASE_S)
+        except Exception as e:
+            print(f"queue lease failed: {_error_text(e)}")
+            lease = None
+        if lease is None:
+            await asyncio.sleep(QUEUE_POLL_S)
+            continue
+        await _run_leased(queue, lease)
+
+
+async def _keep_lease(queue, lease: Lease, cancel: threading.Event, lost: asyncio.Event):
+    renewed = time.monotonic()
+    while True:
+        await asyncio.sleep(LEASE_S / 3)
+        try:
+            ok = await asyncio.to_thread(queue.heartbeat, lease, LEASE_S)
+        except Exception as e:
+            # Queue unreachable: keep working while the lease can't have expired yet
+            print(f"heartbeat failed job={lease.job_id}: {_error_text(e)}")
+            ok = time.monotonic() - renewed < LEASE_S
+        else:
+            renewed = time.monotonic() if ok else renewed
+        if not ok:
+            print(f"lease lost, cancelling job={lease.job_id}")
+            lost.set()
+            cancel.set()
+            return
+
+
+async def _run_leased(queue, lease: Lease):
+    job = lease.job
+    cancel = threading.Event()
+    lost = asyncio.Event()
+    progress = _job_progress(job)
+    progress.emit("leased", runner_id=RUNNER_ID, attempt=lease.attempt)
+    keeper = asyncio.create_task(_keep_lease(queue, lease, cancel, lost))
+    try:
+        result = await _run_job(job, progress, profile_wanted(None), cancel)
+    except asyncio.CancelledError:
+        # Runner shutting down: another runner picks the job up right away
+        try:
+            await asyncio.to_thread(queue.release, lease)
+        except Exception as e:
+            print(f"release on shutdown failed job={lease.job_id}: {_error_text(e)}")
+        raise
+    except Exception as e:
+        if not lost.is_set():
+            await _fail_leased(queue, lease, progress, e)
+    else:
+        try:
+            acked = await asyncio.to_thread(queue.ack, lease, result)
+        except Exception as e:
+            # The lease runs out and the job is rendered again (CAS makes that cheap)
+            print(f"ack failed job={lease.job_id}: {_error_text(e)}")
+        else:
+            if acked:
+                progress.emit("result", result=result)
+            else:
+                print(f"lease lost before ack, result dropped job={lease.job_id}")
+    finally:
+        keeper.cancel()
+        await progress.close()
+
+
+async def _fail_leased(queue, lease: Lease, progress: JobProgress, e: Exception):
+    status = e.status_code if isinstance(e, HTTPException) else 500
+    error = _error_text(e)
+    try:
+        if status < 500:
+            state = FAILED if await asyncio.to_thread(queue.ack, lease, None, error) else None
+        else:
+            state = await asyncio.to_thread(queue.release, lease, error)
+    except Exception as qe:
+        print(f"queue update failed job={lease.job_id}: {_error_text(qe)}")
+        return
+    print(f"job failed job={lease.job_id} attempt={lease.attempt} -> {state}: {error}")
+    if state == FAILED:
+        progress.emit("error", status=status, error=error)
+    elif state == QUEUED:
+        progress.emit("retry", status=status, error=error, attempt=lease.attempt)
@@ -0,0 +1,430 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image, ImageCms, ImageDraw, ImageFont, ImageOps
+
+from shared_source import SharedSource, map_shared, sweep_orphans
+from zip_assembly import make_entry, split_entries, write_zip, zip_size
+
+# ---------------------------------------------------------
+# Print-set catalogue + naming
+# Same as src/render.py in the webapp (separate image -> keep in sync)
+# ---------------------------------------------------------
+PPI = 300
+DPI = (PPI, PPI)
+MAX_INPUT_PX = 10000
+PREVIEW_LONG_SIDE = 1200
+
+PRINT_SIZES = {
+    "2x3": [(4, 6), (8, 12), (10, 15), (12, 18), (16, 24), (20, 30)],
+    "3x4": [(6, 8), (9, 12), (12, 16), (15, 20), (18, 24)],
+    "4x5": [(8, 10), (12, 15), (16, 20), (20, 25)],
+    "ISO": [
+        ("A5", 1748, 2480),
+        ("A4", 2480, 3508),
+        ("A3", 3508, 4961),
+        ("A2", 4961, 7016),
+        ("A1", 7016, 9933),
+    ],
+    "EXTRAS": [
+        ("5x7", 5, 7),
+        ("8.5x11", 8.5, 11),
+        ("11x14", 11, 14),
+        ("16x20", 16, 20),
+        ("20x24", 20, 24),
+    ],
+}
+
+GROUP_ORDER = ["2x3", "3x4", "4x5", "ISO", "EXTRAS"]
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+# > 0: print-set sizes render in this many worker processes, which map the
+# decoded source from shared memory (shared_source.py) instead of threads
+RENDER_PROCESSES = int(os.getenv("RENDER_PROCESSES", "0"))
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def safe_name(s: str) -> str:
+    return (
+        str(s)
+        .replace(" ", "_")
+        .replace("/", "_")
+        .replace("\\", "_")
+        .replace(":", "")
+        .replace("(", "")
+        .replace(")", "")
+        .replace(",", "")
+    )
+
+
+# ---------------------------------------------------------
+# Color management (same as src/ingest.py): convert to sRGB once per
+# source with the embedded ICC profile; transforms cached per profile.
+# ---------------------------------------------------------
+COLOR_INTENT = ImageCms.Intent.RELATIVE_COLORIMETRIC
+_TRANSFORM_FLAGS = ImageCms.Flags.BLACKPOINTCOMPENSATION | ImageCms.Flags.NOCACHE
+_TRANSFORM_CACHE_MAX = 32
+
+SRGB_PROFILE = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+SRGB_ICC = SRGB_PROFILE.tobytes()
+
+_transforms = {}
+_transforms_lock = threading.Lock()
+
+
+def _srgb_transform(icc_profile: bytes, mode: str, intent=COLOR_INTENT):
+    key = (hashlib.sha256(icc_profile).hexdigest(), mode, int(intent))
+    with _transforms_lock:
+        if key in _transforms:
+            return _transforms[key]
+
+    src = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+    if mode == "RGB" and ImageCms.getProfileDescription(src).strip().startswith("sRGB"):
+        transform = None
+    else:
+        transform = ImageCms.buildTransform(src, SRGB_PROFILE, mode, "RGB", intent, _TRANSFORM_FLAGS)
+
+    with _transforms_lock:
+        if len(_transforms) >= _TRANSFORM_CACHE_MAX:
+            _transforms.pop(next(iter(_transforms)))
+        _transforms[key] = transform
+    return transform
+
+
+def _working_mode(im: Image.Image) -> Image.Image:
+    if im.mode in ("RGB", "CMYK", "L"):
+        return im
+    if im.mode in ("1", "LA", "I;16", "I;16B", "I;16L", "I", "F"):
+        return im.convert("L")
+    return im.convert("RGB")
+
+
+def to_srgb(im: Image.Image, icc_profile: bytes | None) -> Image.Image:
+    transform = None
+    if icc_profile:
+        try:
+            transform = _srgb_transform(icc_profile, im.mode)
+        except (ImageCms.PyCMSError, OSError, ValueError) as e:
+            print(f"ICC profile ignored ({type(e).__name__}: {e})")
+
+    if transform is not None:
+        im = ImageCms.applyTransform(im, transform)
+    elif im.mode != "RGB":
+        im = im.convert("RGB")
+
+    im.info["icc_profile"] = SRGB_ICC
+    return im
+
+
+def normalize_image(im: Image.Image) -> Image.Image:
+    """Fix EXIF rotation + downscale huge images + convert to sRGB."""
+    icc_profile = im.info.get("icc_profile")
+    im = ImageOps.exif_transpose(im)
+    im = _working_mode(im)
+
+    w, h = im.size
+    if max(w, h) > MAX_INPUT_PX:
+        scale = MAX_INPUT_PX / max(w, h)
+        im = im.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+    return to_srgb(im, icc_profile)
+
+
+def _group_specs(group: str):
+    for spec in PRINT_SIZES[group]:
+        if group == "ISO":
+            label, w, h = spec
+        else:
+            if isinstance(spec, tuple) and len(spec) == 3:
+                label, w_in, h_in = spec
+                if not str(label).endswith("in"):
+                    label = f"{label}in"
+            else:
+                w_in, h_in = spec
+                label = f"{w_in}x{h_in}in"
+
+            w = int(round(float(w_in) * PPI))
+            h = int(round(float(h_in) * PPI))
+        yield label, int(w), int(h)
+
+
+def build_render_plan(groups, preview_long_side: int | None = None) -> list[dict]:
+    """Same entries and file names as the webapp's Batch ZIP plan."""
+    plan = []
+    for group in groups:
+        for label, w, h in _group_specs(group):
+            item = {
+                "group": group,
+                "label": label,
+                "w": w,
+                "h": h,
+                "out_w": w,
+                "out_h": h,
+                "dpi": DPI,
+                "filename": f"{safe_name(label)}_{w}x{h}.jpg",
+                "preview": False,
+            }
+            if preview_long_side:
+                scale = min(1.0, preview_long_side / max(w, h))
+                out_w = max(1, round(w * scale))
+                out_h = max(1, round(h * scale))
+                preview_dpi = max(1, round(PPI * scale))
+                item.update(
+                    out_w=out_w,
+                    out_h=out_h,
+                    dpi=(preview_dpi, preview_dpi),
+                    filename=f"{safe_name(label)}_{w}x{h}_PREVIEW_{out_w}x{out_h}.jpg",
+                    preview=True,
+                )
+            plan.append(item)
+    return plan
+
+
+def group_zip_name(group: str, preview: bool = False) -> str:
+    return f"{group}_preview.zip" if preview else f"{group}.zip"
+
+
+def add_watermark(im: Image.Image, text: str = "SnapToSize") -> Image.Image:
+    """Light watermark: single centered text (same as webapp)."""
+    base = im.convert("RGBA")
+    w, h = base.size
+
+    overlay = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+
+    font_size = max(24, int(min(w, h) * 0.06))
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", font_size)
+    except Exception:
+        font = ImageFont.load_default()
+
+    bbox = draw.textbbox((0, 0), text, font=font)
+    tw = bbox[2] - bbox[0]
+    th = bbox[3] - bbox[1]
+    x = (w - tw) // 2
+    y = (h - th) // 2
+
+    draw.text((x + 2, y + 2), text, font=font, fill=(0, 0, 0, 120))
+    draw.text((x, y), text, font=font, fill=(255, 255, 255, 160))
+
+    return Image.alpha_composite(base, overlay).convert("RGB")
+
+
+def crop_box(size, w: int, h: int, center) -> tuple[float, float, float, float]:
+    """Same as src/render.py: largest w:h box in size, centered near center (fractions)."""
+    src_w, src_h = size
+    aspect = w / h
+    if src_w / src_h > aspect:
+        box_w, box_h = src_h * aspect, float(src_h)
+    else:
+        box_w, box_h = float(src_w), src_w / aspect
+    left = min(max(center[0] * src_w - box_w / 2, 0.0), src_w - box_w)
+    top = min(max(center[1] * src_h - box_h / 2, 0.0), src_h - box_h)
+    return (left, top, left + box_w, top + box_h)
+
+
+class RenderCancelled(Exception):
+    """The job's cancel event was set (client gone, stream closed, POST /cancel)."""
+
+
+def check_cancelled(cancel) -> None:
+    if cancel is not None and cancel.is_set():
+        raise RenderCancelled()
+
+
+def _render_image(im: Image.Image, item: dict, watermark: bool, crops: dict | None = None) -> Image.Image:
+    # crops = {"WxH": [cx, cy]} from the webapp's smart crop (fit="crop")
+    center = (crops or {}).get(f"{item['w']}x{item['h']}")
+    box = crop_box(im.size, item["w"], item["h"], center) if center else None
+    img = im.resize((item["out_w"], item["out_h"]), Image.LANCZOS, box=box)
+    if watermark:
+        img = add_watermark(img)
+    return img
+
+
+def _render_to_file(im: Image.Image, item: dict, out_dir: str, jpeg_kwargs: dict, watermark: bool,
+                    crops: dict | None = None, cancel=None) -> str:
+    check_cancelled(cancel)
+    img = _render_image(im, item, watermark, crops)
+    path = os.path.join(out_dir, item["group"], item["filename"])
+    img.save(path, format="JPEG", dpi=item["dpi"], icc_profile=SRGB_ICC, **jpeg_kwargs)
+    return path
+
+
+def _render_entry(im: Image.Image, item: dict, jpeg_kwargs: dict, zip_compression: int,
+                  watermark: bool, crops: dict | None = None, cancel=None):
+    """Render + encode + CRC (+ deflate) one ZIP entry, all in the calling worker thread."""
+    check_cancelled(cancel)
+    buf = io.BytesIO()
+    _render_image(im, item, watermark, crops).save(
+        buf, format="JPEG", dpi=item["dpi"], icc_profile=SRGB_ICC, **jpeg_kwargs
+    )
+    return make_entry(item["filename"], buf.getvalue(), zip_compression)
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            sweep_orphans()
+            _process_pool = ProcessPoolExecutor(
+                max_workers=RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def _warm_worker(_):
+    Image.init()
+    return os.getpid()
+
+
+def warm_process_pool():
+    """Spawn the RENDER_PROCESSES workers (interpreter + imports) now, not on the first job."""
+    if RENDER_PROCESSES > 0:
+        pool = _get_process_pool()
+        list(pool.map(_warm_worker, range(RENDER_PROCESSES)))
+
+
+def shutdown_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def _render_entries(im: Image.Image, items: list[dict], jpeg_kwargs: dict, zip_compression: int,
+                    watermark: bool, crops: dict | None, cancel):
+    """ZIP entries for items, in order: RENDER_PROCESSES worker processes, else RENDER_WORKERS threads."""
+    source = None
+    if RENDER_PROCESSES > 0:
+        check_cancelled(cancel)
+        try:
+            source = SharedSource(im)
+        except OSError as e:
+            print(f"shared source unavailable ({e}); rendering in threads")
+    if source is not None:
+        with source:
+            for entry in map_shared(_get_process_pool(), source.ref, _render_entry, items,
+                                    jpeg_kwargs, zip_compression, watermark, crops):
+                check_cancelled(cancel)
+                yield entry
+        return
+    with ThreadPoolExecutor(max_workers=max(1, RENDER_WORKERS)) as pool:
+        yield from pool.map(
+            lambda item: _render_entry(im, item, jpeg_kwargs, zip_compression, watermark, crops, cancel),
+            items,
+        )
+
+
+def _write_group_zips(group: str, entries: list, work_dir: str, preview: bool,
+                      max_zip_bytes: int | None = None) -> list[dict]:
+    """One archive, or <group>_partN.zip archives of at most max_zip_bytes each."""
+    name = group_zip_name(group, preview)
+    parts = [entries]
+    if max_zip_bytes and zip_size(entries) > max_zip_bytes:
+        parts = split_entries(entries, max_zip_bytes)
+    archives = []
+    for i, part in enumerate(parts, start=1):
+        part_name = name if len(parts) == 1 else name.replace(".zip", f"_part{i}.zip")
+        zip_path = os.path.join(work_dir, part_name)
+        archives.append({
+            "group": group,
+            "name": part_name,
+            "path": zip_path,
+            "zip_bytes": write_zip(zip_path, part),
+            "files": [e.name for e in part],
+        })
+    return archives
+
+
+def render_print_set(
+    im: Image.Image,
+    groups: list[str],
+    work_dir: str,
+    jpeg_kwargs: dict,
+    zip_compression: int,
+    watermark: bool = False,
+    preview: bool = False,
+    crops: dict | None = None,
+    on_archive=None,
+    max_zip_bytes: int | None = None,
+    cancel=None,
+) -> list[dict]:
+    """
+    Render every size of every group in parallel (RENDER_WORKERS threads,
+    Pillow releases the GIL in resize/encode; or RENDER_PROCESSES worker
+    processes on a shared-memory source), then write one ZIP per group.
+    Workers hand back finished ZIP entries (JPEG bytes + CRC), so writing a
+    group ZIP is a sequential copy; no per-size JPEG files touch the disk.
+    Returns [{"group", "name", "path", "zip_bytes", "files"}] in group order.
+
+    Each group's ZIP is written as soon as its last size is rendered, and
+    on_archive(archive) (if given) is called right then from this thread,
+    while later groups are still rendering. With max_zip_bytes a group that
+    doesn't fit is split into <group>_partN.zip archives. cancel is checked
+    before every size (RenderCancelled).
+    """
+    plan = build_render_plan(groups, PREVIEW_LONG_SIDE if preview else None)
+    if preview and max(im.size) > PREVIEW_LONG_SIDE:
+        # Shrink the source once; every preview size is at most this big
+        scale = PREVIEW_LONG_SIDE / max(im.size)
+        size = (max(1, round(im.width * scale)), max(1, round(im.height * scale)))
+        im = im.resize(size, Image.LANCZOS, reducing_gap=2.0)
+    remaining = {group: sum(1 for item in plan if item["group"] == group) for group in groups}
+    rendered = {group: [] for group in groups}
+    archives = []
+    # The plan is in group order and entries come back in order: a group
+    # is done when its last entry arrives.
+    entries = _render_entries(im, plan, jpeg_kwargs, zip_compression, watermark, crops, cancel)
+    for item, entry in zip(plan, entries):
+        group = item["group"]
+        rendered[group].append(entry)
+        remaining[group] -= 1
+        if remaining[group] == 0:
+            for archive in _write_group_zips(group, rendered[group], work_dir, preview, max_zip_bytes):
+                archives.append(archive)
+                if on_archive:
+                    on_archive(archive)
+    return archives
+
+
+def render_items(
+    im: Image.Image,
+    items: list[dict],
+    work_dir: str,
+    jpeg_kwargs: dict,
+    zip_compression: int,
+    as_zip: bool = False,
+    crops: dict | None = None,
+    cancel=None,
+) -> list[str]:
+    """
+    Explicit plan entries (webapp Single Export) -> separate JPGs or one
+    single_export.zip in work_dir. Returns file names.
+    """
+    items = [dict(item, group="", dpi=tuple(item["dpi"])) for item in items]
+    with ThreadPoolExecutor(max_workers=max(1, RENDER_WORKERS)) as pool:
+        if as_zip:
+            entries = list(pool.map(
+                lambda item: _render_entry(im, item, jpeg_kwargs, zip_compression, False, crops, cancel),
+                items,
+            ))
+        else:
+            paths = list(pool.map(
+                lambda item: _render_to_file(im, item, work_dir, jpeg_kwargs, False, crops, cancel),
+                items,
+            ))
+
+    if not as_zip:
+        return [os.path.basename(p) for p in paths]
+
+    write_zip(os.path.join(work_dir, "single_export.zip"), entries)
+    return ["single_export.zip"]
+
@@ -0,0 +1,230 @@
+import cProfile
+import functools
+import hmac
+import inspect
+import json
+import os
+import pstats
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+# ---------------------------------------------------------
+# On-demand request profiling
+#
+# Off unless PROFILE_SAMPLE_RATE > 0 or PROFILE_TOKEN is set; when both
+# are unset, profiled() returns the function untouched (zero overhead).
+#   PROFILE_SAMPLE_RATE  fraction of requests to profile (0..1)
+#   PROFILE_TOKEN        requests sending "X-Profile-Token: <token>" are
+#                        always profiled
+#   PROFILE_MODE         sample (default): stack samples of every thread
+#                        every PROFILE_INTERVAL_MS, so render pool threads
+#                        show up; written as folded stacks (flamegraph.pl /
+#                        speedscope input). cprofile: deterministic, calling
+#                        thread only; written as a pstats .prof file.
+#   PROFILE_DIR / PROFILE_KEEP   ring of the most recent profiles
+#
+# One request is profiled at a time (others run unprofiled), which also
+# keeps samples from two profiled requests apart. Samples still include
+# whatever else the process runs meanwhile.
+# Same as src/profiling.py in the webapp (separate image -> keep in sync)
+# ---------------------------------------------------------
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "").strip()
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample").strip().lower()
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR") or Path(tempfile.gettempdir()) / "snaptosize_profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_HEADER = "x-profile-token"
+PROFILE_MODES = ("sample", "cprofile")
+
+ENABLED = PROFILE_SAMPLE_RATE > 0 or bool(PROFILE_TOKEN)
+if ENABLED and PROFILE_MODE not in PROFILE_MODES:
+    raise ValueError(f"PROFILE_MODE must be one of {PROFILE_MODES}, got {PROFILE_MODE!r}")
+
+_ACTIVE = threading.Lock()
+_TOP = 15
+# Innermost Python frame of a parked thread (lock/queue/selector wait, idle
+# pool worker): kept in the folded stacks, left out of the top_self summary
+_IDLE_FILES = ("threading.py:", "queue.py:", "selectors.py:", "thread.py:")
+
+
+def wanted(token: str | None = None) -> bool:
+    """Should this request be profiled? (token = X-Profile-Token value)"""
+    if not ENABLED:
+        return False
+    if PROFILE_TOKEN and token and hmac.compare_digest(token.strip(), PROFILE_TOKEN):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class StackSampler:
+    """Samples every other thread's stack from a daemon thread."""
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_s):
+            self.samples += 1
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(tid, str(tid)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def save(self, path: Path) -> dict:
+        path.write_text("".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common()), encoding="utf-8")
+        leaves = Counter()
+        idle = 0
+        for stack, n in self.stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            if any(f"({name}" in leaf for name in _IDLE_FILES):
+                idle += n
+            else:
+                leaves[leaf] += n
+        busy = sum(leaves.values()) or 1
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval_s * 1000,
+            "idle_thread_samples": idle,
+            # share of non-idle thread samples spent in each function itself
+            "top_self": [[name, round(n / busy, 3)] for name, n in leaves.most_common(_TOP)],
+        }
+
+
+def _save_cprofile(prof: cProfile.Profile, path: Path) -> dict:
+    prof.dump_stats(str(path))
+    stats = pstats.Stats(prof).stats
+    top = sorted(stats.items(), key=lambda kv: kv[1][2], reverse=True)[:_TOP]
+    return {
+        "top_self": [
+            [f"{func} ({os.path.basename(file)}:{line})", round(tottime, 4)]
+            for (file, line, func), (_, _, tottime, _, _) in top
+        ],
+    }
+
+
+def _prune():
+    """Keep the PROFILE_KEEP newest profiles (metadata + data file)."""
+    metas = sorted(PROFILE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for meta in metas[PROFILE_KEEP:]:
+        for p in PROFILE_DIR.glob(f"{meta.stem}.*"):
+            p.unlink(missing_ok=True)
+
+
+@contextmanager
+def profile_request(kind: str, meta: dict | None = None):
+    """
+    Profile the block and save it with meta (yielded, so the caller can
+    add fields as it learns them). Yields None if another request is
+    being profiled right now.
+    """
+    if not _ACTIVE.acquire(blocking=False):
+        yield None
+        return
+    meta = dict(meta or {})
+    started = time.time()
+    t0 = time.perf_counter()
+    if PROFILE_MODE == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+        profiler.start()
+    status = "ok"
+    try:
+        yield meta
+    except BaseException as e:
+        status = f"error: {type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        if PROFILE_MODE == "cprofile":
+            profiler.disable()
+        else:
+            profiler.stop()
+        wall_s = time.perf_counter() - t0
+        try:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            stem = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}_{kind}_{uuid.uuid4().hex[:6]}"
+            if PROFILE_MODE == "cprofile":
+                data_path = PROFILE_DIR / f"{stem}.prof"
+                summary = _save_cprofile(profiler, data_path)
+            else:
+                data_path = PROFILE_DIR / f"{stem}.folded"
+                summary = profiler.save(data_path)
+            record = {
+                "kind": kind,
+                "mode": PROFILE_MODE,
+                "started_at": started,
+                "wall_s": round(wall_s, 3),
+                "status": status,
+                "pid": os.getpid(),
+                "meta": meta,
+                "data": data_path.name,
+                **summary,
+            }
+            (PROFILE_DIR / f"{stem}.json").write_text(json.dumps(record, indent=2, default=str), encoding="utf-8")
+            _prune()
+            print(f"profile saved: {data_path} ({wall_s:.2f}s, {status})")
+        except OSError as e:
+            print(f"profile save failed ({kind}): {e}")
+        finally:
+            _ACTIVE.release()
+
+
+def profiled(kind: str, meta_fn=None):
+    """
+    Decorator for request handlers (sync). A "request" argument (gr.Request
+    or anything with .headers) is checked for X-Profile-Token. meta_fn gets
+    the bound arguments dict and returns the metadata to save.
+    """
+    def deco(fn):
+        if not ENABLED:
+            return fn
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = sig.bind_partial(*args, **kwargs)
+            bound.apply_defaults()
+            request = bound.arguments.get("request")
+            headers = getattr(request, "headers", None) or {}
+            if not wanted(headers.get(PROFILE_HEADER)):
+                return fn(*args, **kwargs)
+            meta = {}
+            if meta_fn:
+                try:
+                    meta = meta_fn(bound.arguments)
+                except Exception as e:
+                    meta = {"meta_error": f"{type(e).__name__}: {e}"}
+            with profile_request(kind, meta):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
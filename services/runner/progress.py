@@ -0,0 +1,97 @@
+import asyncio
+import os
+import time
+
+import httpx
+
+# ---------------------------------------------------------
+# Job progress events
+#
+# One ordered event stream per job: {"job_id", "seq", "stage",
+# "elapsed_s", ...stage fields}. Events go to
+#   - payload.progress_url (POSTed one at a time, in order, with the
+#     runner's bearer token; the worker's /progress/{job_id}), and/or
+#   - a stream queue (NDJSON /generate response).
+# Delivery is best effort: a failing callback is logged and never fails
+# the job. close() flushes what is queued (bounded by a timeout) so the
+# last event lands before the job's final response.
+# ---------------------------------------------------------
+PROGRESS_TIMEOUT_S = float(os.getenv("PROGRESS_TIMEOUT_S", "5"))
+PROGRESS_FLUSH_TIMEOUT_S = float(os.getenv("PROGRESS_FLUSH_TIMEOUT_S", "10"))
+
+
+class JobProgress:
+    def __init__(self, job_id: str, callback_url: str | None = None, token: str = "",
+                 stream: asyncio.Queue | None = None):
+        self.job_id = job_id
+        self.callback_url = callback_url if callback_url and callback_url.startswith(("http://", "https://")) else None
+        self.token = token
+        self.stream = stream
+        self.seq = 0
+        self._t0 = time.perf_counter()
+        self._loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue() if self.callback_url else None
+        self._sender = asyncio.create_task(self._send_loop()) if self.callback_url else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._outbox is not None or self.stream is not None
+
+    def emit(self, stage: str, **fields):
+        """Record one event (event-loop thread)."""
+        if not self.enabled:
+            return
+        self.seq += 1
+        event = {
+            "job_id": self.job_id,
+            "seq": self.seq,
+            "stage": stage,
+            "elapsed_s": round(time.perf_counter() - self._t0, 3),
+            **fields,
+        }
+        if self._outbox is not None:
+            self._outbox.put_nowait(event)
+        if self.stream is not None:
+            self.stream.put_nowait(event)
+
+    def emit_threadsafe(self, stage: str, **fields):
+        """emit() from a render thread."""
+        if self.enabled:
+            self._loop.call_soon_threadsafe(lambda: self.emit(stage, **fields))
+
+    async def _send_loop(self):
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        async with httpx.AsyncClient(timeout=PROGRESS_TIMEOUT_S) as client:
+            while True:
+                event = await self._outbox.get()
+                if event is None:
+                    return
+                try:
+                    r = await client.post(self.callback_url, json=event, headers=headers)
+                    r.raise_for_status()
+                except httpx.HTTPError as e:
+                    print(f"progress callback failed job={self.job_id} seq={event['seq']}: {type(e).__name__}: {e}")
+
+    async def close(self):
+        if self._sender is None:
+            return
+        self._outbox.put_nowait(None)
+        try:
+            await asyncio.wait_for(self._sender, PROGRESS_FLUSH_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            print(f"progress flush timed out job={self.job_id}")
+
+
+def send_event(job_id: str, callback_url: str | None, token: str, stage: str, **fields):
+    """
+    One event for a job no JobProgress is running for (a job whose last
+    lease expired). Blocking, best effort like the rest.
+    """
+    if not (callback_url and callback_url.startswith(("http://", "https://"))):
+        return
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    event = {"job_id": job_id, "seq": 0, "stage": stage, **fields}
+    try:
+        httpx.post(callback_url, json=event, headers=headers, timeout=PROGRESS_TIMEOUT_S).raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"progress callback failed job={job_id} stage={stage}: {type(e).__name__}: {e}")
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# ---------------------------------------------------------
+# Downloaded sources on local disk
+#
+# Sellers re-run jobs on the same hosted image URL with other presets.
+# Instead of downloading up to 25MB again, the runner keeps what it
+# downloaded and revalidates it with a conditional GET (If-None-Match /
+# If-Modified-Since): a repeat job costs a 304.
+#
+#   urls/{sha256(url)}.json  validators (ETag, Last-Modified) + what
+#                            the first download verified (sha256,
+#                            bytes, format, width, height)
+#   blobs/{sha256(bytes)}    the bytes, shared by URLs with the same
+#                            content
+#
+# Only responses with a validator (and without Cache-Control no-store)
+# are kept. Blob mtimes track use; past SOURCE_CACHE_MB the least
+# recently used blobs are removed, and URL entries pointing at a
+# removed blob count as misses. Files are written to a temp name and
+# renamed, so concurrent jobs and crashes never leave a partial blob.
+# Blocking; call off the event loop.
+# ---------------------------------------------------------
+SOURCE_CACHE_DIR = os.getenv("SOURCE_CACHE_DIR", "/tmp/snaptosize_sources")
+SOURCE_CACHE_MB = int(os.getenv("SOURCE_CACHE_MB", "1024"))  # 0 = off
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def cacheable(headers) -> bool:
+    """Worth keeping: has a validator and the origin allows storing it."""
+    if "no-store" in (headers.get("cache-control") or "").lower():
+        return False
+    return bool(headers.get("etag") or headers.get("last-modified"))
+
+
+def validators(entry: dict | None) -> dict:
+    """Conditional request headers for a cached entry."""
+    if not entry:
+        return {}
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+class SourceCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._urls = self.root / "urls"
+        self._blobs = self.root / "blobs"
+        self._urls.mkdir(parents=True, exist_ok=True)
+        self._blobs.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "changed": 0, "stored": 0, "evicted": 0, "bytes_saved": 0}
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def lookup(self, url: str) -> dict | None:
+        """The entry for url, if its blob is still here."""
+        path = self._urls / f"{_url_key(url)}.json"
+        try:
+            entry = json.loads(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url or not (self._blobs / entry["sha256"]).is_file():
+            path.unlink(missing_ok=True)
+            return None
+        return entry
+
+    def read(self, entry: dict) -> bytes | None:
+        """Blob bytes for a revalidated entry (None if evicted meanwhile). Counts a hit."""
+        blob = self._blobs / entry["sha256"]
+        try:
+            content = blob.read_bytes()
+            os.utime(blob)
+        except OSError:
+            return None
+        if len(content) != entry["bytes"]:
+            return None
+        self.count("hits")
+        self.count("bytes_saved", len(content))
+        return content
+
+    def store(self, url: str, content: bytes, headers, info: dict, sha256: str | None = None) -> dict | None:
+        """
+        Keep content for url. info = what was verified (format, width,
+        height). Returns the entry, or None when not cacheable.
+        """
+        if not cacheable(headers) or len(content) > self.max_bytes:
+            return None
+        sha256 = sha256 or hashlib.sha256(content).hexdigest()
+        blob = self._blobs / sha256
+        if blob.is_file():
+            os.utime(blob)
+        else:
+            _write_atomic(blob, content)
+        entry = {
+            "url": url,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "sha256": sha256,
+            "bytes": len(content),
+            "stored_at": time.time(),
+            **info,
+        }
+        _write_atomic(self._urls / f"{_url_key(url)}.json", json.dumps(entry).encode("utf-8"))
+        self.count("stored")
+        self.evict()
+        return entry
+
+    def evict(self) -> int:
+        """Drop least recently used blobs until the cache fits max_bytes. Returns how many."""
+        blobs = []
+        for path in self._blobs.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            blobs.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in blobs)
+        removed = 0
+        for _, size, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        if removed:
+            self.count("evicted", removed)
+            self._drop_dangling()
+        return removed
+
+    def _drop_dangling(self):
+        for path in self._urls.glob("*.json"):
+            try:
+                sha256 = json.loads(path.read_bytes())["sha256"]
+            except (OSError, ValueError, KeyError):
+                continue
+            if not (self._blobs / sha256).is_file():
+                path.unlink(missing_ok=True)
+
+    def usage(self) -> dict:
+        sizes = [p.stat().st_size for p in self._blobs.iterdir() if not p.name.startswith(".")]
+        with self._lock:
+            stats = dict(self.stats)
+        return {**stats, "blobs": len(sizes), "bytes": sum(sizes), "max_bytes": self.max_bytes}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_source_cache() -> SourceCache | None:
+    """Process-wide cache (None when SOURCE_CACHE_MB=0)."""
+    global _cache
+    if SOURCE_CACHE_MB <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SourceCache(SOURCE_CACHE_DIR, SOURCE_CACHE_MB * 1024 * 1024)
+    return _cache
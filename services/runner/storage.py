@@ -0,0 +1,163 @@
+import json
+import os
+import random
+import threading
+import time
+
+import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+# ---------------------------------------------------------
+# Object storage (R2) - one pooled client per process
+#
+# Building a client per job meant credential resolution + a new
+# TLS connection pool every time. The client is thread-safe and
+# reused by all jobs; uploads use tuned multipart settings.
+#
+# R2_ENDPOINT_URL overrides the R2 endpoint (local S3 stand-in:
+# tools/s3_standin.py).
+# ---------------------------------------------------------
+MB = 1024 * 1024
+R2_MULTIPART_CHUNK_MB = int(os.getenv("R2_MULTIPART_CHUNK_MB", "16"))
+R2_UPLOAD_CONCURRENCY = int(os.getenv("R2_UPLOAD_CONCURRENCY", "8"))
+R2_UPLOAD_ATTEMPTS = int(os.getenv("R2_UPLOAD_ATTEMPTS", "3"))
+R2_RETRY_BASE_S = 0.5
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=R2_MULTIPART_CHUNK_MB * MB,
+    multipart_chunksize=R2_MULTIPART_CHUNK_MB * MB,
+    max_concurrency=R2_UPLOAD_CONCURRENCY,
+    use_threads=True,
+)
+
+_client = None
+_client_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+UPLOAD_STATS = {"uploads": 0, "bytes": 0, "seconds": 0.0, "retries": 0, "failures": 0}
+
+
+def bucket_name() -> str:
+    return os.environ["R2_BUCKET"]
+
+
+def get_s3_client():
+    """Process-wide S3 client (created on first use)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            endpoint = os.getenv("R2_ENDPOINT_URL", "").strip()
+            if not endpoint:
+                endpoint = f"https://{os.environ['R2_ACCOUNT_ID']}.r2.cloudflarestorage.com"
+
+            config = Config(
+                signature_version="s3v4",
+                # botocore retries individual requests/parts; upload_file
+                # below retries the whole transfer on top of that.
+                retries={"max_attempts": 5, "mode": "standard"},
+                max_pool_connections=max(10, R2_UPLOAD_CONCURRENCY * 2),
+                connect_timeout=10,
+                read_timeout=60,
+                tcp_keepalive=True,
+                s3={"addressing_style": "path"},
+            )
+            _client = boto3.client(
+                "s3",
+                endpoint_url=endpoint,
+                aws_access_key_id=os.environ["R2_ACCESS_KEY_ID"],
+                aws_secret_access_key=os.environ["R2_SECRET_ACCESS_KEY"],
+                region_name="auto",
+                config=config,
+            )
+    return _client
+
+
+def reset_client():
+    """Drop the pooled client (next use rebuilds it)."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def upload_file(path: str, key: str, content_type: str = "application/zip") -> dict:
+    """
+    Multipart upload with retry + exponential backoff (jittered).
+    Returns timing metrics: {"bucket", "key", "bytes", "seconds", "mb_per_s", "attempts"}.
+    """
+    bucket = bucket_name()
+    size = os.path.getsize(path)
+    extra = {"ContentType": content_type}
+
+    t0 = time.perf_counter()
+    for attempt in range(1, R2_UPLOAD_ATTEMPTS + 1):
+        try:
+            get_s3_client().upload_file(path, bucket, key, ExtraArgs=extra, Config=TRANSFER_CONFIG)
+            break
+        except (BotoCoreError, ClientError, S3UploadFailedError) as e:
+            if attempt == R2_UPLOAD_ATTEMPTS:
+                with _stats_lock:
+                    UPLOAD_STATS["failures"] += 1
+                raise
+            delay = R2_RETRY_BASE_S * (2 ** (attempt - 1)) * (1 + random.random())
+            print(f"r2 upload retry key={key} attempt={attempt} in {delay:.1f}s ({type(e).__name__})")
+            with _stats_lock:
+                UPLOAD_STATS["retries"] += 1
+            time.sleep(delay)
+    seconds = time.perf_counter() - t0
+
+    with _stats_lock:
+        UPLOAD_STATS["uploads"] += 1
+        UPLOAD_STATS["bytes"] += size
+        UPLOAD_STATS["seconds"] += seconds
+
+    metrics = {
+        "bucket": bucket,
+        "key": key,
+        "bytes": size,
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(size / MB / seconds, 1) if seconds > 0 else None,
+        "attempts": attempt,
+    }
+    print(f"r2 upload key={key} bytes={size} s={metrics['seconds']} MB/s={metrics['mb_per_s']} attempts={attempt}")
+    return metrics
+
+
+def upload_stats() -> dict:
+    with _stats_lock:
+        stats = dict(UPLOAD_STATS)
+    stats["seconds"] = round(stats["seconds"], 3)
+    return stats
+
+
+# ---------------------------------------------------------
+# Small objects + server-side copies (content-addressed outputs)
+# ---------------------------------------------------------
+def get_json(key: str) -> dict | None:
+    """JSON object at key, or None if it does not exist."""
+    try:
+        obj = get_s3_client().get_object(Bucket=bucket_name(), Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404", "NotFound"):
+            return None
+        raise
+    return json.loads(obj["Body"].read())
+
+
+def put_json(key: str, data: dict):
+    body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    get_s3_client().put_object(Bucket=bucket_name(), Key=key, Body=body, ContentType="application/json")
+
+
+def copy_object(src_key: str, dst_key: str, content_type: str = "application/zip"):
+    """Server-side copy within the bucket (no bytes through the runner)."""
+    bucket = bucket_name()
+    get_s3_client().copy_object(
+        Bucket=bucket,
+        Key=dst_key,
+        CopySource={"Bucket": bucket, "Key": src_key},
+        ContentType=content_type,
+        MetadataDirective="REPLACE",
+    )
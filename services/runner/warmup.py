@@ -0,0 +1,134 @@
+import asyncio
+import inspect
+import os
+import time
+
+# ---------------------------------------------------------
+# Warm start
+#
+# Fly suspends idle runners (auto_stop_machines = "suspend") and resumes
+# them on the next request. Without a warm-up the first job pays for
+# everything lazy: codec, LittleCMS and FreeType setup, the storage
+# client and its TLS connection, a process pool's spawns. After a resume
+# it also pays for faulting memory back in from the snapshot and for
+# pooled connections that died while the machine slept.
+#
+# WarmUp runs named steps once at startup, in the background: /health
+# answers at once, and /ready answers 503 until the steps are done. It
+# runs them again when it notices a resume, i.e. the wall clock jumped
+# more than RESUME_GAP_S between ticks, or a job arrives after such a
+# gap. Jobs call ensure() first and wait, up to WARMUP_WAIT_S, for a
+# warm-up in progress. A failing step is recorded, not fatal.
+# ---------------------------------------------------------
+WARMUP = os.getenv("WARMUP", "1").strip() == "1"
+RESUME_GAP_S = float(os.getenv("RESUME_GAP_S", "10"))
+WARMUP_WAIT_S = float(os.getenv("WARMUP_WAIT_S", "30"))
+_TICK_S = 1.0
+
+
+def process_age_s() -> float | None:
+    """Seconds since the interpreter process started (Linux only), like src/startup.py."""
+    try:
+        with open("/proc/self/stat", encoding="ascii") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", encoding="ascii") as f:
+            uptime = float(f.read().split()[0])
+        return round(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 3)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class WarmUp:
+    def __init__(self, steps: list, on_resume=None):
+        """
+        steps = [(name, fn)], run in order; a plain fn runs in a thread,
+        an async one on the loop. on_resume (async) runs first after a
+        resume, e.g. to drop pooled connections.
+        """
+        self.steps = steps
+        self.on_resume = on_resume
+        self.state = "cold" if WARMUP else "off"
+        self.boot_s = None  # process start -> app startup (interpreter + imports)
+        self.last = None
+        self.runs = 0
+        self.resumes = 0
+        self._task = None
+        self._ticker = None
+        self._last_tick = time.time()
+
+    def begin(self):
+        """Startup: warm up in the background and start watching for resumes."""
+        if not WARMUP:
+            return
+        self._start("startup")
+        self._ticker = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        tasks = [t for t in (self._ticker, self._task) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _start(self, reason: str):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(reason))
+
+    async def _run(self, reason: str):
+        self.state = "warming"
+        t0 = time.perf_counter()
+        steps = [("reset", self.on_resume)] if reason == "resume" and self.on_resume else []
+        timings = {}
+        errors = {}
+        for name, fn in steps + list(self.steps):
+            t = time.perf_counter()
+            try:
+                if inspect.iscoroutinefunction(fn):
+                    await fn()
+                else:
+                    await asyncio.to_thread(fn)
+            except Exception as e:
+                errors[name] = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+            timings[name] = round(time.perf_counter() - t, 3)
+        self.runs += 1
+        self.last = {
+            "reason": reason,
+            "finished_at": time.time(),
+            "total_s": round(time.perf_counter() - t0, 3),
+            "steps": timings,
+            "errors": errors,
+        }
+        self.state = "warm"
+        steps_ms = " ".join(f"{name}={s * 1000:.0f}ms" for name, s in timings.items())
+        print(f"warm-up ({reason}) {self.last['total_s'] * 1000:.0f}ms: {steps_ms}"
+              + (f" errors={errors}" if errors else ""))
+
+    def _check_resume(self):
+        now = time.time()
+        gap, self._last_tick = now - self._last_tick, now
+        if WARMUP and gap > RESUME_GAP_S:
+            self.resumes += 1
+            print(f"resumed after ~{gap:.0f}s, warming up")
+            self._start("resume")
+
+    async def _watch(self):
+        while True:
+            self._check_resume()
+            await asyncio.sleep(_TICK_S)
+
+    async def ensure(self):
+        """Before a job: notice a resume, then wait for a warm-up in progress."""
+        self._check_resume()
+        if self._task is None or self._task.done():
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), WARMUP_WAIT_S)
+        except asyncio.TimeoutError:
+            print(f"warm-up still running after {WARMUP_WAIT_S:.0f}s, job goes ahead")
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("warm", "off")
+
+    def report(self) -> dict:
+        return {"state": self.state, "boot_s": self.boot_s, "runs": self.runs, "resumes": self.resumes,
+                "last": self.last}
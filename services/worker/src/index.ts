@@ -33,6 +33,14 @@ export default {
 		  }
 		}
 		const jobId = crypto.randomUUID();
+		// Runner posts per-preset/per-group progress back to /progress/{job_id}
+		if (!body || typeof body !== "object" || Array.isArray(body)) body = {};
+		// /enqueue is public: the tier comes from a grant the webapp signed after
+		// its Stripe check (src/tier_grant.py), never from the client's body
+		const pro = await verifyTierGrant(body.tier_grant, body.image_url, env.TIER_SECRET);
+		body.tier = pro ? "pro" : "free";
+		if (!pro) delete body.tier_grant;
+		body.progress_url = `${env.PUBLIC_BASE_URL || url.origin}/progress/${jobId}`;
   
 		const job = {
 		  job_id: jobId,
@@ -52,6 +60,70 @@ export default {
 		return Response.json({ ok: true, job_id: jobId });
 	  }
   
+	  // POST /progress/{job_id} (runner -> worker, bearer RUNNER_TOKEN)
+	  if (url.pathname.startsWith("/progress/") && request.method === "POST") {
+		if (request.headers.get("Authorization") !== `Bearer ${env.RUNNER_TOKEN}`) {
+		  return new Response("Unauthorized", { status: 401 });
+		}
+		const jobId = url.pathname.split("/")[2];
+		const val = await env.y.get(jobId);
+		if (!val) return new Response("Not found", { status: 404 });
+		const jobState = JSON.parse(val);
+		// Late events never overwrite a finished job
+		if (jobState.status !== "running" && jobState.status !== "queued") {
+		  return Response.json({ ok: true, ignored: true });
+		}
+
+		let event: any;
+		try {
+		  event = await request.json();
+		} catch {
+		  return new Response("Bad request", { status: 400 });
+		}
+		// Queued jobs (RUNNER_QUEUE_URL) end with a result/error event instead of a response
+		if (event.stage === "result") {
+		  const done = await doneState(jobId, event.result, env, env.PUBLIC_BASE_URL || url.origin);
+		  await env.y.put(jobId, JSON.stringify(done), { expirationTtl: KV_TTL });
+		  return Response.json({ ok: true });
+		}
+		if (event.stage === "error") {
+		  await env.y.put(
+			jobId,
+			JSON.stringify({ status: "error", job_id: jobId, http: event.status ?? null, error: event.error }),
+			{ expirationTtl: KV_TTL }
+		  );
+		  return Response.json({ ok: true });
+		}
+		if (jobState.status === "queued") {
+		  jobState.status = "running";
+		  jobState.started_at = Date.now();
+		}
+		jobState.progress = {
+		  stage: event.stage,
+		  name: event.name ?? null,
+		  done: event.done ?? null,
+		  total: event.total ?? null,
+		  elapsed_s: event.elapsed_s ?? null,
+		};
+		// Finished artifacts are downloadable before the whole job is done
+		if (event.stage === "artifact" && event.r2_key) {
+		  const index = Number.isInteger(event.index) ? event.index : (jobState.r2_keys || []).length;
+		  const r2Keys: string[] = jobState.r2_keys || [];
+		  r2Keys[index] = event.r2_key;
+		  jobState.r2_keys = r2Keys;
+		  const parts: any[] = jobState.partial_archives || [];
+		  parts[index] = { name: event.name, r2_key: event.r2_key, zip_bytes: event.bytes ?? null };
+		  jobState.partial_archives = parts;
+		  if (!jobState.download_token) {
+			jobState.download_token = crypto.randomUUID();
+			jobState.download_url = `${env.PUBLIC_BASE_URL || url.origin}/download/${jobId}?token=${jobState.download_token}`;
+		  }
+		  jobState.download_urls = r2Keys.map((_, i) => `${jobState.download_url}&part=${i}`);
+		}
+		await env.y.put(jobId, JSON.stringify(jobState), { expirationTtl: KV_TTL });
+		return Response.json({ ok: true });
+	  }
+
 	  // GET /status/{job_id}
 	  if (url.pathname.startsWith("/status/") && request.method === "GET") {
 		const jobId = url.pathname.split("/")[2];
@@ -70,14 +142,18 @@ export default {
 		if (token !== jobState.download_token) {
 		  return new Response("Unauthorized", { status: 401 });
 		}
-		const r2Key = jobState.r2_key;
+		// ?part=N selects one archive of a print-set job (default: first)
+		const part = parseInt(url.searchParams.get("part") || "0", 10);
+		const r2Keys: string[] = jobState.r2_keys || (jobState.r2_key ? [jobState.r2_key] : []);
+		const r2Key = r2Keys[isNaN(part) ? 0 : part];
 		if (!r2Key) return new Response("Not found", { status: 404 });
 		const obj = await env.ZIPS.get(r2Key);
 		if (!obj) return new Response("Not found", { status: 404 });
+		const filename = r2Key.split("/").pop() || "etsy_pack_v1.zip";
 		return new Response(obj.body, {
 		  headers: {
 		    "Content-Type": "application/zip",
-		    "Content-Disposition": 'attachment; filename="etsy_pack_v1.zip"',
+		    "Content-Disposition": `attachment; filename="${filename}"`,
 		    "Cache-Control": "no-store",
 		  },
 		});
@@ -104,9 +180,14 @@ export default {
 	  }
 	}
 
+	if (env.RUNNER_QUEUE_URL) {
+	  await enqueueForRunners(job, env);
+	  return;
+	}
+
 	await env.y.put(
 	  jobId,
-	  JSON.stringify({ status: "running", job_id: jobId, started_at: Date.now() }),
+	  JSON.stringify({ status: "running", job_id: jobId, started_at: Date.now(), progress: { stage: "starting" } }),
 	  { expirationTtl: KV_TTL }
 	);
   
@@ -131,28 +212,38 @@ export default {
 		return;
 	  }
 
-	  const runnerResult = safeJson(text);
-	  const r2Key = runnerResult?.r2_key || runnerResult?.result?.r2_key;
+	  const jobState = await doneState(jobId, safeJson(text), env, env.PUBLIC_BASE_URL || new URL(request.url).origin);
+	  await env.y.put(jobId, JSON.stringify(jobState), { expirationTtl: KV_TTL });
+	} catch (err: any) {
+	  await env.y.put(
+		jobId,
+		JSON.stringify({ status: "error", job_id: jobId, error: String(err?.message || err) }),
+		{ expirationTtl: KV_TTL }
+	  );
+	}
+  }
 
-	  let downloadUrl: string | null = null;
-	  let downloadToken: string | null = null;
-	  if (r2Key) {
-		downloadToken = crypto.randomUUID();
-		const origin = env.PUBLIC_BASE_URL || new URL(request.url).origin;
-		downloadUrl = `${origin}/download/${jobId}?token=${downloadToken}`;
+  // Pull-based runners (services/runner/job_queue.py): the job waits in the
+  // queue until a runner leases it; the runner's "leased" progress event marks
+  // it running and its "result"/"error" event finishes it (/progress above).
+  async function enqueueForRunners(job: any, env: any) {
+	const jobId = job.job_id;
+	try {
+	  const res = await fetch(`${env.RUNNER_QUEUE_URL}/queue/jobs`, {
+		method: "POST",
+		headers: {
+		  "content-type": "application/json",
+		  "authorization": `Bearer ${env.RUNNER_TOKEN}`,
+		},
+		body: JSON.stringify({ job }),
+	  });
+	  if (!res.ok) {
+		await env.y.put(
+		  jobId,
+		  JSON.stringify({ status: "error", job_id: jobId, http: res.status, error: await res.text() }),
+		  { expirationTtl: KV_TTL }
+		);
 	  }
-
-	  const jobState = {
-		status: "done",
-		job_id: jobId,
-		finished_at: Date.now(),
-		result: runnerResult,
-		r2_key: r2Key ?? null,
-		download_token: downloadToken,
-		download_url: downloadUrl,
-	  };
-
-	  await env.y.put(jobId, JSON.stringify(jobState), { expirationTtl: KV_TTL });
 	} catch (err: any) {
 	  await env.y.put(
 		jobId,
@@ -162,6 +253,50 @@ export default {
 	}
   }
 
+  async function doneState(jobId: string, runnerResult: any, env: any, origin: string) {
+	const r2Key = runnerResult?.r2_key || runnerResult?.result?.r2_key;
+	// Print-set jobs return one archive per group
+	const archives: any[] = runnerResult?.archives || [];
+	const r2Keys: string[] = archives.length
+	  ? archives.map((a: any) => a.r2_key).filter(Boolean)
+	  : (r2Key ? [r2Key] : []);
+
+	let downloadUrl: string | null = null;
+	let downloadToken: string | null = null;
+	let downloadUrls: string[] = [];
+	if (r2Keys.length) {
+	  // Keep the token handed out with partial artifacts (/progress)
+	  const current = await env.y.get(jobId);
+	  downloadToken = (current && JSON.parse(current).download_token) || crypto.randomUUID();
+	  downloadUrl = `${origin}/download/${jobId}?token=${downloadToken}`;
+	  downloadUrls = r2Keys.map((_, i) => `${downloadUrl}&part=${i}`);
+	}
+
+	return {
+	  status: "done",
+	  job_id: jobId,
+	  finished_at: Date.now(),
+	  result: runnerResult,
+	  r2_key: r2Key ?? r2Keys[0] ?? null,
+	  r2_keys: r2Keys,
+	  download_token: downloadToken,
+	  download_url: downloadUrl,
+	  download_urls: downloadUrls,
+	};
+  }
+
+  // tier_grant = "{expires}.{hex HMAC-SHA256(TIER_SECRET, `pro:${image_url}:${expires}`)}"
+  async function verifyTierGrant(grant: unknown, imageUrl: unknown, secret: string | undefined): Promise<boolean> {
+	if (!secret || typeof grant !== "string" || typeof imageUrl !== "string") return false;
+	const [expires, sig] = grant.split(".");
+	if (!/^\d+$/.test(expires || "") || Number(expires) * 1000 < Date.now()) return false;
+	if (!/^[0-9a-f]{64}$/.test(sig || "")) return false;
+	const enc = new TextEncoder();
+	const key = await crypto.subtle.importKey("raw", enc.encode(secret), { name: "HMAC", hash: "SHA-256" }, false, ["verify"]);
+	const sigBytes = new Uint8Array(sig.match(/../g)!.map((h) => parseInt(h, 16)));
+	return crypto.subtle.verify("HMAC", key, sigBytes, enc.encode(`pro:${imageUrl}:${expires}`));
+  }
+
   async function checkImageSize(imageUrl: string): Promise<{ error?: string }> {
 	try {
 	  const headRes = await fetch(imageUrl, { method: "HEAD" });
@@ -0,0 +1,85 @@
+import io
+import zipfile
+
+from PIL import Image
+
+# ---------------------------------------------------------
+# JPEG encode profiles
+# Shared by the webapp and the CLI. The runner keeps a copy
+# in services/runner/main.py (separate image) -> keep in sync.
+#
+# JPEGs barely shrink under deflate, so only "smallest" pays
+# for ZIP_DEFLATED. See README "Encode profiles" for numbers
+# (tools/bench_encode.py).
+# ---------------------------------------------------------
+DPI = (300, 300)
+
+DEFAULT_ENCODE_PROFILE = "balanced"
+
+ENCODE_PROFILES = {
+    "fast": {
+        "quality": 80,
+        "subsampling": "4:2:0",
+        "optimize": False,
+        "progressive": False,
+        "zip_compression": zipfile.ZIP_STORED,
+    },
+    "balanced": {
+        "quality": 80,
+        "subsampling": "4:2:0",
+        "optimize": True,
+        "progressive": False,
+        "zip_compression": zipfile.ZIP_STORED,
+    },
+    "smallest": {
+        "quality": 76,
+        "subsampling": "4:2:0",
+        "optimize": True,
+        "progressive": True,
+        "zip_compression": zipfile.ZIP_DEFLATED,
+    },
+}
+
+ENCODE_PROFILE_NAMES = list(ENCODE_PROFILES.keys())
+
+
+def get_encode_profile(name: str | None) -> dict:
+    """Look up a profile by name (None/empty -> default). Raises ValueError."""
+    key = (name or DEFAULT_ENCODE_PROFILE).strip().lower()
+    if key not in ENCODE_PROFILES:
+        raise ValueError(
+            f"Unknown encode profile '{name}'. "
+            f"Choose one of: {', '.join(ENCODE_PROFILE_NAMES)}"
+        )
+    return ENCODE_PROFILES[key]
+
+
+def jpeg_save_kwargs(profile: dict, dpi=DPI, icc_profile: bytes | None = None) -> dict:
+    """Keyword arguments for Image.save(..., "JPEG", **kwargs)."""
+    kwargs = {
+        "quality": profile["quality"],
+        "subsampling": profile["subsampling"],
+        "optimize": profile["optimize"],
+        "progressive": profile["progressive"],
+        "dpi": dpi,
+    }
+    if icc_profile:
+        # Pillow drops the source color profile on save unless passed
+        kwargs["icc_profile"] = icc_profile
+    return kwargs
+
+
+def save_jpeg(img: Image.Image, fp, profile: dict, dpi=DPI, icc_profile: bytes | None = None):
+    """Save img as JPEG to a path or file object using profile."""
+    img.save(fp, "JPEG", **jpeg_save_kwargs(profile, dpi, icc_profile))
+
+
+def encode_jpeg(img: Image.Image, profile: dict, dpi=DPI, icc_profile: bytes | None = None) -> bytes:
+    buf = io.BytesIO()
+    save_jpeg(img, buf, profile, dpi, icc_profile)
+    return buf.getvalue()
+
+
+def zip_compression(profile: dict) -> int:
+    """ZIP entry compression for JPEG entries (ZIP_STORED or ZIP_DEFLATED)."""
+    return profile["zip_compression"]
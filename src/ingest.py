@@ -0,0 +1,184 @@
+import hashlib
+import io
+import math
+import os
+import threading
+
+from PIL import Image, ImageCms, ImageOps, features
+
+# ---------------------------------------------------------
+# Source ingest (open + normalize), shared by webapp and CLI
+# ---------------------------------------------------------
+MAX_INPUT_PX = 10000  # safe, generous, print-quality friendly
+
+# Upload checks, read from the header before anything is decoded. Bytes
+# are also capped at the HTTP upload (app.py max_file_size).
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+MAX_SOURCE_MPX = int(os.getenv("MAX_SOURCE_MPX", "150"))  # megapixels the decoder may be asked to hold
+
+# HEIC/HEIF (iPhone photos) via pillow-heif, AVIF via Pillow's own
+# plugin (Pillow 11.3+ wheels). Registered once at import, so every
+# Image.open in the process (the upload probe included) can
+# read them.
+try:
+    import pillow_heif
+
+    pillow_heif.register_heif_opener()
+    HEIF_SUPPORTED = True
+except ImportError:
+    HEIF_SUPPORTED = False
+
+AVIF_SUPPORTED = "avif" in features.modules and bool(features.check_module("avif"))
+
+
+# ---------------------------------------------------------
+# Color management: everything leaves ingest as sRGB
+#
+# CMYK, Adobe RGB, Display P3, ... are converted with the embedded ICC
+# profile (LittleCMS via ImageCms), once per source, after the size cap /
+# preview reduction and before any per-size render. Building a transform
+# costs far more than applying one to a preview, so transforms are cached
+# by (profile hash, mode, intent) for the life of the process.
+# ---------------------------------------------------------
+COLOR_INTENT = ImageCms.Intent.RELATIVE_COLORIMETRIC
+# NOCACHE: the transform is shared by threads (LittleCMS' 1-pixel cache is not)
+_TRANSFORM_FLAGS = ImageCms.Flags.BLACKPOINTCOMPENSATION | ImageCms.Flags.NOCACHE
+_TRANSFORM_CACHE_MAX = 32
+
+SRGB_PROFILE = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+SRGB_ICC = SRGB_PROFILE.tobytes()
+
+_transforms = {}  # (profile sha256, mode, intent) -> ImageCmsTransform | None (already sRGB)
+_transforms_lock = threading.Lock()
+
+
+def _srgb_transform(icc_profile: bytes, mode: str, intent=COLOR_INTENT):
+    """Cached profile -> sRGB transform; None when no conversion is needed."""
+    key = (hashlib.sha256(icc_profile).hexdigest(), mode, int(intent))
+    with _transforms_lock:
+        if key in _transforms:
+            return _transforms[key]
+
+    src = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+    if mode == "RGB" and ImageCms.getProfileDescription(src).strip().startswith("sRGB"):
+        transform = None
+    else:
+        transform = ImageCms.buildTransform(src, SRGB_PROFILE, mode, "RGB", intent, _TRANSFORM_FLAGS)
+
+    with _transforms_lock:
+        if len(_transforms) >= _TRANSFORM_CACHE_MAX:
+            _transforms.pop(next(iter(_transforms)))
+        _transforms[key] = transform
+    return transform
+
+
+def _working_mode(im: Image.Image) -> Image.Image:
+    """
+    Reduce to a mode the ICC profile can describe: CMYK stays CMYK, gray
+    stays L, everything else becomes RGB (alpha dropped, palette expanded).
+    """
+    if im.mode in ("RGB", "CMYK", "L"):
+        return im
+    if im.mode in ("1", "LA", "I;16", "I;16B", "I;16L", "I", "F"):
+        return im.convert("L")
+    return im.convert("RGB")
+
+
+def to_srgb(im: Image.Image, icc_profile: bytes | None) -> Image.Image:
+    """Convert a working-mode image to sRGB using its profile. Output is tagged sRGB."""
+    transform = None
+    if icc_profile:
+        try:
+            transform = _srgb_transform(icc_profile, im.mode)
+        except (ImageCms.PyCMSError, OSError, ValueError) as e:
+            # Broken/unsupported profile (or gray profile on RGB data): plain convert
+            print(f"⚠️ ICC profile ignored ({type(e).__name__}: {e})")
+
+    if transform is not None:
+        im = ImageCms.applyTransform(im, transform)
+    elif im.mode != "RGB":
+        im = im.convert("RGB")
+
+    im.info["icc_profile"] = SRGB_ICC
+    return im
+
+
+def normalize_image(im: Image.Image, max_side: int | None = None) -> Image.Image:
+    """
+    Fix EXIF rotation + downscale huge images (or to max_side) + convert to sRGB.
+    Size reduction happens before color conversion, so the transform only
+    ever touches the pixels that are kept.
+    """
+    icc_profile = im.info.get("icc_profile")
+    im = ImageOps.exif_transpose(im)
+    im = _working_mode(im)
+
+    # 🔒 HARD SIZE LIMIT (prevents huge uploads killing UI/memory)
+    w, h = im.size
+    if max(w, h) > MAX_INPUT_PX:
+        scale = MAX_INPUT_PX / max(w, h)
+        im = im.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+
+    if max_side and max(im.size) > max_side:
+        im.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    return to_srgb(im, icc_profile)
+
+
+def open_source(image_path, max_side: int | None = None) -> Image.Image:
+    """
+    Open + normalize an uploaded image (JPEG, PNG, HEIC/HEIF, AVIF, ...).
+
+    With max_side (preview renders) the decoder is asked for a reduced
+    image first: JPEGs decode at 1/2, 1/4 or 1/8 scale (draft mode),
+    HEIC/HEIF use an embedded thumbnail when one is at least max_side.
+    Anything else decodes in full and is capped to max_side, so a
+    10000px upload never exists at full size longer than needed.
+
+    EXIF orientation is applied; the result is RGB in sRGB (tagged).
+    """
+    im = Image.open(image_path)
+    if max_side:
+        # Ask for the target box at the image's own aspect: decoders only
+        # reduce while both sides stay >= the requested size.
+        w, h = im.size
+        scale = min(1.0, max_side / max(w, h))
+        im.draft(im.mode if im.mode == "CMYK" else "RGB",
+                 (max(1, math.ceil(w * scale)), max(1, math.ceil(h * scale))))
+
+    return normalize_image(im, max_side)
+
+
+class SourceRejected(ValueError):
+    """Upload refused from its header (not a readable image, too large)."""
+
+
+def probe_source(image_path) -> dict:
+    """
+    Header-only look at an upload: format, size (as stored, before EXIF
+    rotation), mode, bytes, whether it carries an ICC profile / EXIF.
+    Nothing is decoded. Raises SourceRejected for files ingest would
+    refuse or that would not fit in memory.
+    """
+    nbytes = os.path.getsize(image_path)
+    if nbytes > MAX_UPLOAD_MB * 1024 * 1024:
+        raise SourceRejected(f"File is {nbytes / 1024 / 1024:.0f}MB; the limit is {MAX_UPLOAD_MB}MB.")
+    try:
+        with Image.open(image_path) as im:
+            info = {
+                "format": im.format,
+                "size": list(im.size),
+                "mode": im.mode,
+                "bytes": nbytes,
+                "icc": bool(im.info.get("icc_profile")),
+                "exif": bool(im.getexif()),
+            }
+    except Image.DecompressionBombError:
+        raise SourceRejected("Image has too many pixels to open safely.")
+    except (Image.UnidentifiedImageError, OSError, SyntaxError):
+        raise SourceRejected("Not an image we can read (JPG, PNG, WebP, HEIC, AVIF).")
+
+    w, h = info["size"]
+    if w * h > MAX_SOURCE_MPX * 1_000_000:
+        raise SourceRejected(f"Image is {w}x{h} ({w * h / 1e6:.0f}MP); the limit is {MAX_SOURCE_MPX}MP.")
+    return info
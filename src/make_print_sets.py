@@ -1,27 +1,44 @@
-import io
+import argparse
+import multiprocessing
 import os
-import zipfile
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
-from PIL import Image, ImageOps
+from PIL import Image
 from tqdm import tqdm
 
+# Shared modules live under src/ (run as: python src/make_print_sets.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.encode import (
+    DEFAULT_ENCODE_PROFILE,
+    DPI,
+    ENCODE_PROFILE_NAMES,
+    encode_jpeg,
+    get_encode_profile,
+    zip_compression,
+)
+from src.ingest import open_source
+from src.render import DEFAULT_FIT_MODE, FIT_MODES, build_render_plan, crop_box, encode_item
+from src.shared_source import SharedSource, map_shared, sweep_orphans
+from src.smart_crop import plan_crops
+from src.zip_assembly import make_entry, split_entries, write_zip, zip_size
+
 # ---------------------------------------------------------
 # Paths
 # ---------------------------------------------------------
 base_dir = Path(__file__).resolve().parent.parent
 input_dir = base_dir / "input"
 timestamp = datetime.now().strftime("%Y-%m-%d_%H%M")
-output_dir = base_dir / "output" / timestamp
-output_dir.mkdir(parents=True, exist_ok=True)
+output_dir = base_dir / "output" / timestamp  # created by main()
 
 # ---------------------------------------------------------
 # Constants
 # ---------------------------------------------------------
-JPEG_QUALITY = 80
-DPI = (300, 300)
 MAX_ZIP_SIZE_MB = 20
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
 
 # ---------------------------------------------------------
 # Print ratios (same as webapp batch ZIP)
@@ -50,21 +67,6 @@ RATIOS = {
 # ---------------------------------------------------------
 # Utilities
 # ---------------------------------------------------------
-def normalize_image(im: Image.Image) -> Image.Image:
-    """Auto-rotate via EXIF + ensure RGB."""
-    im = ImageOps.exif_transpose(im)
-
-    # Explicit HEIC rejection (no pillow-heif installed)
-    if getattr(im, "format", None) == "HEIC":
-        raise RuntimeError(
-            "HEIC-format støttes ikke i denne versjonen. "
-            "Konverter bildet til JPG eller PNG."
-        )
-
-    if im.mode != "RGB":
-        im = im.convert("RGB")
-    return im
-
 def safe_name(s: str) -> str:
     return (
         s.replace(" ", "_")
@@ -76,110 +78,129 @@ def safe_name(s: str) -> str:
          .replace(",", "")
     )
 
-def resize_stretch(im: Image.Image, w: int, h: int) -> Image.Image:
-    """Batch ZIP = stretch only (same logic as webapp)."""
-    return im.resize((w, h), Image.LANCZOS)
+def resize_stretch(im: Image.Image, w: int, h: int, crops: dict | None = None) -> Image.Image:
+    """Stretch to WxH (same logic as webapp), or resize the smart-crop window if crops given."""
+    center = (crops or {}).get(f"{w}x{h}")
+    box = crop_box(im.size, w, h, center) if center else None
+    return im.resize((w, h), Image.LANCZOS, box=box)
 
 # ---------------------------------------------------------
 # ZIP handling
 # ---------------------------------------------------------
-def split_zip(zip_path, max_mb=20):
-    """Split ZIP into parts if it exceeds max_mb."""
+def write_print_zips(zip_path: Path, entries, max_mb=MAX_ZIP_SIZE_MB):
+    """One ZIP, or _partN ZIPs if the entries exceed max_mb (no re-read / recompression)."""
     max_size = max_mb * 1024 * 1024
-    if os.path.getsize(zip_path) <= max_size:
+    if zip_size(entries) <= max_size:
+        write_zip(zip_path, entries)
+        print(f"📦 Saved ZIP → {zip_path.name}")
         return
 
     print(f"⚠️ Splitting {zip_path.name} (over {max_mb}MB)")
-
-    with zipfile.ZipFile(zip_path, "r") as zf:
-        files = zf.infolist()
-        chunks = []
-        current_chunk = []
-        current_size = 0
-
-        for f in files:
-            data = zf.read(f)
-            if current_size + len(data) > max_size and current_chunk:
-                chunks.append(current_chunk)
-                current_chunk = []
-                current_size = 0
-
-            current_chunk.append((f.filename, data))
-            current_size += len(data)
-
-        if current_chunk:
-            chunks.append(current_chunk)
-
-    # Write split ZIPs
-    for i, chunk in enumerate(chunks, start=1):
+    for i, part in enumerate(split_entries(entries, max_size), start=1):
         part_name = zip_path.with_name(f"{zip_path.stem}_part{i}.zip")
-        with zipfile.ZipFile(part_name, "w", zipfile.ZIP_DEFLATED) as zf:
-            for name, data in chunk:
-                zf.writestr(name, data)
+        write_zip(part_name, part)
         print(f"🧩 Saved: {part_name.name}")
 
-    zip_path.unlink()  # remove original
-
 # ---------------------------------------------------------
 # Print set generator
 # ---------------------------------------------------------
-def generate_print_zip(image_path: Path):
-    """Create one ZIP per input image containing all print sizes."""
-    im = Image.open(image_path)
-
-    # If HEIC: stop early (no pillow-heif support)
-    if im.format == "HEIC":
-        raise RuntimeError(
-            f"HEIC ikke støttet for: {image_path.name}. "
-            "Konverter til JPG eller PNG."
-        )
-
-    im = normalize_image(im)
-
-    zip_name = output_dir / f"{safe_name(image_path.stem)}_prints.zip"
-
-    with zipfile.ZipFile(zip_name, "w", zipfile.ZIP_DEFLATED) as zf:
-        print(f"\n🖼 Processing {image_path.name} → generating print set")
-
-        for ratio, sizes in RATIOS.items():
-
+def print_specs():
+    """(ratio, filename, w_px, h_px) for every size, in catalogue order."""
+    for ratio, sizes in RATIOS.items():
+        for spec in sizes:
             # ISO uses px directly
             if ratio == "ISO":
-                for label, w_px, h_px in tqdm(sizes, desc=f"{ratio} sizes"):
-                    out_img = resize_stretch(im, w_px, h_px)
-                    fname = f"{label}_{w_px}x{h_px}.jpg"
-
-                    buf = io.BytesIO()
-                    out_img.save(buf, "JPEG", quality=JPEG_QUALITY, dpi=DPI)
-                    buf.seek(0)
-                    zf.writestr(fname, buf.read())
+                label, w_px, h_px = spec
+                yield ratio, f"{label}_{w_px}x{h_px}.jpg", w_px, h_px
+                continue
 
+            if isinstance(spec, tuple) and len(spec) == 3:
+                label, w_in, h_in = spec
             else:
-                for spec in tqdm(sizes, desc=f"{ratio} sizes"):
-                    if isinstance(spec, tuple) and len(spec) == 3:
-                        label, w_in, h_in = spec
-                    else:
-                        w_in, h_in = spec
-                        label = f"{w_in}x{h_in}in"
+                w_in, h_in = spec
+                label = f"{w_in}x{h_in}in"
+
+            w_px = int(round(w_in * 300))
+            h_px = int(round(h_in * 300))
+            yield ratio, f"{safe_name(label)}_{w_px}x{h_px}.jpg", w_px, h_px
+
+
+def generate_print_zip(image_path: Path, profile: dict | None = None, fit: str = DEFAULT_FIT_MODE,
+                       workers: int = RENDER_WORKERS, pool: ProcessPoolExecutor | None = None):
+    """
+    Create one ZIP per input image containing all print sizes.
+    With pool, sizes render in its worker processes, which map the decoded
+    source from shared memory instead of getting a pickled copy.
+    """
+    profile = profile or get_encode_profile(DEFAULT_ENCODE_PROFILE)
+    # Shared ingest: JPG/PNG/HEIC/AVIF, EXIF rotation, RGB, color profile kept
+    im = open_source(image_path)
+    icc_profile = im.info.get("icc_profile")
+
+    crops = None
+    if fit == "crop":
+        crops = plan_crops(im, build_render_plan(RATIOS.keys()))
 
-                    w_px = int(round(w_in * 300))
-                    h_px = int(round(h_in * 300))
-
-                    out_img = resize_stretch(im, w_px, h_px)
-                    fname = f"{safe_name(label)}_{w_px}x{h_px}.jpg"
+    zip_name = output_dir / f"{safe_name(image_path.stem)}_prints.zip"
+    specs = list(print_specs())
 
-                    buf = io.BytesIO()
-                    out_img.save(buf, "JPEG", quality=JPEG_QUALITY, dpi=DPI)
-                    buf.seek(0)
-                    zf.writestr(fname, buf.read())
+    def _entry(spec):
+        # Resize + encode + CRC/deflate all happen in the worker thread
+        _, fname, w_px, h_px = spec
+        data = encode_jpeg(resize_stretch(im, w_px, h_px, crops), profile, DPI, icc_profile)
+        return make_entry(fname, data, zip_compression(profile))
 
-    print(f"📦 Saved ZIP → {zip_name.name}")
-    split_zip(zip_name, MAX_ZIP_SIZE_MB)
+    print(f"\n🖼 Processing {image_path.name} → generating print set")
+    source = None
+    if pool is not None:
+        try:
+            source = SharedSource(im)
+        except OSError as e:
+            print(f"⚠️ Shared source unavailable ({e}); using threads")
+    if source is not None:
+        items = [{"filename": fname, "w": w_px, "h": h_px, "out_w": w_px, "out_h": h_px, "dpi": DPI}
+                 for _, fname, w_px, h_px in specs]
+        with source:
+            rendered = map_shared(pool, source.ref, encode_item, items, profile, False, crops, True)
+            entries = [entry for _, entry in tqdm(rendered, total=len(items), desc="sizes")]
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as threads:
+            entries = list(tqdm(threads.map(_entry, specs), total=len(specs), desc="sizes"))
+
+    write_print_zips(zip_name, entries)
 
 # ---------------------------------------------------------
 # MAIN
 # ---------------------------------------------------------
 def main():
+    parser = argparse.ArgumentParser(description="Generate print-size ZIPs for every image in /input.")
+    parser.add_argument(
+        "--profile",
+        choices=ENCODE_PROFILE_NAMES,
+        default=DEFAULT_ENCODE_PROFILE,
+        help="JPEG encode profile (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--fit",
+        choices=FIT_MODES,
+        default=DEFAULT_FIT_MODE,
+        help="stretch = whole image per size, crop = smart crop to each aspect (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=RENDER_WORKERS,
+        help="sizes rendered + encoded in parallel (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        help="render in N worker processes sharing the decoded source instead of threads (default: off)",
+    )
+    args = parser.parse_args()
+    profile = get_encode_profile(args.profile)
+
     if not input_dir.exists():
         print(f"❌ Input folder missing: {input_dir}")
         return
@@ -189,11 +210,21 @@ def main():
         print("❌ No images found in /input")
         return
 
-    for file in files:
-        try:
-            generate_print_zip(file)
-        except Exception as e:
-            print(f"❌ Error processing {file.name}: {e}")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    pool = None
+    if args.processes > 0:
+        sweep_orphans()
+        pool = ProcessPoolExecutor(max_workers=args.processes, mp_context=multiprocessing.get_context("spawn"))
+
+    try:
+        for file in files:
+            try:
+                generate_print_zip(file, profile, args.fit, args.workers, pool)
+            except Exception as e:
+                print(f"❌ Error processing {file.name}: {e}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,308 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+from src.encode import DPI, encode_jpeg, zip_compression
+from src.shared_source import map_shared
+from src.zip_assembly import make_entry, split_entries, write_zip, zip_size
+
+# ---------------------------------------------------------
+# Print catalogue + render plan (gradio-free, shared)
+# ---------------------------------------------------------
+PPI = 300  # 300 DPI/PPI export for print
+
+PRINT_SIZES = {
+    "2x3": [(4, 6), (8, 12), (10, 15), (12, 18), (16, 24), (20, 30)],
+    "3x4": [(6, 8), (9, 12), (12, 16), (15, 20), (18, 24)],
+    "4x5": [(8, 10), (12, 15), (16, 20), (20, 25)],
+    "ISO": [
+        ("A5", 1748, 2480),
+        ("A4", 2480, 3508),
+        ("A3", 3508, 4961),
+        ("A2", 4961, 7016),
+        ("A1", 7016, 9933),
+    ],
+    "EXTRAS": [
+        ("5x7", 5, 7),
+        ("8.5x11", 8.5, 11),
+        ("11x14", 11, 14),
+        ("16x20", 16, 20),
+        ("20x24", 20, 24),
+    ],
+}
+
+GROUP_ORDER = ["2x3", "3x4", "4x5", "ISO", "EXTRAS"]
+
+# Free tier renders previews: same sizes/aspects, long side capped.
+PREVIEW_LONG_SIDE = 1200
+
+# How the source fills each print aspect:
+#   stretch - whole image, scaled to WxH (aspect not kept)
+#   crop    - smart crop to the print aspect (src/smart_crop.py), then scale
+FIT_MODES = ["stretch", "crop"]
+DEFAULT_FIT_MODE = "stretch"
+
+
+def safe_name(s: str) -> str:
+    """Safe filename stub."""
+    return (
+        str(s)
+        .replace(" ", "_")
+        .replace("/", "_")
+        .replace("\\", "_")
+        .replace(":", "")
+        .replace("(", "")
+        .replace(")", "")
+        .replace(",", "")
+    )
+
+
+def _group_specs(group: str):
+    """Yield (label, w_px, h_px) for one group (Batch ZIP naming)."""
+    for spec in PRINT_SIZES[group]:
+        if group == "ISO":
+            label, w, h = spec
+        else:
+            if isinstance(spec, tuple) and len(spec) == 3:
+                label, w_in, h_in = spec
+                if not str(label).endswith("in"):
+                    label = f"{label}in"
+            else:
+                w_in, h_in = spec
+                label = f"{w_in}x{h_in}in"
+
+            w = int(round(float(w_in) * PPI))
+            h = int(round(float(h_in) * PPI))
+        yield label, int(w), int(h)
+
+
+def build_render_plan(groups, preview_long_side: int | None = None) -> list[dict]:
+    """
+    One entry per output file:
+      {"group", "label", "w", "h", "out_w", "out_h", "dpi", "filename", "preview"}
+
+    w/h is the print size at 300 DPI. In preview mode out_w/out_h is scaled
+    down to preview_long_side (same aspect) and dpi is scaled with it, so the
+    physical print size in the file metadata stays correct.
+    """
+    plan = []
+    for group in groups:
+        for label, w, h in _group_specs(group):
+            item = {
+                "group": group,
+                "label": label,
+                "w": w,
+                "h": h,
+                "out_w": w,
+                "out_h": h,
+                "dpi": DPI,
+                "filename": f"{safe_name(label)}_{w}x{h}.jpg",
+                "preview": False,
+            }
+            if preview_long_side:
+                scale = min(1.0, preview_long_side / max(w, h))
+                out_w = max(1, round(w * scale))
+                out_h = max(1, round(h * scale))
+                preview_dpi = max(1, round(PPI * scale))
+                item.update(
+                    out_w=out_w,
+                    out_h=out_h,
+                    dpi=(preview_dpi, preview_dpi),
+                    filename=f"{safe_name(label)}_{w}x{h}_PREVIEW_{out_w}x{out_h}.jpg",
+                    preview=True,
+                )
+            plan.append(item)
+    return plan
+
+
+def plan_by_group(plan: list[dict]) -> dict:
+    """Group plan entries by group, keeping plan order."""
+    out = {}
+    for item in plan:
+        out.setdefault(item["group"], []).append(item)
+    return out
+
+
+def group_zip_name(group: str, preview: bool = False) -> str:
+    return f"{group}_preview.zip" if preview else f"{group}.zip"
+
+
+# ---------------------------------------------------------
+# Rendering
+# ---------------------------------------------------------
+def crop_box(size, w: int, h: int, center) -> tuple[float, float, float, float]:
+    """
+    Largest box with aspect w:h inside a source of `size`, centered as
+    close to `center` (fractions, from src.smart_crop) as the edges allow.
+    """
+    src_w, src_h = size
+    aspect = w / h
+    if src_w / src_h > aspect:
+        box_w, box_h = src_h * aspect, float(src_h)
+    else:
+        box_w, box_h = float(src_w), src_w / aspect
+    left = min(max(center[0] * src_w - box_w / 2, 0.0), src_w - box_w)
+    top = min(max(center[1] * src_h - box_h / 2, 0.0), src_h - box_h)
+    return (left, top, left + box_w, top + box_h)
+
+
+def resize_image(im: Image.Image, w: int, h: int, box=None) -> Image.Image:
+    """High-quality LANCZOS resize to exact WxH (of `box` only, if given)."""
+    return im.resize((w, h), Image.LANCZOS, box=box)
+
+
+def add_watermark(im: Image.Image, text: str = "SnapToSize") -> Image.Image:
+    """
+    Light watermark: single centered text.
+    Much cheaper than tiled/diagonal stamping.
+    """
+    base = im.convert("RGBA")
+    w, h = base.size
+
+    overlay = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+
+    # Scale font to image size (safe + readable)
+    font_size = max(24, int(min(w, h) * 0.06))
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", font_size)
+    except Exception:
+        font = ImageFont.load_default()
+
+    # Measure text
+    bbox = draw.textbbox((0, 0), text, font=font)
+    tw = bbox[2] - bbox[0]
+    th = bbox[3] - bbox[1]
+
+    # Center position
+    x = (w - tw) // 2
+    y = (h - th) // 2
+
+    # Subtle shadow for contrast
+    shadow_alpha = 120
+    text_alpha = 160
+    draw.text((x + 2, y + 2), text, font=font, fill=(0, 0, 0, shadow_alpha))
+    draw.text((x, y), text, font=font, fill=(255, 255, 255, text_alpha))
+
+    out = Image.alpha_composite(base, overlay).convert("RGB")
+    return out
+
+
+class RenderCancelled(Exception):
+    """The render's cancel event was set (seller left, resubmitted or pressed Cancel)."""
+
+
+def check_cancelled(cancel) -> None:
+    """cancel: anything with is_set() (threading.Event) or None."""
+    if cancel is not None and cancel.is_set():
+        raise RenderCancelled()
+
+
+def render_item(im: Image.Image, item: dict, watermark: bool = False, crops: dict | None = None) -> Image.Image:
+    """One output. crops ({"WxH": center}) switches that size to smart crop."""
+    center = (crops or {}).get(f"{item['w']}x{item['h']}")
+    box = crop_box(im.size, item["w"], item["h"], center) if center else None
+    img = resize_image(im, item["out_w"], item["out_h"], box)
+    if watermark:
+        img = add_watermark(img)
+    return img
+
+
+def encode_item(im: Image.Image, item: dict, profile: dict, watermark: bool = False,
+                crops: dict | None = None, zip_entries: bool = False):
+    """(item, jpeg_bytes) or (item, ZipEntry) for one plan entry (module level: picklable)."""
+    data = encode_jpeg(render_item(im, item, watermark, crops), profile, item["dpi"], im.info.get("icc_profile"))
+    if zip_entries:
+        return item, make_entry(item["filename"], data, zip_compression(profile))
+    return item, data
+
+
+def encode_items(
+    im: Image.Image,
+    items: list[dict],
+    profile: dict,
+    watermark: bool = False,
+    workers: int = 1,
+    crops: dict | None = None,
+    zip_entries: bool = False,
+    cancel=None,
+    shared=None,
+):
+    """
+    Render + encode plan entries from one shared source.
+    Yields (item, jpeg_bytes) in plan order. With workers > 1 sizes run
+    concurrently in threads (Pillow releases the GIL in resize/encode);
+    the source is only read, never copied. The source ICC profile (if
+    any) is embedded in every output.
+
+    shared=(pool, SharedRef) runs the sizes on a ProcessPoolExecutor
+    instead, each worker mapping the source from shared memory
+    (src/shared_source.py: im must be the image behind the SharedRef).
+
+    zip_entries=True yields (item, ZipEntry) instead: the CRC (and deflate,
+    if the profile asks for it) is done in the same worker.
+
+    cancel is checked before every size; once set, RenderCancelled is
+    raised and sizes not started yet are skipped.
+    """
+    if shared is not None:
+        check_cancelled(cancel)
+        pool, ref = shared
+        for rendered in map_shared(pool, ref, encode_item, items, profile, watermark, crops, zip_entries):
+            check_cancelled(cancel)
+            yield rendered
+        return
+
+    def _one(item):
+        check_cancelled(cancel)
+        return encode_item(im, item, profile, watermark, crops, zip_entries)
+
+    if workers <= 1 or len(items) <= 1:
+        for item in items:
+            yield _one(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        yield from pool.map(_one, items)
+
+
+def part_zip_path(zip_path: Path, part: int) -> Path:
+    return zip_path.with_name(f"{zip_path.stem}_part{part}.zip")
+
+
+def write_group_zips(zip_path: Path, entries: list, max_bytes: int | None = None) -> list[str]:
+    """
+    One ZIP, or <stem>_partN.zip archives of at most max_bytes each when
+    the entries don't fit (a single oversized entry still gets its own part).
+    """
+    if not max_bytes or zip_size(entries) <= max_bytes:
+        write_zip(zip_path, entries)
+        return [str(zip_path)]
+    paths = []
+    for i, part in enumerate(split_entries(entries, max_bytes), start=1):
+        path = part_zip_path(zip_path, i)
+        write_zip(path, part)
+        paths.append(str(path))
+    return paths
+
+
+def render_group_zip(
+    im: Image.Image,
+    items: list[dict],
+    zip_path: Path,
+    profile: dict,
+    watermark: bool = False,
+    crops: dict | None = None,
+    workers: int = 1,
+    max_bytes: int | None = None,
+    cancel=None,
+    shared=None,
+) -> list[str]:
+    """
+    Render plan entries of one group into zip_path (entries finished by the
+    workers); split into parts if max_bytes is given and exceeded.
+    """
+    rendered = encode_items(im, items, profile, watermark, workers, crops, zip_entries=True,
+                            cancel=cancel, shared=shared)
+    return write_group_zips(zip_path, [entry for _, entry in rendered], max_bytes)
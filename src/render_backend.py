@@ -0,0 +1,349 @@
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from src.encode import get_encode_profile
+from src.ingest import open_source
+from src.render import (
+    DEFAULT_FIT_MODE,
+    FIT_MODES,
+    PREVIEW_LONG_SIDE,
+    RenderCancelled,
+    build_render_plan,
+    check_cancelled,
+    encode_items,
+    group_zip_name,
+    plan_by_group,
+    render_group_zip,
+)
+from src.shared_source import SharedSource, sweep_orphans
+from src.smart_crop import PROXY_LONG_SIDE, plan_crops
+from src.zip_assembly import write_zip
+
+# ---------------------------------------------------------
+# Render backends
+#
+# Handlers describe the work as a job dict and get back local file
+# paths, whichever backend runs it:
+#   inprocess - render in the request thread (default)
+#   process   - local process pool, keeps render CPU off the Gradio process;
+#               the source is decoded once here and shared with the
+#               workers through shared memory (src/shared_source.py)
+#   remote    - POST to a runner's /render over HTTP
+#
+# Selected with RENDER_BACKEND (+ RENDER_PROCESSES,
+# RENDER_RUNNER_URL, RENDER_RUNNER_TOKEN).
+#
+# run(..., cancel=event) stops between sizes once the event is set and
+# raises RenderCancelled (remote: the runner is told via POST
+# /cancel/{render id}). Partial output is left in out_dir for the caller
+# to remove.
+# ---------------------------------------------------------
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "inprocess").strip().lower()
+RENDER_PROCESSES = int(os.getenv("RENDER_PROCESSES", "1"))
+RENDER_RUNNER_URL = os.getenv("RENDER_RUNNER_URL", "").strip().rstrip("/")
+RENDER_RUNNER_TOKEN = os.getenv("RENDER_RUNNER_TOKEN", "").strip()
+RENDER_RUNNER_TIMEOUT = float(os.getenv("RENDER_RUNNER_TIMEOUT", "300"))
+CANCEL_POLL_S = 0.2
+
+
+class RenderBackendError(RuntimeError):
+    """Backend could not run the job (bad config, runner failure)."""
+
+
+# -- job descriptions (plain JSON-able dicts) --
+def _check_fit(fit: str) -> str:
+    fit = (fit or DEFAULT_FIT_MODE).strip().lower()
+    if fit not in FIT_MODES:
+        raise RenderBackendError(f"Unknown fit mode '{fit}' (use: {', '.join(FIT_MODES)})")
+    return fit
+
+
+def print_set_job(source_path, groups, encode_profile, preview=False, watermark=False,
+                  fit=DEFAULT_FIT_MODE, workers=1, max_zip_bytes=None) -> dict:
+    """Batch ZIP: one ZIP per group (<group>_partN.zip parts past max_zip_bytes, if set)."""
+    return {
+        "kind": "print_set",
+        "source_path": str(source_path),
+        "groups": list(groups),
+        "encode_profile": encode_profile,
+        "preview": bool(preview),
+        "watermark": bool(watermark),
+        "fit": _check_fit(fit),
+        "workers": int(workers),
+        "max_zip_bytes": int(max_zip_bytes) if max_zip_bytes else None,
+    }
+
+
+def items_job(source_path, items, encode_profile, as_zip=False, workers=1,
+              fit=DEFAULT_FIT_MODE) -> dict:
+    """Single Export: explicit plan entries, separate JPGs or one ZIP."""
+    return {
+        "kind": "items",
+        "source_path": str(source_path),
+        "items": list(items),
+        "encode_profile": encode_profile,
+        "as_zip": bool(as_zip),
+        "workers": int(workers),
+        "fit": _check_fit(fit),
+    }
+
+
+def job_max_side(job: dict) -> int | None:
+    """Source decode cap for a job (previews never need full resolution)."""
+    return PREVIEW_LONG_SIDE if job.get("preview") else None
+
+
+def job_plan(job: dict) -> list[dict]:
+    if job["kind"] == "print_set":
+        return build_render_plan(job["groups"], job_max_side(job))
+    return job["items"]
+
+
+def with_crops(job: dict, im) -> dict:
+    """
+    fit="crop": attach {"WxH": center} crops computed from im (any size,
+    analysed on a small proxy). Jobs carry crops, so every backend renders
+    the same windows without analysing the image again.
+    """
+    if job.get("fit") != "crop" or job.get("crops"):
+        return job
+    return dict(job, crops=plan_crops(im, job_plan(job)))
+
+
+def run_render_job(job: dict, out_dir, im=None, cancel=None, pool=None) -> list[str]:
+    """
+    Execute a job in this process. Loads the source unless im is given.
+    With pool (ProcessPoolExecutor) the sizes render in its workers from a
+    shared-memory copy of the source.
+    """
+    check_cancelled(cancel)
+    if im is None:
+        im = open_source(job["source_path"], job_max_side(job))
+    if pool is None:
+        return _render(job, Path(out_dir), im, cancel)
+    try:
+        source = SharedSource(im)
+    except OSError as e:
+        print(f"⚠️ Shared source unavailable ({e}); rendering in this process")
+        return _render(job, Path(out_dir), im, cancel)
+    with source:
+        return _render(job, Path(out_dir), im, cancel, (pool, source.ref))
+
+
+def _render(job: dict, out_dir: Path, im, cancel, shared=None) -> list[str]:
+    profile = get_encode_profile(job.get("encode_profile"))
+    crops = with_crops(job, im).get("crops")
+
+    if job["kind"] == "print_set":
+        max_side = job_max_side(job)
+        plan = build_render_plan(job["groups"], max_side)
+        files = []
+        for group, items in plan_by_group(plan).items():
+            zip_path = out_dir / group_zip_name(group, bool(max_side))
+            files.extend(render_group_zip(im, items, zip_path, profile,
+                                          watermark=job.get("watermark", False), crops=crops,
+                                          workers=job.get("workers", 1),
+                                          max_bytes=job.get("max_zip_bytes"), cancel=cancel,
+                                          shared=shared))
+        return files
+
+    if job["kind"] == "items":
+        items = [dict(item, dpi=tuple(item["dpi"])) for item in job["items"]]
+        as_zip = bool(job.get("as_zip"))
+        rendered = encode_items(im, items, profile, workers=job.get("workers", 1), crops=crops,
+                                zip_entries=as_zip, cancel=cancel, shared=shared)
+        if as_zip:
+            zip_path = out_dir / "single_export.zip"
+            write_zip(zip_path, [entry for _, entry in rendered])
+            return [str(zip_path)]
+
+        files = []
+        for item, data in rendered:
+            out_path = out_dir / item["filename"]
+            out_path.write_bytes(data)
+            files.append(str(out_path))
+        return files
+
+    raise RenderBackendError(f"Unknown job kind: {job.get('kind')!r}")
+
+
+# -- backends --
+class InProcessBackend:
+    name = "inprocess"
+
+    def run(self, job: dict, out_dir, load_source=None, cancel=None) -> list[str]:
+        im = load_source() if load_source else None
+        return run_render_job(job, out_dir, im, cancel)
+
+
+class ProcessPoolBackend:
+    """
+    Render sizes in worker processes. The source is decoded (or taken from
+    the session cache) in this process and mapped by the workers from
+    shared memory; ZIPs are written here from the returned entries.
+    """
+    name = "process"
+
+    def __init__(self, workers: int = RENDER_PROCESSES):
+        self.workers = max(1, workers)
+        self._pool = None
+        self._pool_lock = threading.Lock()  # Gradio worker threads render concurrently
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: never fork the Gradio server (threads, sockets)
+                sweep_orphans()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _drop_pool(self, pool: ProcessPoolExecutor) -> None:
+        # a worker died (OOM kill); start fresh next time. Only the render
+        # that saw this pool break drops it, not a newer one another thread made.
+        with self._pool_lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, job: dict, out_dir, load_source=None, cancel=None) -> list[str]:
+        im = load_source() if load_source else None
+        pool = self._get_pool()
+        try:
+            return run_render_job(job, out_dir, im, cancel, pool=pool)
+        except BrokenProcessPool as e:
+            self._drop_pool(pool)
+            raise RenderBackendError(f"Render worker crashed: {e}")
+
+
+class RemoteRunnerBackend:
+    """
+    Runner protocol: POST {url}/render, body = original upload bytes,
+    X-Render-Job = job JSON (minus source_path). The runner answers
+    {"job_id", "files": [{"name", "url"}]}; files are fetched into out_dir
+    and the runner copy is deleted.
+    """
+    name = "remote"
+
+    def __init__(self, base_url: str = RENDER_RUNNER_URL, token: str = RENDER_RUNNER_TOKEN,
+                 timeout: float = RENDER_RUNNER_TIMEOUT):
+        if not base_url:
+            raise RenderBackendError("RENDER_BACKEND=remote needs RENDER_RUNNER_URL")
+        self.base_url = base_url
+        self.token = token
+        self.timeout = timeout
+
+    def run(self, job: dict, out_dir, load_source=None, cancel=None) -> list[str]:
+        import requests
+
+        check_cancelled(cancel)
+        if job.get("fit") == "crop" and not job.get("crops"):
+            # The runner only applies crop windows; analyse a small local proxy
+            job = with_crops(job, open_source(job["source_path"], PROXY_LONG_SIDE))
+
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/octet-stream",
+            "X-Render-Job": json.dumps({k: v for k, v in job.items() if k != "source_path"}),
+            "X-Render-Id": uuid.uuid4().hex,
+        }
+        auth = {"Authorization": headers["Authorization"]}
+
+        def post():
+            with open(job["source_path"], "rb") as f:
+                return requests.post(f"{self.base_url}/render", data=f, headers=headers, timeout=self.timeout)
+
+        try:
+            if cancel is None:
+                r = post()
+            else:
+                # Upload + render block in a helper thread; cancel is relayed to the runner
+                future = Future()
+                threading.Thread(target=lambda: _run_into(future, post), daemon=True).start()
+                relayed = False
+                while not wait([future], timeout=CANCEL_POLL_S)[0]:
+                    if cancel.is_set() and not relayed:
+                        relayed = True
+                        try:
+                            requests.post(f"{self.base_url}/cancel/{headers['X-Render-Id']}", headers=auth,
+                                          timeout=10)
+                        except requests.RequestException:
+                            pass  # the render finishes; its result is dropped below
+                r = future.result()
+                if cancel.is_set():
+                    if r.status_code == 200:
+                        self._delete(r.json()["job_id"], auth)
+                    raise RenderCancelled()
+        except requests.RequestException as e:
+            raise RenderBackendError(f"Runner /render unreachable: {type(e).__name__}: {e}")
+        if r.status_code != 200:
+            raise RenderBackendError(f"Runner /render HTTP {r.status_code}: {r.text[:200]}")
+        result = r.json()
+
+        # The runner copy goes whatever happens here
+        files = []
+        try:
+            for entry in result.get("files", []):
+                if cancel is not None and cancel.is_set():
+                    raise RenderCancelled()
+                out_path = Path(out_dir) / Path(entry["name"]).name
+                with requests.get(f"{self.base_url}{entry['url']}", headers=auth, stream=True,
+                                  timeout=self.timeout) as resp:
+                    if resp.status_code != 200:
+                        raise RenderBackendError(f"Runner artifact HTTP {resp.status_code}: {entry['name']}")
+                    with open(out_path, "wb") as f:
+                        for chunk in resp.iter_content(1024 * 1024):
+                            f.write(chunk)
+                files.append(str(out_path))
+        except requests.RequestException as e:
+            raise RenderBackendError(f"Runner artifact download failed: {type(e).__name__}: {e}")
+        finally:
+            self._delete(result["job_id"], auth)
+        return files
+
+    def _delete(self, job_id: str, auth: dict):
+        import requests
+
+        try:
+            r = requests.delete(f"{self.base_url}/artifacts/{job_id}", headers=auth, timeout=10)
+            if r.status_code != 200:
+                print(f"runner artifact delete failed job={job_id}: HTTP {r.status_code}")
+        except requests.RequestException as e:
+            # The runner sweeps leftovers after RENDER_ARTIFACT_TTL_S
+            print(f"runner artifact delete failed job={job_id}: {type(e).__name__}: {e}")
+
+
+def _run_into(future: Future, fn):
+    try:
+        future.set_result(fn())
+    except BaseException as e:
+        future.set_exception(e)
+
+
+_BACKENDS = {
+    "inprocess": InProcessBackend,
+    "process": ProcessPoolBackend,
+    "remote": RemoteRunnerBackend,
+}
+_backend = None
+
+
+def get_render_backend():
+    """Process-wide backend chosen by RENDER_BACKEND."""
+    global _backend
+    if _backend is None:
+        if RENDER_BACKEND not in _BACKENDS:
+            raise RenderBackendError(
+                f"Unknown RENDER_BACKEND '{RENDER_BACKEND}' (use: {', '.join(_BACKENDS)})"
+            )
+        _backend = _BACKENDS[RENDER_BACKEND]()
+    return _backend
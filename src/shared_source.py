@@ -0,0 +1,168 @@
+import errno
+import os
+import sys
+import uuid
+from concurrent.futures import wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+
+from PIL import Image
+
+# ---------------------------------------------------------
+# Shared-memory sources for render worker processes
+#
+# The decoded, normalized source is copied once into a shared memory
+# segment, as RGBX (Pillow's in-memory layout for RGB, so
+# Image.frombuffer maps it without a copy). Workers attach read-only per
+# task; only the small SharedRef is pickled, never the pixels.
+#
+# Lifetime: the creating process owns the segment and unlinks it on
+# close() (context manager), after every task using it has returned. If
+# the owner crashes, multiprocessing's resource tracker unlinks it once
+# the owner's workers have exited too; sweep_orphans() (run whenever a
+# pool starts) removes segments whose owner pid no longer exists, which
+# also covers a killed tracker. Names carry the owner pid.
+#
+# /dev/shm is often small in containers (Docker: 64MB unless --shm-size).
+# SharedSource raises OSError(ENOSPC) up front when the source doesn't
+# fit, so callers can fall back to rendering in-process.
+# Same module in services/runner/shared_source.py (separate image -> keep in sync)
+# ---------------------------------------------------------
+SHM_PREFIX = "snaptosize_"
+_SHM_DIR = Path("/dev/shm")
+_LAYOUTS = {"RGB": ("RGBX", 4), "L": ("L", 1)}  # source mode -> (mapped mode, bytes per pixel)
+_STRIP_ROWS = 256  # rows copied per step (bounded extra memory)
+_ATTACH_KWARGS = {"track": False} if sys.version_info >= (3, 13) else {}
+
+
+@dataclass(frozen=True)
+class SharedRef:
+    """What a worker needs to attach: segment name, size, mode, image info."""
+    name: str
+    size: tuple[int, int]
+    mode: str
+    info: dict = field(default_factory=dict)
+
+
+class SharedSource:
+    """Owner side: one normalized source (RGB or L) in shared memory."""
+
+    def __init__(self, im: Image.Image):
+        if im.mode not in _LAYOUTS:
+            raise ValueError(f"SharedSource needs an RGB or L image, got {im.mode}")
+        layout, bands = _LAYOUTS[im.mode]
+        w, h = im.size
+        free = shm_free_bytes()
+        if free is not None and free < w * h * bands:
+            raise OSError(errno.ENOSPC, f"/dev/shm has {free >> 20}MB free, source needs {(w * h * bands) >> 20}MB")
+        name = f"{SHM_PREFIX}{os.getpid()}_{uuid.uuid4().hex[:12]}"
+        self._shm = SharedMemory(name=name, create=True, size=max(1, w * h * bands))
+        try:
+            row = w * bands
+            for top in range(0, h, _STRIP_ROWS):
+                data = im.crop((0, top, w, min(h, top + _STRIP_ROWS))).tobytes("raw", layout)
+                self._shm.buf[top * row:top * row + len(data)] = data
+        except BaseException:
+            self.close()
+            raise
+        info = {"icc_profile": im.info["icc_profile"]} if im.info.get("icc_profile") else {}
+        self.ref = SharedRef(name, (w, h), im.mode, info)
+
+    def close(self):
+        if self._shm is None:
+            return
+        shm, self._shm = self._shm, None
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@contextmanager
+def attached(ref: SharedRef):
+    """
+    Worker side: read-only image view of the segment (mode RGBX for RGB
+    sources; resize, crop and JPEG encode accept it as is). Don't keep
+    the view past the block.
+    """
+    shm = SharedMemory(name=ref.name, **_ATTACH_KWARGS)
+    im = None
+    try:
+        layout, _ = _LAYOUTS[ref.mode]
+        im = Image.frombuffer(layout, ref.size, shm.buf, "raw", layout, 0, 1)
+        im.info.update(ref.info)
+        yield im
+    finally:
+        im = None
+        try:
+            shm.close()
+        except BufferError:
+            pass  # a view escaped the block; the mapping goes away with it
+
+
+def _run_shared(ref: SharedRef, fn, item, args):
+    with attached(ref) as im:
+        out = fn(im, item, *args)
+        del im  # last view reference, so attached() can unmap
+    return out
+
+
+def map_shared(pool, ref: SharedRef, fn, items, *args):
+    """
+    fn(im, item, *args) for every item on a ProcessPoolExecutor, im = the
+    shared source. fn must be a module-level function; items, args and
+    results are pickled. Yields results in item order. Closing the
+    generator early (error, cancel) drops queued items and waits for the
+    running ones, so the owner can close the segment right after.
+    """
+    futures = [pool.submit(_run_shared, ref, fn, item, args) for item in items]
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+
+
+def shm_free_bytes() -> int | None:
+    """Free space in /dev/shm (None where there is no such tmpfs)."""
+    if not _SHM_DIR.is_dir():
+        return None
+    st = os.statvfs(_SHM_DIR)
+    return st.f_bavail * st.f_frsize
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sweep_orphans() -> int:
+    """Unlink segments left behind by dead owners (Linux /dev/shm). Returns how many."""
+    if not _SHM_DIR.is_dir():
+        return 0
+    removed = 0
+    for path in _SHM_DIR.glob(f"{SHM_PREFIX}*"):
+        pid = path.name[len(SHM_PREFIX):].split("_", 1)[0]
+        if not pid.isdigit() or int(pid) == os.getpid() or _pid_alive(int(pid)):
+            continue
+        path.unlink(missing_ok=True)
+        removed += 1
+    if removed:
+        print(f"shared sources: removed {removed} orphaned segment(s)")
+    return removed
@@ -0,0 +1,112 @@
+import numpy as np
+from PIL import Image, ImageFilter
+
+# ---------------------------------------------------------
+# Smart crop ("fill" fit mode)
+#
+# A saliency map is computed once on a small proxy of the source
+# (long side PROXY_LONG_SIDE). Each distinct target aspect then gets the
+# best-scoring crop window from prefix sums over that one map, so the
+# analysis cost does not grow with the number of sizes exported.
+#
+# Crops are stored as the window center in source fractions ("crops":
+# {"WxH": [cx, cy]}). The exact pixel box for any source size comes from
+# src.render.crop_box, and resize(..., box=) reads only that region: no
+# full-resolution intermediate crops.
+# ---------------------------------------------------------
+PROXY_LONG_SIDE = 256
+
+# Saliency = color distinctness (frequency-tuned) + edge energy + a mild
+# center prior (print art is usually composed around the middle).
+_WEIGHT_COLOR = 0.6
+_WEIGHT_EDGES = 0.25
+_WEIGHT_CENTER = 0.15
+# Among near-equal windows, prefer the centered one.
+_CENTER_TIEBREAK = 0.02
+
+
+def make_proxy(im: Image.Image, long_side: int = PROXY_LONG_SIDE) -> Image.Image:
+    """Small RGB copy for analysis (cheap reducing resize, never a full copy)."""
+    scale = min(1.0, long_side / max(im.size))
+    size = (max(1, round(im.width * scale)), max(1, round(im.height * scale)))
+    proxy = im if size == im.size else im.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    return proxy if proxy.mode == "RGB" else proxy.convert("RGB")
+
+
+def _normalized(a: np.ndarray) -> np.ndarray:
+    lo, hi = float(a.min()), float(a.max())
+    return (a - lo) / (hi - lo) if hi > lo else np.zeros_like(a)
+
+
+def saliency_map(proxy: Image.Image) -> np.ndarray:
+    """float32 HxW map in [0, 1] for a proxy-sized RGB image."""
+    lab = np.asarray(proxy.filter(ImageFilter.GaussianBlur(1)).convert("LAB"), dtype=np.float32)
+
+    # Distance of every (slightly blurred) pixel from the image's mean color
+    color = np.sqrt(((lab - lab.reshape(-1, 3).mean(axis=0)) ** 2).sum(axis=2))
+
+    # Luminance gradient magnitude
+    lum = lab[:, :, 0]
+    gx = np.zeros_like(lum)
+    gy = np.zeros_like(lum)
+    gx[:, 1:-1] = lum[:, 2:] - lum[:, :-2]
+    gy[1:-1, :] = lum[2:, :] - lum[:-2, :]
+    edges = np.hypot(gx, gy)
+
+    h, w = lum.shape
+    yy = (np.arange(h, dtype=np.float32) - (h - 1) / 2) / max(1, h)
+    xx = (np.arange(w, dtype=np.float32) - (w - 1) / 2) / max(1, w)
+    center = np.exp(-(yy[:, None] ** 2 + xx[None, :] ** 2) / 0.18)
+
+    return (
+        _WEIGHT_COLOR * _normalized(color)
+        + _WEIGHT_EDGES * _normalized(edges)
+        + _WEIGHT_CENTER * center
+    ).astype(np.float32)
+
+
+def best_center(saliency: np.ndarray, aspect: float) -> tuple[float, float]:
+    """
+    Center (cx, cy) in [0, 1] of the largest window with this aspect (w/h)
+    that holds the most saliency. The window always spans one full side,
+    so the search is one prefix-sum pass along the other axis.
+    """
+    h, w = saliency.shape
+    if w / h > aspect:
+        # Wider than the target: full height, slide horizontally
+        win = min(w, max(1, round(h * aspect)))
+        profile = saliency.sum(axis=0)
+        length = w
+    else:
+        win = min(h, max(1, round(w / aspect)))
+        profile = saliency.sum(axis=1)
+        length = h
+
+    sums = np.concatenate(([0.0], np.cumsum(profile, dtype=np.float64)))
+    scores = sums[win:] - sums[:-win]  # every window start, vectorized
+    scores = scores / max(float(scores.max()), 1e-9)
+    offsets = np.abs(np.arange(scores.size) - (scores.size - 1) / 2) / max(1, length)
+    start = int(np.argmax(scores - _CENTER_TIEBREAK * offsets))
+
+    pos = (start + win / 2) / length
+    return (pos, 0.5) if w / h > aspect else (0.5, pos)
+
+
+def size_key(w: int, h: int) -> str:
+    return f"{w}x{h}"
+
+
+def plan_crops(im: Image.Image, items: list[dict]) -> dict:
+    """
+    {"WxH": [cx, cy]} for every plan entry (keyed by print size).
+    One saliency map per call; one window search per distinct aspect.
+    """
+    saliency = saliency_map(make_proxy(im))
+    by_aspect = {}
+    crops = {}
+    for item in items:
+        aspect = round(item["w"] / item["h"], 4)
+        if aspect not in by_aspect:
+            by_aspect[aspect] = best_center(saliency, aspect)
+        crops[size_key(item["w"], item["h"])] = [round(v, 5) for v in by_aspect[aspect]]
+    return crops
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+# ---------------------------------------------------------
+# Decoded-source cache (in-process, shared across tabs)
+#
+# Key   = upload content hash (upload_digest) + variant ("full", "preview1200", ...)
+# Value = normalized PIL image (EXIF-rotated, RGB). Treat as read-only.
+#
+# LRU under a global byte budget. Entries remember which Gradio
+# sessions use them and are dropped when the last one ends.
+# ---------------------------------------------------------
+SOURCE_CACHE_MAX_BYTES = int(os.getenv("SOURCE_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+_HASH_CHUNK = 1024 * 1024
+_DIGESTS_MAX = 256
+
+
+def file_digest(path) -> str:
+    """sha256 of a file's bytes (streamed)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_digests = OrderedDict()  # (path, size, mtime_ns) -> sha256
+_digests_lock = threading.Lock()
+
+
+def upload_digest(path) -> str:
+    """
+    file_digest, hashed once per upload: Gradio keeps an upload at one
+    path and never rewrites it, so (path, size, mtime) stands for its
+    bytes and every later render of the same upload skips the re-read.
+    """
+    st = os.stat(path)
+    key = (str(path), st.st_size, st.st_mtime_ns)
+    with _digests_lock:
+        digest = _digests.get(key)
+        if digest is not None:
+            _digests.move_to_end(key)
+            return digest
+    digest = file_digest(path)
+    with _digests_lock:
+        _digests[key] = digest
+        if len(_digests) > _DIGESTS_MAX:
+            _digests.popitem(last=False)
+    return digest
+
+
+def image_nbytes(im: Image.Image) -> int:
+    w, h = im.size
+    return w * h * len(im.getbands())
+
+
+class SourceCache:
+    def __init__(self, max_bytes: int = SOURCE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> {"image", "nbytes", "sessions"}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, loader, session_id: str | None = None) -> Image.Image:
+        """Return cached image for key, or load it once (concurrent callers wait)."""
+        with self._lock:
+            im = self._hit(key, session_id)
+            if im is not None:
+                return im
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                im = self._hit(key, session_id)
+                if im is not None:
+                    return im
+
+            try:
+                im = loader()
+            except BaseException:
+                # a failed load (corrupt upload) must not leave its lock behind
+                with self._lock:
+                    self._key_locks.pop(key, None)
+                raise
+
+            with self._lock:
+                # same critical section as the insert: a caller arriving now
+                # finds either this lock or the entry, never neither
+                self._key_locks.pop(key, None)
+                self.misses += 1
+                nbytes = image_nbytes(im)
+                if nbytes <= self.max_bytes:
+                    self._entries[key] = {
+                        "image": im,
+                        "nbytes": nbytes,
+                        "sessions": {session_id} if session_id else set(),
+                    }
+                    self.total_bytes += nbytes
+                    self._evict()
+        return im
+
+    def release_session(self, session_id: str):
+        """Session ended: drop entries no other live session uses."""
+        with self._lock:
+            for key in list(self._entries):
+                sessions = self._entries[key]["sessions"]
+                if session_id in sessions:
+                    sessions.discard(session_id)
+                    if not sessions:
+                        self._drop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "mb": round(self.total_bytes / 1024 / 1024, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    # -- internals (hold self._lock) --
+    def _hit(self, key, session_id):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        if session_id:
+            entry["sessions"].add(session_id)
+        self.hits += 1
+        return entry["image"]
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry["nbytes"]
+
+    def _evict(self):
+        # oldest first; never evict the entry that was just added
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            self._drop(next(iter(self._entries)))
@@ -0,0 +1,62 @@
+import os
+import time
+
+# ---------------------------------------------------------
+# Boot timing (cold starts on scale-to-zero machines)
+#
+# app.py imports this first; modules call mark() after each costly
+# step and app.py prints report() once the server is about to listen.
+# Marks are cumulative since this module was imported; the gap to the
+# previous mark is the step's own cost.
+# ---------------------------------------------------------
+_T0 = time.perf_counter()
+_MARKS = []  # (label, seconds since _T0)
+
+
+def _process_age_s() -> float | None:
+    """Seconds since the interpreter process started (Linux only)."""
+    try:
+        with open("/proc/self/stat", encoding="ascii") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", encoding="ascii") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# Interpreter + site startup before the first line of app.py ran
+_PRE_MAIN_S = _process_age_s()
+
+
+def mark(label: str):
+    _MARKS.append((label, time.perf_counter() - _T0))
+
+
+def elapsed_s() -> float:
+    return time.perf_counter() - _T0
+
+
+def breakdown() -> dict:
+    """{"interpreter_s", "steps": {label: seconds}, "total_s"}"""
+    steps = {}
+    prev = 0.0
+    for label, t in _MARKS:
+        steps[label] = round(t - prev, 3)
+        prev = t
+    return {
+        "interpreter_s": round(_PRE_MAIN_S, 3) if _PRE_MAIN_S is not None else None,
+        "steps": steps,
+        "total_s": round(prev, 3),
+    }
+
+
+def report() -> str:
+    data = breakdown()
+    lines = ["startup:"]
+    if data["interpreter_s"] is not None:
+        lines.append(f"  {'interpreter':<22}{data['interpreter_s'] * 1000:>8.0f} ms")
+    for label, seconds in data["steps"].items():
+        lines.append(f"  {label:<22}{seconds * 1000:>8.0f} ms")
+    lines.append(f"  {'total (since app.py)':<22}{data['total_s'] * 1000:>8.0f} ms")
+    return "\n".join(lines)
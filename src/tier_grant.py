@@ -0,0 +1,45 @@
+import hashlib
+import hmac
+import os
+import time
+
+# ---------------------------------------------------------
+# Pro tier proof for the async pipeline
+#
+# The worker's /enqueue is public, so a "tier" in a job body proves
+# nothing. After stripe_is_pro the webapp signs a grant for the one
+# image_url it enqueues:
+#
+#   tier_grant = "{expires}.{hex HMAC-SHA256(TIER_SECRET, 'pro:{image_url}:{expires}')}"
+#
+# The worker drops any client tier and sets "pro" only when the grant
+# verifies (services/worker/src/index.ts); the runner checks it again
+# and refuses a pro job without one. Missing or bad grants = free.
+# TIER_SECRET is shared by webapp, worker and runner; unset = no pro
+# jobs on the async pipeline.
+# ---------------------------------------------------------
+TIER_SECRET = os.getenv("TIER_SECRET", "").strip()
+TIER_GRANT_TTL_S = int(os.getenv("TIER_GRANT_TTL_S", "3600"))  # covers queue waits and retries
+
+
+def _signature(secret: str, image_url: str, expires: int) -> str:
+    msg = f"pro:{image_url}:{expires}".encode("utf-8")
+    return hmac.new(secret.encode("utf-8"), msg, hashlib.sha256).hexdigest()
+
+
+def sign_tier_grant(image_url: str, secret: str = TIER_SECRET, ttl_s: int = TIER_GRANT_TTL_S) -> str | None:
+    """Pro grant for image_url (None when no secret is configured)."""
+    if not secret:
+        return None
+    expires = int(time.time()) + ttl_s
+    return f"{expires}.{_signature(secret, image_url, expires)}"
+
+
+def verify_tier_grant(grant, image_url: str, secret: str = TIER_SECRET) -> bool:
+    """True if grant is an unexpired pro grant for image_url."""
+    if not secret or not isinstance(grant, str) or not isinstance(image_url, str):
+        return False
+    expires, _, sig = grant.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(sig, _signature(secret, image_url, int(expires)))
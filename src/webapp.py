@@ -1,17 +1,46 @@
 import json
 import os
+import shutil
 import tempfile
-import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 from datetime import datetime
-import requests
-
-import stripe
 import time
 
-from PIL import Image, ImageOps, ImageDraw, ImageFont
 import gradio as gr
 
+from src.encode import (
+    DEFAULT_ENCODE_PROFILE,
+    DPI,
+    ENCODE_PROFILE_NAMES,
+    get_encode_profile,
+)
+from src.ingest import SourceRejected, open_source, probe_source
+from src.render import (
+    DEFAULT_FIT_MODE,
+    GROUP_ORDER,
+    PPI,
+    PREVIEW_LONG_SIDE,
+    PRINT_SIZES,
+    RenderCancelled,
+    build_render_plan,
+    safe_name,
+)
+from src.render_backend import (
+    RenderBackendError,
+    get_render_backend,
+    items_job,
+    job_max_side,
+    print_set_job,
+)
+from src.source_cache import SourceCache, upload_digest
+from src.tier_grant import sign_tier_grant
+from src.profiling import profiled
+from src import startup
+
+startup.mark("webapp imports")
+
 # ---------------------------------------------------------
 # CSS
 # ---------------------------------------------------------
@@ -19,7 +48,7 @@ HERE = Path(__file__).resolve().parent
 CSS_PATH = HERE / "theme_clean_2.css"
 CUSTOM_CSS = CSS_PATH.read_text(encoding="utf-8") if CSS_PATH.exists() else ""
 
-print("CSS loaded:", len(CUSTOM_CSS), "from", CSS_PATH)
+startup.mark(f"css ({len(CUSTOM_CSS)} chars)")
 
 custom_css = """
 /* Kill Gradio footer + API/settings bar */
@@ -42,17 +71,16 @@ a[href*="gradio"] { display: none !important; }
 # ---------------------------------------------------------
 # Constants
 # ---------------------------------------------------------
-JPEG_QUALITY = 80
-DPI = (300, 300)
-
 MAX_ZIP_SIZE_MB = 20
 MAX_ZIP_SIZE_BYTES = MAX_ZIP_SIZE_MB * 1024 * 1024
 
+# Sizes rendered/encoded concurrently per export (Batch ZIP + Single Export)
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
+
 APP_NAME = "SnapToSize"
-PPI = 300  # 300 DPI/PPI export for print
 
-WORKER_BASE = "https://worker.snaptosize-mathias.workers.dev"
-print("### RUNNING src/webapp.py ###", WORKER_BASE)
+# Override for local stand-ins (tools/load_test.py)
+WORKER_BASE = os.getenv("WORKER_BASE", "https://worker.snaptosize-mathias.workers.dev").rstrip("/")
 
 # ---------------------------------------------------------
 # Paywall (Stripe = source of truth)
@@ -65,7 +93,19 @@ if not STRIPE_SECRET_KEY:
     print("⚠️ STRIPE_SECRET_KEY not set. Running in DEV mode (Pro unlock disabled).")
     STRIPE_SECRET_KEY = "dev"
 
-stripe.api_key = STRIPE_SECRET_KEY
+# stripe (~1s) and requests are imported on first use, not at boot:
+# most sessions never touch the paywall or the async pipeline.
+_stripe_module = None
+
+
+def _stripe():
+    global _stripe_module
+    if _stripe_module is None:
+        import stripe
+
+        stripe.api_key = STRIPE_SECRET_KEY
+        _stripe_module = stripe
+    return _stripe_module
 
 DEMO_GROUPS = ["2x3"]
 WATERMARK_TEXT = "SNAPTOSIZE DEMO"
@@ -92,7 +132,7 @@ def stripe_is_pro(email: str):
         return cached["ok"], cached["msg"]
 
     # Find customers by email
-    customers = stripe.Customer.list(email=email, limit=5).data
+    customers = _stripe().Customer.list(email=email, limit=5).data
     if not customers:
         msg = "❌ No Stripe customer found for this email."
         _PRO_CACHE[email] = {"ok": False, "msg": msg, "ts": now}
@@ -100,7 +140,7 @@ def stripe_is_pro(email: str):
 
     # If ANY subscription is active/trialing → PRO
     for c in customers:
-        subs = stripe.Subscription.list(customer=c.id, status="all", limit=20).data
+        subs = _stripe().Subscription.list(customer=c.id, status="all", limit=20).data
         for s in subs:
             if s.status in ("active", "trialing"):
                 msg = "✅ Pro unlocked (active subscription)."
@@ -117,7 +157,7 @@ def stripe_unlock_from_session(session_id: str):
         return False, "", ""
 
     try:
-        session = stripe.checkout.Session.retrieve(
+        session = _stripe().checkout.Session.retrieve(
             session_id,
             expand=["subscription", "customer", "customer_details"],
         )
@@ -143,43 +183,6 @@ def stripe_unlock_from_session(session_id: str):
         return False, f"Could not verify checkout. ({type(e).__name__})", ""
 
 
-def add_watermark(im: Image.Image, text: str = "SnapToSize") -> Image.Image:
-    """
-    Light watermark: single centered text.
-    Much cheaper than tiled/diagonal stamping.
-    """
-    base = im.convert("RGBA")
-    w, h = base.size
-
-    overlay = Image.new("RGBA", (w, h), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay)
-
-    # Scale font to image size (safe + readable)
-    font_size = max(24, int(min(w, h) * 0.06))
-    try:
-        font = ImageFont.truetype("DejaVuSans.ttf", font_size)
-    except Exception:
-        font = ImageFont.load_default()
-
-    # Measure text
-    bbox = draw.textbbox((0, 0), text, font=font)
-    tw = bbox[2] - bbox[0]
-    th = bbox[3] - bbox[1]
-
-    # Center position
-    x = (w - tw) // 2
-    y = (h - th) // 2
-
-    # Subtle shadow for contrast
-    shadow_alpha = 120
-    text_alpha = 160
-    draw.text((x + 2, y + 2), text, font=font, fill=(0, 0, 0, shadow_alpha))
-    draw.text((x, y), text, font=font, fill=(255, 255, 255, text_alpha))
-
-    out = Image.alpha_composite(base, overlay).convert("RGB")
-    return out
-
-
 def _persist_email_script(email: str) -> str:
     email = (email or "").strip()
     if not email:
@@ -246,43 +249,6 @@ if (emailHidden && !emailHidden.value) {
 # ---------------------------------------------------------
 # Utilities
 # ---------------------------------------------------------
-def normalize_image(im: Image.Image) -> Image.Image:
-    """Fix EXIF rotation + ensure RGB + downscale huge images."""
-    im = ImageOps.exif_transpose(im)
-
-    if im.mode != "RGB":
-        im = im.convert("RGB")
-
-    # 🔒 HARD SIZE LIMIT (prevents huge uploads killing UI/memory)
-    MAX_INPUT_PX = 10000  # safe, generous, print-quality friendly
-    w, h = im.size
-    if max(w, h) > MAX_INPUT_PX:
-        scale = MAX_INPUT_PX / max(w, h)
-        im = im.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
-
-    return im
-
-
-
-def resize_image(im: Image.Image, w: int, h: int) -> Image.Image:
-    """High-quality LANCZOS resize (stretch to exact WxH)."""
-    return im.resize((w, h), Image.LANCZOS)
-
-
-def safe_name(s: str) -> str:
-    """Safe filename stub."""
-    return (
-        str(s)
-        .replace(" ", "_")
-        .replace("/", "_")
-        .replace("\\", "_")
-        .replace(":", "")
-        .replace("(", "")
-        .replace(")", "")
-        .replace(",", "")
-    )
-
-
 def ensure_under_etsy_limit(file_path: str):
     """Hard fail if any ZIP exceeds Etsy's 20MB/file cap."""
     size = os.path.getsize(file_path)
@@ -292,11 +258,151 @@ def ensure_under_etsy_limit(file_path: str):
             f"ZIP is too large for Etsy upload ({mb:.1f}MB > {MAX_ZIP_SIZE_MB}MB).\n\n"
             "Fix options:\n"
             "• Remove some size groups (generate fewer ZIPs)\n"
-            "• Lower JPEG quality\n"
+            "• Use the 'smallest' encode profile\n"
             "• Some images compress worse (high noise/detail)"
         )
 
 
+# One decoded source per upload, shared by all tabs of a session
+SOURCE_CACHE = SourceCache()
+
+
+def get_prepared_source(image_path, request: gr.Request = None, max_side: int | None = None):
+    """Normalized source for an uploaded file, decoded at most once per session."""
+    key = f"{upload_digest(image_path)}:{f'preview{max_side}' if max_side else 'full'}"
+    session_id = getattr(request, "session_hash", None)
+    return SOURCE_CACHE.get(key, lambda: open_source(image_path, max_side), session_id)
+
+
+# ---------------------------------------------------------
+# Uploads: original bytes in, small preview out
+#
+# The upload fields are gr.File, so the file a seller picks reaches
+# ingest byte for byte (gr.Image re-encodes anything that isn't RGB,
+# dropping EXIF and the ICC profile, and has the browser show the full
+# image). On upload the header is checked, the bytes are hashed once
+# and the preview-size decode (draft mode, the one free-tier renders
+# use) goes into the source cache; the preview shown is a thumbnail of
+# it.
+# ---------------------------------------------------------
+UPLOAD_PREVIEW_SIDE = 480
+UPLOAD_FILE_TYPES = ["image", ".heic", ".heif", ".avif"]
+
+
+def on_upload(image_path, request: gr.Request = None):
+    """Upload handler -> (file, preview). A rejected upload is cleared with a warning."""
+    if not image_path:
+        return None, gr.update(value=None, label="Preview")
+    try:
+        info = probe_source(image_path)
+        upload_digest(image_path)
+        im = get_prepared_source(image_path, request, PREVIEW_LONG_SIDE)
+    except SourceRejected as e:
+        gr.Warning(str(e))
+        return None, gr.update(value=None, label="Preview")
+    except Exception as e:
+        gr.Warning(f"Could not read this image: {type(e).__name__}")
+        return None, gr.update(value=None, label="Preview")
+
+    thumb = im.copy()
+    thumb.thumbnail((UPLOAD_PREVIEW_SIDE, UPLOAD_PREVIEW_SIDE))
+    w, h = info["size"]
+    return gr.update(), gr.update(value=thumb, label=f"Preview · {info['format']} {w}x{h} · "
+                                                    f"{info['bytes'] / 1024 / 1024:.1f}MB")
+
+
+def clear_upload():
+    return gr.update(value=None, label="Preview")
+
+
+def check_upload(image_path):
+    """Header check in the export handlers too (API calls skip the upload event)."""
+    try:
+        probe_source(image_path)
+    except SourceRejected as e:
+        raise gr.Error(str(e))
+
+
+def release_session_sources(request: gr.Request):
+    """Gradio unload hook: forget this session's cached sources."""
+    session_id = getattr(request, "session_hash", None)
+    if session_id:
+        SOURCE_CACHE.release_session(session_id)
+
+
+def run_render_job(job: dict, run_dir: Path, request: gr.Request = None, cancel=None) -> list[str]:
+    """Run a render job on the configured backend (in-process uses the source cache)."""
+    def load_source():
+        return get_prepared_source(job["source_path"], request, job_max_side(job))
+
+    try:
+        return get_render_backend().run(job, run_dir, load_source, cancel)
+    except RenderBackendError as e:
+        raise gr.Error(f"Render failed: {e}")
+
+
+# ---------------------------------------------------------
+# Cancellation: one running render per session
+#
+# A render stops at its next size (RenderCancelled) when the same
+# session submits again (any tab), presses Cancel, or closes the tab
+# (unload hook). Its scratch dir is removed.
+# ---------------------------------------------------------
+_SESSION_RENDERS = {}  # session_hash -> cancel event of its running render
+_SESSION_RENDERS_LOCK = threading.Lock()
+
+
+def begin_render(request: gr.Request = None) -> threading.Event:
+    """Cancel event for a new render; the session's previous one is cancelled."""
+    cancel = threading.Event()
+    session_id = getattr(request, "session_hash", None)
+    if session_id:
+        with _SESSION_RENDERS_LOCK:
+            previous = _SESSION_RENDERS.get(session_id)
+            _SESSION_RENDERS[session_id] = cancel
+        if previous is not None:
+            previous.set()
+    return cancel
+
+
+def end_render(cancel: threading.Event, request: gr.Request = None):
+    session_id = getattr(request, "session_hash", None)
+    with _SESSION_RENDERS_LOCK:
+        if session_id and _SESSION_RENDERS.get(session_id) is cancel:
+            del _SESSION_RENDERS[session_id]
+
+
+def cancel_session_render(request: gr.Request) -> bool:
+    """Cancel button + unload hook. True if a render was running."""
+    session_id = getattr(request, "session_hash", None)
+    with _SESSION_RENDERS_LOCK:
+        cancel = _SESSION_RENDERS.pop(session_id, None) if session_id else None
+    if cancel is None:
+        return False
+    cancel.set()
+    return True
+
+
+def cancel_button(request: gr.Request):
+    if cancel_session_render(request):
+        gr.Info("Export cancelled.")
+    else:
+        gr.Info("Nothing is running.")
+
+
+def run_cancellable(job: dict, request: gr.Request = None) -> list[str] | None:
+    """run_render_job in a fresh run dir; None (dir removed) if cancelled."""
+    run_dir = make_run_dir()
+    cancel = begin_render(request)
+    try:
+        return run_render_job(job, run_dir, request, cancel)
+    except RenderCancelled:
+        shutil.rmtree(run_dir, ignore_errors=True)
+        return None
+    finally:
+        end_render(cancel, request)
+
+
 def make_run_dir() -> Path:
     """Create a per-run temp directory (safe for web hosting)."""
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -349,32 +455,6 @@ def get_client_id(request: gr.Request) -> str:
     # last resort: something constant
     return "unknown"
 
-# ---------------------------------------------------------
-# Presets
-# ---------------------------------------------------------
-PRINT_SIZES = {
-    "2x3": [(4, 6), (8, 12), (10, 15), (12, 18), (16, 24), (20, 30)],
-    "3x4": [(6, 8), (9, 12), (12, 16), (15, 20), (18, 24)],
-    "4x5": [(8, 10), (12, 15), (16, 20), (20, 25)],
-    "ISO": [
-        ("A5", 1748, 2480),
-        ("A4", 2480, 3508),
-        ("A3", 3508, 4961),
-        ("A2", 4961, 7016),
-        ("A1", 7016, 9933),
-    ],
-    "EXTRAS": [
-        ("5x7", 5, 7),
-        ("8.5x11", 8.5, 11),
-        ("11x14", 11, 14),
-        ("16x20", 16, 20),
-        ("20x24", 20, 24),
-    ],
-}
-
-GROUP_ORDER = ["2x3", "3x4", "4x5", "ISO", "EXTRAS"]
-
-
 # ---------------------------------------------------------
 # Size choice builder (for Single Export)
 # ---------------------------------------------------------
@@ -436,15 +516,109 @@ def build_size_map(group: str, orientation: str):
     return choices, lookup
 
 
+SIZE_CHOICE_SEP = " · "
+
+
+def build_single_choices(group: str, orientation: str) -> list[str]:
+    """Dropdown labels qualified with group + orientation, so one multi-select can mix them."""
+    choices, _ = build_size_map(group, orientation)
+    return [SIZE_CHOICE_SEP.join((group, orientation, c)) for c in choices]
+
+
+def parse_size_choice(choice: str) -> dict | None:
+    """Qualified dropdown label -> render plan entry (None if unknown)."""
+    parts = str(choice).split(SIZE_CHOICE_SEP, 2)
+    if len(parts) != 3:
+        return None
+    group, orientation, pretty = parts
+    _, lookup = build_size_map(group, orientation)
+    if pretty not in lookup:
+        return None
+
+    w_px, h_px, base_label = lookup[pretty]
+    return {
+        "group": group,
+        "label": base_label,
+        "w": w_px,
+        "h": h_px,
+        "out_w": w_px,
+        "out_h": h_px,
+        "dpi": DPI,
+        "filename": f"export_{safe_name(group)}_{safe_name(base_label)}_{w_px}x{h_px}.jpg",
+        "preview": False,
+    }
+
+
+def resolve_encode_profile(name: str) -> dict:
+    try:
+        return get_encode_profile(name)
+    except ValueError as e:
+        raise gr.Error(str(e))
+
+
+FIT_CHOICES = [
+    ("Stretch (whole image)", "stretch"),
+    ("Smart crop (keep aspect)", "crop"),
+]
+
+
+# ---------------------------------------------------------
+# Profiling metadata (only built for profiled requests)
+# ---------------------------------------------------------
+def _source_meta(image_path) -> dict:
+    if not image_path:
+        return {}
+    from PIL import Image
+
+    path = Path(image_path)
+    with Image.open(path) as im:  # header only
+        return {"image_size": list(im.size), "image_format": im.format, "image_bytes": path.stat().st_size}
+
+
+def _generate_zip_meta(args: dict) -> dict:
+    return {
+        **_source_meta(args["image_path"]),
+        "groups": list(args["groups"] or []),
+        "tier": "pro" if args["is_pro"] else "free",
+        "encode_profile": args["encode_profile"],
+        "fit": args["fit"],
+        "backend": get_render_backend().name,
+    }
+
+
+def _single_export_meta(args: dict) -> dict:
+    sizes = args["size_choices"]
+    return {
+        **_source_meta(args["image_path"]),
+        "sizes": [sizes] if isinstance(sizes, str) else list(sizes or []),
+        "tier": "pro" if args["is_pro"] else "free",
+        "encode_profile": args["encode_profile"],
+        "output_mode": args["output_mode"],
+        "fit": args["fit"],
+        "backend": get_render_backend().name,
+    }
+
+
 # ---------------------------------------------------------
 # Batch ZIP generator
 # ---------------------------------------------------------
-def generate_zip(image_path, groups, is_pro: bool, free_used_at: str, request: gr.Request = None):
-    print("generate_zip START", {"groups": groups, "is_pro": is_pro})
+@profiled("generate_zip", _generate_zip_meta)
+def generate_zip(
+    image_path,
+    groups,
+    is_pro: bool,
+    free_used_at: str,
+    encode_profile: str = DEFAULT_ENCODE_PROFILE,
+    fit: str = DEFAULT_FIT_MODE,
+    request: gr.Request = None,
+):
+    print("generate_zip START", {"groups": groups, "is_pro": is_pro, "profile": encode_profile, "fit": fit})
     if not image_path:
         raise gr.Error("Upload an image first.")
+    check_upload(image_path)
     if not groups:
         raise gr.Error("Choose at least one group.")
+    resolve_encode_profile(encode_profile)  # fail fast on a bad profile name
 
     now = time.time()
 
@@ -486,38 +660,19 @@ def generate_zip(image_path, groups, is_pro: bool, free_used_at: str, request: g
                 raise gr.Error(paywall_msg)
 
 
-    im = normalize_image(Image.open(image_path))
-    run_dir = make_run_dir()
-    result_files = []
-
-    for group in groups:
-        zip_path = run_dir / f"{group}.zip"
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            for spec in PRINT_SIZES[group]:
-                if group == "ISO":
-                    label, w, h = spec
-                else:
-                    if isinstance(spec, tuple) and len(spec) == 3:
-                        label, w_in, h_in = spec
-                        if not str(label).endswith("in"):
-                            label = f"{label}in"
-                    else:
-                        w_in, h_in = spec
-                        label = f"{w_in}x{h_in}in"
-
-                    w = int(round(float(w_in) * PPI))
-                    h = int(round(float(h_in) * PPI))
-
-                img = resize_image(im, w, h)
-                if not is_pro:
-                    img = add_watermark(img)
-
-                filename = f"{safe_name(label)}_{w}x{h}.jpg"
-                with zf.open(filename, "w") as f:
-                    img.save(f, "JPEG", quality=JPEG_QUALITY, dpi=DPI)
-
-        ensure_under_etsy_limit(str(zip_path))
-        result_files.append(str(zip_path))
+    # Free tier = preview render: same plan, long side capped, watermarked
+    try:
+        job = print_set_job(image_path, groups, encode_profile, preview=not is_pro,
+                            watermark=not is_pro, fit=fit, workers=RENDER_WORKERS)
+    except RenderBackendError as e:
+        raise gr.Error(str(e))
+    result_files = run_cancellable(job, request)
+    if result_files is None:
+        print("generate_zip CANCELLED", {"groups": groups})
+        return [], ""
+
+    for zip_path in result_files:
+        ensure_under_etsy_limit(zip_path)
 
     # -----------------------------
     # MARK FREE EXPORT AS USED
@@ -548,44 +703,317 @@ try {{
 </script>
 """
 
-    print("generate_zip DONE", {"zips": len(result_files)})
+    print("generate_zip DONE", {"zips": len(result_files), "source_cache": SOURCE_CACHE.stats()})
     return result_files, js
 
 
+# ---------------------------------------------------------
+# Collections: many images in one Batch ZIP submission (Pro)
+#
+# Artworks go through one process-wide pool (COLLECTION_WORKERS at a
+# time across all sellers), each rendered from the same print-set job
+# template. Results stream back per artwork, ZIPs prefixed with the
+# artwork name and packed into <=20MB parts (<group>_partN.zip) instead
+# of failing on the Etsy limit. Collection sources skip the session
+# source cache: each is decoded once and would only evict the seller's
+# working image.
+# ---------------------------------------------------------
+COLLECTION_MAX_IMAGES = int(os.getenv("COLLECTION_MAX_IMAGES", "50"))
+COLLECTION_WORKERS = max(1, int(os.getenv("COLLECTION_WORKERS", "2")))
+# The Batch ZIP event has no Gradio concurrency limit (collections are
+# bounded by their pool); its one-image renders run in the request thread
+# and take one of these slots instead
+SINGLE_IMAGE_CONCURRENCY = max(1, int(os.getenv("SINGLE_IMAGE_CONCURRENCY", "1")))
+_SINGLE_IMAGE_SLOTS = threading.BoundedSemaphore(SINGLE_IMAGE_CONCURRENCY)
+_SLOT_POLL_S = 0.25
+ETSY_MAX_FILES = 5  # files per listing
+
+_collection_pool = None
+
+
+def _get_collection_pool() -> ThreadPoolExecutor:
+    global _collection_pool
+    if _collection_pool is None:
+        _collection_pool = ThreadPoolExecutor(max_workers=COLLECTION_WORKERS, thread_name_prefix="collection")
+    return _collection_pool
+
+
+def artwork_names(paths) -> list[str]:
+    """Filename stems made safe and unique (same stem twice -> name_2)."""
+    names = []
+    seen = {}
+    for path in paths:
+        base = safe_name(Path(path).stem) or "artwork"
+        seen[base] = seen.get(base, 0) + 1
+        names.append(base if seen[base] == 1 else f"{base}_{seen[base]}")
+    return names
+
+
+def render_artwork(job: dict, name: str, run_dir: Path, cancel=None) -> dict:
+    """One artwork of a collection -> {"name", "files", "bytes", "error"}."""
+    out_dir = run_dir / name
+    out_dir.mkdir()
+    try:
+        files = get_render_backend().run(job, out_dir, lambda: open_source(job["source_path"], job_max_side(job)),
+                                         cancel)
+    except RenderCancelled:
+        raise
+    except Exception as e:
+        print(f"collection artwork failed name={name}: {type(e).__name__}: {e}")
+        return {"name": name, "files": [], "bytes": 0, "oversized": 0, "error": str(e) or type(e).__name__}
+
+    # gr.Files shows basenames: prefix with the artwork so each seller's
+    # download list reads as one block per artwork
+    named = []
+    for f in files:
+        path = Path(f)
+        target = path.with_name(f"{name}_{path.name}")
+        path.rename(target)
+        named.append(str(target))
+    sizes = [os.path.getsize(f) for f in named]
+    return {
+        "name": name,
+        "files": named,
+        "bytes": sum(sizes),
+        # a part holding one JPEG that is itself over the limit
+        "oversized": sum(1 for size in sizes if size > MAX_ZIP_SIZE_BYTES),
+        "error": None,
+    }
+
+
+def _remove_when_done(futures, run_dir: Path):
+    wait(futures)
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def format_collection_status(results: list, total: int) -> str:
+    done = [r for r in results if r is not None]
+    zips = sum(len(r["files"]) for r in done)
+    mb = sum(r["bytes"] for r in done) / (1024 * 1024)
+    lines = [
+        f"**Collection:** {len(done)}/{total} artworks · {zips} ZIPs · {mb:.1f} MB",
+        "",
+        "| # | artwork | ZIPs | MB | |",
+        "|---|---------|------|----|---|",
+    ]
+    for i, r in enumerate(results, start=1):
+        if r is None:
+            continue
+        if r["error"]:
+            note = f"❌ {r['error'][:120]}"
+        elif r["oversized"]:
+            note = f"⚠️ {r['oversized']} ZIP(s) over {MAX_ZIP_SIZE_MB}MB: try the 'smallest' profile"
+        elif len(r["files"]) > ETSY_MAX_FILES:
+            note = f"⚠️ {len(r['files'])} files: more than Etsy's {ETSY_MAX_FILES} per listing"
+        else:
+            note = "✅"
+        lines.append(f"| {i} | {r['name']} | {len(r['files'])} | {r['bytes'] / (1024 * 1024):.1f} | {note} |")
+    return "\n".join(lines)
+
+
+def generate_collection(
+    image_paths: list,
+    groups,
+    encode_profile: str = DEFAULT_ENCODE_PROFILE,
+    fit: str = DEFAULT_FIT_MODE,
+    progress=None,
+    cancel: threading.Event | None = None,
+):
+    """
+    Render a print set for every image. Yields (files so far, status
+    markdown) each time an artwork finishes; files stay in upload order.
+    Stops (scratch removed) once cancel is set or the generator is closed.
+    """
+    if len(image_paths) > COLLECTION_MAX_IMAGES:
+        raise gr.Error(f"Up to {COLLECTION_MAX_IMAGES} images per collection.")
+    resolve_encode_profile(encode_profile)  # fail fast on a bad profile name
+
+    # One job template (and so one render plan) for the whole collection;
+    # pool threads share the cores, so each artwork gets fewer size workers
+    try:
+        template = print_set_job("", groups, encode_profile, fit=fit,
+                                 workers=max(1, RENDER_WORKERS // COLLECTION_WORKERS),
+                                 max_zip_bytes=MAX_ZIP_SIZE_BYTES)
+    except RenderBackendError as e:
+        raise gr.Error(str(e))
+    sizes = len(build_render_plan(groups))
+    total = len(image_paths)
+    print("generate_collection START", {"images": total, "groups": groups, "sizes": sizes,
+                                        "profile": encode_profile, "fit": fit})
+
+    run_dir = make_run_dir()
+    names = artwork_names(image_paths)
+    results = [None] * total
+    cancel = cancel or threading.Event()
+    # Header check first (like check_upload): a rejected file is its own
+    # error row and never reaches a decoder on the shared pool
+    for i, path in enumerate(image_paths):
+        try:
+            probe_source(path)
+        except SourceRejected as e:
+            results[i] = {"name": names[i], "files": [], "bytes": 0, "oversized": 0, "error": str(e)}
+    rejected = sum(r is not None for r in results)
+
+    pool = _get_collection_pool()
+    futures = {
+        pool.submit(render_artwork, dict(template, source_path=str(path)), name, run_dir, cancel): i
+        for i, (path, name) in enumerate(zip(image_paths, names))
+        if results[i] is None
+    }
+    if progress:
+        progress((rejected, total), desc=f"{rejected}/{total} artworks · {sizes} sizes each", unit="artworks")
+    finished = False
+    try:
+        if rejected:
+            yield [], format_collection_status(results, total)
+        for n, future in enumerate(as_completed(futures), start=rejected + 1):
+            results[futures[future]] = future.result()
+            if progress:
+                progress((n, total), desc=f"{n}/{total} artworks · {sizes} sizes each", unit="artworks")
+            files = [f for r in results if r is not None for f in r["files"]]
+            yield files, format_collection_status(results, total)
+        finished = True
+    except RenderCancelled:
+        print("generate_collection CANCELLED", {"images": total, "done": sum(r is not None for r in results)})
+        yield [], "Collection cancelled."
+        return
+    finally:
+        if not finished:
+            # Cancelled, or the seller left (generator closed): drop artworks
+            # not started, stop running ones at their next size, then clean up
+            cancel.set()
+            for future in futures:
+                future.cancel()
+            threading.Thread(target=_remove_when_done, args=(list(futures), run_dir), daemon=True).start()
+
+    failed = sum(1 for r in results if r["error"])
+    print("generate_collection DONE", {"images": total, "failed": failed,
+                                       "zips": sum(len(r["files"]) for r in results)})
+
+
+def acquire_single_image_slot(cancel: threading.Event) -> bool:
+    """Wait for a one-image render slot; False if cancel is set meanwhile."""
+    while not _SINGLE_IMAGE_SLOTS.acquire(timeout=_SLOT_POLL_S):
+        if cancel.is_set():
+            return False
+    return True
+
+
+def generate_batch(
+    image_path,
+    collection_paths,
+    groups,
+    is_pro: bool,
+    free_used_at: str,
+    encode_profile: str = DEFAULT_ENCODE_PROFILE,
+    fit: str = DEFAULT_FIT_MODE,
+    request: gr.Request = None,
+    progress=gr.Progress(),
+):
+    """
+    Batch ZIP button: a collection (2+ images, Pro) streams per artwork;
+    one image (either upload field) goes through generate_zip as before.
+    """
+    paths = [p for p in (collection_paths or []) if p]
+    if len(paths) <= 1:
+        # Register first: a resubmit cancels this session's previous render,
+        # which may be the one holding the slot; Cancel/unload stop the wait
+        waiting = begin_render(request)
+        try:
+            if not acquire_single_image_slot(waiting):
+                print("generate_batch CANCELLED while waiting for a render slot")
+                yield [], "", ""
+                return
+            try:
+                files, js = generate_zip(paths[0] if paths else image_path, groups, is_pro, free_used_at,
+                                         encode_profile, fit, request)
+            finally:
+                _SINGLE_IMAGE_SLOTS.release()
+        finally:
+            end_render(waiting, request)
+        yield files, js, ""
+        return
+
+    if not is_pro:
+        raise gr.Error("Demo mode: one image per export. Unlock Pro to process a whole collection at once.")
+    if not groups:
+        raise gr.Error("Choose at least one group.")
+    cancel = begin_render(request)
+    try:
+        for files, status in generate_collection(paths, groups, encode_profile, fit, progress, cancel):
+            yield files, "", status
+    finally:
+        end_render(cancel, request)
+
+
 # ---------------------------------------------------------
 # Single size export (Pro only)
 # ---------------------------------------------------------
-def single_export(image_pil, orientation, group, size_choice, is_pro: bool):
-    if image_pil is None:
+SINGLE_EXPORT_WORKERS = RENDER_WORKERS
+SINGLE_OUTPUT_MODES = ["Separate JPGs", "One ZIP"]
+
+
+@profiled("single_export", _single_export_meta)
+def single_export(
+    image_path,
+    size_choices,
+    is_pro: bool,
+    encode_profile: str = DEFAULT_ENCODE_PROFILE,
+    output_mode: str = "Separate JPGs",
+    fit: str = DEFAULT_FIT_MODE,
+    request: gr.Request = None,
+):
+    """
+    Export one or more sizes (any mix of groups/orientations).
+    The source is normalized once; sizes render concurrently from it.
+    """
+    if not image_path:
         raise gr.Error("Upload an image first.")
-    if not group:
-        raise gr.Error("Choose a group.")
-    if not size_choice:
-        raise gr.Error("Choose a size.")
+    check_upload(image_path)
+    if isinstance(size_choices, str):
+        size_choices = [size_choices]
+    if not size_choices:
+        raise gr.Error("Choose at least one size.")
 
     if not is_pro:
         raise gr.Error("Demo mode: Single Export is Pro only. Unlock Pro to use this feature.")
 
-    choices, lookup = build_size_map(group, orientation)
-    if size_choice not in lookup:
-        raise gr.Error("Invalid size selection. Try selecting the group again.")
-
-    w_px, h_px, base_label = lookup[size_choice]
+    items = []
+    seen = set()
+    for choice in size_choices:
+        item = parse_size_choice(choice)
+        if item is None:
+            raise gr.Error(f"Invalid size selection: {choice}. Try selecting the group again.")
+        if item["filename"] not in seen:
+            seen.add(item["filename"])
+            items.append(item)
 
-    im = normalize_image(image_pil)
-    out_img = resize_image(im, w_px, h_px)
+    resolve_encode_profile(encode_profile)  # fail fast on a bad profile name
 
-    run_dir = make_run_dir()
-    fname = f"export_{safe_name(group)}_{safe_name(base_label)}_{w_px}x{h_px}.jpg"
-    out_path = run_dir / fname
-
-    out_img.save(str(out_path), "JPEG", quality=JPEG_QUALITY, dpi=DPI)
-    return str(out_path)
+    try:
+        job = items_job(
+            image_path,
+            items,
+            encode_profile,
+            as_zip=(output_mode == "One ZIP"),
+            workers=SINGLE_EXPORT_WORKERS,
+            fit=fit,
+        )
+    except RenderBackendError as e:
+        raise gr.Error(str(e))
+    files = run_cancellable(job, request)
+    if files is None:
+        print("single_export CANCELLED", {"sizes": len(items)})
+        return []
+    return files
 
 
-def update_single_size_choices(orientation, group):
-    choices, _ = build_size_map(group, orientation)
-    return gr.update(choices=choices, value=(choices[0] if choices else None))
+def update_single_size_choices(orientation, group, selected=None):
+    """Show sizes for group/orientation, keeping sizes already picked elsewhere."""
+    choices = build_single_choices(group, orientation)
+    selected = [c for c in (selected or []) if parse_size_choice(c) is not None]
+    merged = selected + [c for c in choices if c not in selected]
+    return gr.update(choices=merged, value=(selected or choices[:1]))
 
 
 # ---------------------------------------------------------
@@ -605,12 +1033,24 @@ def clear_all_groups():
 ASYNC_PRESETS = ["thumb_1024", "etsy_3000px", "etsy_6000px"]
 
 
-def enqueue_job(image_url: str, presets: list) -> str:
+def enqueue_job(image_url: str, presets: list, print_groups: list | None = None, tier: str = "free") -> str:
+    import requests
+
     url = f"{WORKER_BASE}/enqueue"
     payload = {
         "image_url": (image_url or "").strip(),
         "presets": presets or ASYNC_PRESETS,
     }
+    if print_groups:
+        # Full print set rendered by the runner (one ZIP per group)
+        payload["print_groups"] = list(print_groups)
+        payload["tier"] = tier
+        if tier == "pro":
+            # Worker and runner render pro only with this grant (src/tier_grant.py)
+            grant = sign_tier_grant(payload["image_url"])
+            if grant is None:
+                raise gr.Error("Pro renders on the new engine are not configured (TIER_SECRET).")
+            payload["tier_grant"] = grant
     headers = {
         "Content-Type": "application/json",
         "Accept": "application/json,text/plain,*/*",
@@ -624,7 +1064,10 @@ def enqueue_job(image_url: str, presets: list) -> str:
     return r.json()["job_id"]
 
 
-def poll_status(job_id: str, timeout_s: int = 90) -> dict:
+def iter_status(job_id: str, timeout_s: int = 90):
+    """Yield the worker's job state each poll until it is done (last yield) or fails."""
+    import requests
+
     start = time.time()
     headers = {
         "Accept": "application/json,text/plain,*/*",
@@ -636,21 +1079,58 @@ def poll_status(job_id: str, timeout_s: int = 90) -> dict:
         if r.status_code != 200:
             raise gr.Error(f"STATUS HTTP {r.status_code}: {r.text[:200]}")
         data = r.json()
-        if data.get("status") == "done":
-            return data
         if data.get("status") == "error":
             raise gr.Error(f"Job error: {data}")
+        yield data
+        if data.get("status") == "done":
+            return
         time.sleep(1)
     raise gr.Error("Timed out waiting for job")
 
 
-def generate_async(image_url: str, presets: list) -> str:
-    job_id = enqueue_job(image_url, presets)
-    data = poll_status(job_id)
+def format_async_progress(job_id: str, data: dict) -> str:
+    """Running job: stage/counts from the runner + links to ZIPs already stored."""
+    progress = data.get("progress") or {}
+    stage = progress.get("stage") or data.get("status", "queued")
+    lines = [f"**job_id:** `{job_id}`", f"**status:** {data.get('status', 'queued')} · `{stage}`"]
+    if progress.get("total"):
+        lines[-1] += f" {progress.get('done') or 0}/{progress['total']}"
+    if progress.get("elapsed_s") is not None:
+        lines[-1] += f" · {progress['elapsed_s']:.1f}s"
+
+    download_urls = data.get("download_urls") or []
+    ready = [(a, url) for a, url in zip(data.get("partial_archives") or [], download_urls) if a]
+    if ready:
+        lines += ["", "Ready so far:"]
+        lines += [f"- [{a.get('name', 'ZIP')}]({url})" for a, url in ready]
+    return "\n".join(lines)
+
+
+def generate_async(image_url: str, presets: list, print_groups: list | None = None, is_pro: bool = False):
+    """Streams progress markdown while the job runs; the last value is the result table."""
+    job_id = enqueue_job(image_url, presets, print_groups, "pro" if is_pro else "free")
+    for data in iter_status(job_id):
+        if data.get("status") != "done":
+            yield format_async_progress(job_id, data)
+    yield format_async_result(job_id, data)
+
+
+def format_async_result(job_id: str, data: dict) -> str:
     result = data.get("result", data)
     presets_list = result.get("presets", [])
+    archives = result.get("archives", [])
     lines = [f"**job_id:** `{job_id}`", f"**status:** done", ""]
     download_url = data.get("download_url")
+    download_urls = data.get("download_urls") or []
+    if archives:
+        lines.append("| ZIP | files | MB |")
+        lines.append("|-----|-------|-----|")
+        for i, a in enumerate(archives):
+            name = a.get("name", "")
+            link = f"[{name}]({download_urls[i]})" if i < len(download_urls) else name
+            mb = f"{a.get('zip_bytes', 0) / 1024 / 1024:.2f}"
+            lines.append(f"| {link} | {len(a.get('files', []))} | {mb} |")
+        return "\n".join(lines)
     if download_url:
         lines.append(f"**[Download ZIP]({download_url})**")
         lines.append("")
@@ -808,20 +1288,49 @@ Paste the email you used at checkout and click **Unlock Pro**.
         )
 
         with gr.Row(elem_id="batch-row"):
-            input_img = gr.Image(
-                type="filepath",
-                label="Upload image (JPG recommended)",
-                height=320,
-                elem_id="batch-input-image",
-            )
+            with gr.Column():
+                input_img = gr.File(
+                    file_types=UPLOAD_FILE_TYPES,
+                    type="filepath",
+                    label="Upload image (JPG, PNG, HEIC)",
+                    elem_id="batch-input-image",
+                )
+                input_preview = gr.Image(label="Preview", interactive=False, height=240,
+                                         elem_id="batch-input-preview")
             output_zip = gr.Files(label="Download ZIPs", elem_id="batch-output-zip")
 
+        input_img.upload(on_upload, inputs=input_img, outputs=[input_img, input_preview])
+        input_img.clear(clear_upload, outputs=input_preview, queue=False)
+
+        batch_collection = gr.File(
+            file_count="multiple",
+            file_types=UPLOAD_FILE_TYPES,
+            type="filepath",
+            label="…or a whole collection (Pro): every image gets the full print set",
+            elem_id="batch-collection",
+        )
+
         group_select = gr.CheckboxGroup(
             GROUP_ORDER,
             label="Select print groups",
             elem_id="batch-group-select",
         )
 
+        batch_profile = gr.Radio(
+            ENCODE_PROFILE_NAMES,
+            value=DEFAULT_ENCODE_PROFILE,
+            label="Encode profile",
+            info="fast = quickest export · balanced = smaller files · smallest = slowest, best for the 20MB limit",
+            elem_id="batch-encode-profile",
+        )
+        batch_fit = gr.Radio(
+            FIT_CHOICES,
+            value=DEFAULT_FIT_MODE,
+            label="Fit",
+            info="Smart crop keeps each print's exact aspect and crops around the subject",
+            elem_id="batch-fit",
+        )
+
         with gr.Row(elem_id="batch-actions-row"):
             gr.Button("Select all groups", elem_classes=["secondary"]).click(
                 select_all_groups,
@@ -836,12 +1345,18 @@ Paste the email you used at checkout and click **Unlock Pro**.
                 queue=False,
             )
 
-        gr.Button("Generate ZIPs", elem_id="batch-generate-btn").click(
-            fn=generate_zip,
-            inputs=[input_img, group_select, is_pro, free_state],
-            outputs=[output_zip, free_js],
-            queue=False,
-        )
+        batch_status = gr.Markdown("", elem_id="batch-status")
+
+        with gr.Row(elem_id="batch-generate-row"):
+            gr.Button("Generate ZIPs", elem_id="batch-generate-btn").click(
+                fn=generate_batch,
+                inputs=[input_img, batch_collection, group_select, is_pro, free_state, batch_profile, batch_fit],
+                outputs=[output_zip, free_js, batch_status],
+                concurrency_limit=None,  # bounded by the collection pool / _SINGLE_IMAGE_SLOTS
+            )
+            gr.Button("Cancel", elem_classes=["secondary"], elem_id="batch-cancel-btn").click(
+                cancel_button, queue=False,
+            )
 
     # ==================== NEW ENGINE (ASYNC) ====================
     with gr.Tab("New Engine (Async)", elem_id="tab-async"):
@@ -860,11 +1375,16 @@ Paste the email you used at checkout and click **Unlock Pro**.
             label="Presets",
             elem_id="async-presets",
         )
+        async_groups = gr.CheckboxGroup(
+            GROUP_ORDER,
+            label="Print groups (optional: full print set rendered on the runner)",
+            elem_id="async-print-groups",
+        )
         async_btn = gr.Button("Generate (Async)", elem_id="async-generate-btn")
         async_out = gr.Markdown("", elem_id="async-output")
         async_btn.click(
             fn=generate_async,
-            inputs=[async_image_url, async_presets],
+            inputs=[async_image_url, async_presets, async_groups, is_pro],
             outputs=async_out,
         )
 
@@ -872,33 +1392,73 @@ Paste the email you used at checkout and click **Unlock Pro**.
     with gr.Tab("Single Size Export (Advanced)", elem_id="tab-single-export"):
         gr.Markdown(
             "## Single Size Export (Advanced)\n"
-            "_Export one specific print size from the same presets used in Batch ZIP._",
+            "_Export one or more specific print sizes (mix groups and orientations) "
+            "from the same presets used in Batch ZIP._",
             elem_id="single-export-header",
         )
 
         with gr.Row(elem_id="single-row"):
-            single_img = gr.Image(type="pil", label="Upload image (JPG recommended)", height=320, elem_id="single-input-image")
-            single_out = gr.File(label="Download JPG", elem_id="single-output-file")
+            with gr.Column():
+                single_img = gr.File(file_types=UPLOAD_FILE_TYPES, type="filepath",
+                                     label="Upload image (JPG, PNG, HEIC)", elem_id="single-input-image")
+                single_preview = gr.Image(label="Preview", interactive=False, height=240,
+                                          elem_id="single-input-preview")
+            single_out = gr.Files(label="Download", elem_id="single-output-file")
+
+        single_img.upload(on_upload, inputs=single_img, outputs=[single_img, single_preview])
+        single_img.clear(clear_upload, outputs=single_preview, queue=False)
 
         with gr.Row(elem_id="single-controls-row"):
             orientation = gr.Radio(["Portrait", "Landscape"], value="Portrait", label="Orientation", elem_id="single-orientation")
             single_group = gr.Dropdown(GROUP_ORDER, value="4x5", label="Ratio family", elem_id="single-group")
 
-            initial_choices, _ = build_size_map("4x5", "Portrait")
+            initial_choices = build_single_choices("4x5", "Portrait")
             single_size = gr.Dropdown(
                 initial_choices,
-                value=(initial_choices[0] if initial_choices else None),
-                label="Size",
+                value=initial_choices[:1],
+                multiselect=True,
+                label="Sizes",
+                info="Pick sizes, switch ratio family/orientation, pick more.",
                 elem_id="single-size",
             )
 
-        orientation.change(update_single_size_choices, inputs=[orientation, single_group], outputs=single_size)
-        single_group.change(update_single_size_choices, inputs=[orientation, single_group], outputs=single_size)
+        with gr.Row(elem_id="single-options-row"):
+            single_profile = gr.Radio(
+                ENCODE_PROFILE_NAMES,
+                value=DEFAULT_ENCODE_PROFILE,
+                label="Encode profile",
+                elem_id="single-encode-profile",
+            )
+            single_mode = gr.Radio(
+                SINGLE_OUTPUT_MODES,
+                value=SINGLE_OUTPUT_MODES[0],
+                label="Output",
+                elem_id="single-output-mode",
+            )
+            single_fit = gr.Radio(
+                FIT_CHOICES,
+                value=DEFAULT_FIT_MODE,
+                label="Fit",
+                elem_id="single-fit",
+            )
+
+        size_inputs = [orientation, single_group, single_size]
+        orientation.change(update_single_size_choices, inputs=size_inputs, outputs=single_size)
+        single_group.change(update_single_size_choices, inputs=size_inputs, outputs=single_size)
 
-        gr.Button("Export JPG", elem_id="single-export-btn").click(
-            single_export,
-            inputs=[single_img, orientation, single_group, single_size, is_pro],
-            outputs=single_out,
-        )
+        with gr.Row(elem_id="single-export-row"):
+            gr.Button("Export", elem_id="single-export-btn").click(
+                single_export,
+                inputs=[single_img, single_size, is_pro, single_profile, single_mode, single_fit],
+                outputs=single_out,
+            )
+            gr.Button("Cancel", elem_classes=["secondary"], elem_id="single-cancel-btn").click(
+                cancel_button, queue=False,
+            )
 
+    # Drop cached decoded sources when the browser session ends
+    app.unload(release_session_sources)
+    # ...and stop its render, nobody is left to download it
+    app.unload(cancel_session_render)
 
+startup.mark("build ui")
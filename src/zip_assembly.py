@@ -0,0 +1,185 @@
+import os
+import struct
+import time
+import zlib
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+# ---------------------------------------------------------
+# ZIP assembly from pre-encoded entries
+#
+# zipfile compresses + checksums inside the archive writer, one entry
+# after another. Here render workers finish each entry themselves
+# (CRC-32, and deflate only if the profile asks for it: zlib releases
+# the GIL, so that runs in parallel), and write_zip() only lays out
+# local headers, payloads and the central directory in one sequential
+# pass - close to a plain copy of the bytes.
+#
+# Output is a standard ZIP (no data descriptors; ZIP64 records are added
+# only past the 4 GiB / 65535-entry limits).
+# The runner keeps a copy in services/runner/zip_assembly.py (separate
+# image) -> keep in sync.
+# ---------------------------------------------------------
+DEFLATE_LEVEL = 6
+ZIP_WORKERS = min(4, os.cpu_count() or 1)
+
+_LOCAL = struct.Struct("<4s5H3L2H")
+_CENTRAL = struct.Struct("<4s6H3L5H2L")
+_END = struct.Struct("<4s4H2LH")
+_END64 = struct.Struct("<4sQ2H2L4Q")
+_LOCATOR64 = struct.Struct("<4sLQL")
+_U32 = 0xFFFFFFFF  # "see ZIP64 extra" marker
+_U16 = 0xFFFF
+ZIP64_LIMIT = _U32  # sizes/offsets at or past this need ZIP64
+ZIP64_COUNT_LIMIT = _U16
+_UTF8_FLAG = 0x800
+
+
+@dataclass(frozen=True)
+class ZipEntry:
+    name: str
+    payload: bytes  # stored bytes or raw deflate stream
+    crc: int
+    size: int  # uncompressed
+    method: int  # zipfile.ZIP_STORED / zipfile.ZIP_DEFLATED
+
+
+def make_entry(name: str, data: bytes, compression: int = zipfile.ZIP_STORED,
+               level: int = DEFLATE_LEVEL) -> ZipEntry:
+    """
+    Checksum (+ deflate) one entry. Safe to call from worker threads.
+    A deflated entry that does not shrink is stored instead (JPEGs
+    usually barely compress).
+    """
+    crc = zlib.crc32(data)
+    if compression == zipfile.ZIP_DEFLATED:
+        co = zlib.compressobj(level, zlib.DEFLATED, -15)
+        packed = co.compress(data) + co.flush()
+        if len(packed) < len(data):
+            return ZipEntry(name, packed, crc, len(data), zipfile.ZIP_DEFLATED)
+    elif compression != zipfile.ZIP_STORED:
+        raise ValueError(f"Unsupported ZIP compression: {compression}")
+    return ZipEntry(name, data, crc, len(data), zipfile.ZIP_STORED)
+
+
+def make_entries_from_files(files, compression: int = zipfile.ZIP_STORED,
+                            workers: int = ZIP_WORKERS) -> list[ZipEntry]:
+    """[(arcname, path)] -> entries, read + checksummed in parallel."""
+    def _one(pair):
+        arcname, path = pair
+        with open(path, "rb") as f:
+            return make_entry(arcname, f.read(), compression)
+
+    files = list(files)
+    if workers <= 1 or len(files) <= 1:
+        return [_one(pair) for pair in files]
+    with ThreadPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        return list(pool.map(_one, files))
+
+
+def _dos_time(ts: float) -> tuple[int, int]:
+    t = time.localtime(ts)
+    year = max(1980, t.tm_year)
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday,
+    )
+
+
+def write_zip(target, entries, mtime: float | None = None) -> int:
+    """
+    Write entries as one ZIP to a path or binary file object.
+    Returns the number of bytes written.
+    """
+    dos_time, dos_date = _dos_time(time.time() if mtime is None else mtime)
+    central = []
+    offset = 0
+
+    def _write(f):
+        nonlocal offset
+        for e in entries:
+            name = e.name.encode("utf-8")
+            flags = 0 if name.isascii() else _UTF8_FLAG
+            big = e.size >= ZIP64_LIMIT or len(e.payload) >= ZIP64_LIMIT or offset >= ZIP64_LIMIT
+            extra = b""
+            if big:
+                extra = struct.pack("<2H2Q", 1, 16, e.size, len(e.payload))
+            version = 45 if big else 20
+            f.write(_LOCAL.pack(
+                b"PK\x03\x04", version, flags, e.method, dos_time, dos_date, e.crc,
+                _U32 if big else len(e.payload), _U32 if big else e.size, len(name), len(extra),
+            ))
+            f.write(name)
+            f.write(extra)
+            f.write(e.payload)
+            central.append((e, name, flags, offset))
+            offset += _LOCAL.size + len(name) + len(extra) + len(e.payload)
+
+        cd_start = offset
+        for e, name, flags, local_offset in central:
+            sizes64 = e.size >= ZIP64_LIMIT or len(e.payload) >= ZIP64_LIMIT
+            offset64 = local_offset >= ZIP64_LIMIT
+            fields = []
+            if sizes64:
+                fields += [e.size, len(e.payload)]
+            if offset64:
+                fields.append(local_offset)
+            extra = struct.pack(f"<2H{len(fields)}Q", 1, 8 * len(fields), *fields) if fields else b""
+            version = 45 if extra else 20
+            f.write(_CENTRAL.pack(
+                b"PK\x01\x02", (3 << 8) | version, version, flags, e.method, dos_time, dos_date,
+                e.crc, _U32 if sizes64 else len(e.payload), _U32 if sizes64 else e.size,
+                len(name), len(extra), 0, 0, 0, (0o100644 << 16),
+                _U32 if offset64 else local_offset,
+            ))
+            f.write(name)
+            f.write(extra)
+            offset += _CENTRAL.size + len(name) + len(extra)
+
+        cd_size = offset - cd_start
+        count = len(central)
+        zip64_end = count >= ZIP64_COUNT_LIMIT or cd_start >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT
+        if zip64_end:
+            end64_at = offset
+            f.write(_END64.pack(b"PK\x06\x06", _END64.size - 12, 45, 45, 0, 0,
+                                count, count, cd_size, cd_start))
+            f.write(_LOCATOR64.pack(b"PK\x06\x07", 0, end64_at, 1))
+            offset += _END64.size + _LOCATOR64.size
+        f.write(_END.pack(
+            b"PK\x05\x06", 0, 0,
+            _U16 if zip64_end else count, _U16 if zip64_end else count,
+            _U32 if zip64_end else cd_size, _U32 if zip64_end else cd_start, 0,
+        ))
+        offset += _END.size
+
+    if hasattr(target, "write"):
+        _write(target)
+    else:
+        with open(target, "wb") as f:
+            _write(f)
+    return offset
+
+
+def entry_zip_bytes(e: ZipEntry) -> int:
+    """Bytes one entry adds to an archive: local header + central record (below ZIP64 sizes)."""
+    return _LOCAL.size + _CENTRAL.size + 2 * len(e.name.encode("utf-8")) + len(e.payload)
+
+
+def zip_size(entries) -> int:
+    """Exact size write_zip() produces for entries (below the ZIP64 limits)."""
+    return _END.size + sum(entry_zip_bytes(e) for e in entries)
+
+
+def split_entries(entries, max_bytes: int) -> list[list[ZipEntry]]:
+    """Group entries into archives of at most max_bytes each (one entry may exceed it alone)."""
+    parts = [[]]
+    size = _END.size
+    for e in entries:
+        n = entry_zip_bytes(e)
+        if parts[-1] and size + n > max_bytes:
+            parts.append([])
+            size = _END.size
+        parts[-1].append(e)
+        size += n
+    return parts if parts[0] else []
@@ -0,0 +1,106 @@
+"""
+Encode profile benchmark: encode time vs bytes per profile.
+
+Usage (from repo root):
+    python tools/bench_encode.py
+    python tools/bench_encode.py --size 3600x5400 --repeat 5 path/to/own.jpg
+
+Without image arguments, three deterministic reference images are
+generated (photo-like, flat illustration, high-detail noise) at the
+12x18in print size. Prints a Markdown table (same format as README).
+"""
+import argparse
+import io
+import statistics
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFilter, ImageOps
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.encode import ENCODE_PROFILES, encode_jpeg, zip_compression  # noqa: E402
+
+
+def reference_images(w: int, h: int) -> dict:
+    """Deterministic stand-ins for the kinds of art sellers upload."""
+    # Photo-like: smooth gradients + mild grain
+    r = Image.linear_gradient("L").resize((w, h))
+    g = Image.radial_gradient("L").resize((w, h))
+    b = ImageOps.invert(r).rotate(90, expand=False)
+    photo = Image.merge("RGB", (r, g, b))
+    grain = Image.effect_noise((w, h), 18).convert("RGB")
+    photo = Image.blend(photo, grain, 0.12).filter(ImageFilter.GaussianBlur(1.2))
+
+    # Flat illustration: large solid shapes with hard edges
+    flat = Image.new("RGB", (w, h), (245, 238, 226))
+    d = ImageDraw.Draw(flat)
+    step = max(1, min(w, h) // 8)
+    for i in range(12):
+        x0 = (i * step * 3) % w
+        y0 = (i * step * 5) % h
+        color = ((i * 53) % 256, (i * 97) % 256, (i * 151) % 256)
+        d.ellipse((x0, y0, x0 + step * 3, y0 + step * 2), fill=color)
+        d.rectangle((w - x0 - step, y0, w - x0, y0 + step * 4), fill=color[::-1])
+
+    # High-detail: full-strength noise (worst case for JPEG)
+    detail = Image.merge(
+        "RGB",
+        [Image.effect_noise((w, h), 64 + 16 * i) for i in range(3)],
+    )
+
+    return {"photo": photo, "flat": flat, "detail": detail}
+
+
+def bench_one(img: Image.Image, profile: dict, repeat: int):
+    times = []
+    data = b""
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        data = encode_jpeg(img, profile)
+        times.append(time.perf_counter() - t0)
+
+    # ZIP entry cost for this profile's compression mode
+    buf = io.BytesIO()
+    t0 = time.perf_counter()
+    with zipfile.ZipFile(buf, "w", zip_compression(profile)) as zf:
+        zf.writestr("x.jpg", data)
+    zip_s = time.perf_counter() - t0
+
+    return statistics.median(times), len(data), zip_s, buf.tell()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("images", nargs="*", help="optional own reference images")
+    ap.add_argument("--size", default="3600x5400", help="WxH to render at (default 12x18in)")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    w, h = (int(v) for v in args.size.lower().split("x"))
+
+    if args.images:
+        refs = {
+            Path(p).stem: Image.open(p).convert("RGB").resize((w, h), Image.LANCZOS)
+            for p in args.images
+        }
+    else:
+        refs = reference_images(w, h)
+
+    print(f"Pillow {Image.__version__}, {w}x{h}, median of {args.repeat}\n")
+    print("| image | profile | encode ms | JPEG MB | zip ms | ZIP MB |")
+    print("|-------|---------|-----------|---------|--------|--------|")
+    for ref_name, img in refs.items():
+        for prof_name, prof in ENCODE_PROFILES.items():
+            enc_s, jpeg_bytes, zip_s, zip_bytes = bench_one(img, prof, args.repeat)
+            print(
+                f"| {ref_name} | {prof_name} | {enc_s * 1000:.0f} | "
+                f"{jpeg_bytes / 1024 / 1024:.2f} | {zip_s * 1000:.0f} | "
+                f"{zip_bytes / 1024 / 1024:.2f} |"
+            )
+
+
+if __name__ == "__main__":
+    main()
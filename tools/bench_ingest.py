@@ -0,0 +1,112 @@
+"""
+Ingest benchmark: open_source() time per input format, full vs preview.
+
+Usage (from repo root):
+    python tools/bench_ingest.py
+    python tools/bench_ingest.py --size 4032x3024 --repeat 5 path/to/IMG_0001.HEIC
+
+Without image arguments, one deterministic photo-like reference is
+written as JPEG, HEIC (no thumbnail), HEIC with an embedded 1280px
+thumbnail (newer iPhones) and AVIF (if Pillow has AVIF support).
+Each is opened at full size and at the free-tier preview cap
+(src.render.PREVIEW_LONG_SIDE). Prints a Markdown table.
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image, ImageFilter, ImageOps
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.ingest import AVIF_SUPPORTED, HEIF_SUPPORTED, open_source  # noqa: E402
+from src.render import PREVIEW_LONG_SIDE  # noqa: E402
+
+EXIF_ORIENTATION = 0x0112
+
+
+def reference_photo(w: int, h: int) -> Image.Image:
+    """Smooth gradients + mild grain (same recipe as bench_encode)."""
+    r = Image.linear_gradient("L").resize((w, h))
+    g = Image.radial_gradient("L").resize((w, h))
+    b = ImageOps.invert(r).rotate(90, expand=False)
+    photo = Image.merge("RGB", (r, g, b))
+    grain = Image.effect_noise((w, h), 18).convert("RGB")
+    return Image.blend(photo, grain, 0.12).filter(ImageFilter.GaussianBlur(1.2))
+
+
+def write_references(img: Image.Image, out_dir: Path) -> dict:
+    """Encode the reference in every supported input format (EXIF rotated 90°)."""
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    refs = {}
+
+    path = out_dir / "ref.jpg"
+    img.save(path, "JPEG", quality=90, exif=exif)
+    refs["JPEG"] = path
+
+    if HEIF_SUPPORTED:
+        # pillow-heif turns the EXIF orientation in info into a HEIF transform
+        heif_src = img.copy()
+        heif_src.info["exif"] = exif.tobytes()
+
+        path = out_dir / "ref.heic"
+        heif_src.save(path, "HEIF", quality=80)
+        refs["HEIC"] = path
+
+        path = out_dir / "ref_thumb.heic"
+        heif_src.save(path, "HEIF", quality=80, thumbnails=[1280])
+        refs["HEIC + 1280 thumb"] = path
+
+    if AVIF_SUPPORTED:
+        path = out_dir / "ref.avif"
+        img.save(path, "AVIF", quality=80, exif=exif)
+        refs["AVIF"] = path
+
+    return refs
+
+
+def bench_open(path: Path, max_side: int | None, repeat: int):
+    times = []
+    im = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        im = open_source(path, max_side)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), im.size
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("images", nargs="*", help="optional own files (any format)")
+    ap.add_argument("--size", default="4032x3024", help="WxH of the generated reference (default iPhone 12MP)")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    w, h = (int(v) for v in args.size.lower().split("x"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            refs = {Path(p).name: Path(p) for p in args.images}
+        else:
+            refs = write_references(reference_photo(w, h), Path(tmp))
+
+        print(f"Pillow {Image.__version__}, HEIF={HEIF_SUPPORTED}, AVIF={AVIF_SUPPORTED}, "
+              f"{w}x{h} (EXIF-rotated), median of {args.repeat}\n")
+        print("| input | file MB | full ms | full size | preview ms | preview size |")
+        print("|-------|---------|---------|-----------|------------|--------------|")
+        for name, path in refs.items():
+            full_s, full_size = bench_open(path, None, args.repeat)
+            prev_s, prev_size = bench_open(path, PREVIEW_LONG_SIDE, args.repeat)
+            print(
+                f"| {name} | {path.stat().st_size / 1024 / 1024:.2f} | "
+                f"{full_s * 1000:.0f} | {full_size[0]}x{full_size[1]} | "
+                f"{prev_s * 1000:.0f} | {prev_size[0]}x{prev_size[1]} |"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Import-time budget for the Gradio app (cold starts).
+
+Usage (from repo root):
+    python tools/check_import_budget.py
+    python tools/check_import_budget.py --budget-ms 6000 --repeat 3
+    IMPORT_BUDGET_MS=4000 python tools/check_import_budget.py
+
+Imports src.webapp (modules + UI build, no server) in a fresh interpreter
+and fails (exit 1) when:
+  - the median wall time exceeds the budget, or
+  - a module that must stay lazy (stripe, requests) was imported at boot.
+
+Prints the slowest top-level imports (python -X importtime) so a
+regression points at its cause.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_BUDGET_MS = 6000
+LAZY_MODULES = ["stripe", "requests"]
+
+_PROBE = """
+import json, sys, time
+from src import startup
+t0 = time.perf_counter()
+import src.webapp
+print(json.dumps({
+    "ms": (time.perf_counter() - t0) * 1000,
+    "steps": startup.breakdown()["steps"],
+    "loaded": sorted(m for m in %r if m in sys.modules),
+}))
+""" % (LAZY_MODULES,)
+
+
+def run_probe(importtime: bool = False) -> tuple[dict, str]:
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    proc = subprocess.run(cmd + ["-c", _PROBE], cwd=ROOT, capture_output=True, text=True, timeout=300)
+    if proc.returncode != 0:
+        sys.exit(f"import failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return result, proc.stderr
+
+
+def slowest_imports(importtime_log: str, top: int) -> list[tuple[int, str]]:
+    """Direct imports of src.webapp (depth 2) by cumulative microseconds."""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is indented by two spaces per level after the separator
+        if name.startswith("   ") and not name.startswith("    "):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--budget-ms", type=float,
+                    default=float(os.getenv("IMPORT_BUDGET_MS", DEFAULT_BUDGET_MS)))
+    ap.add_argument("--repeat", type=int, default=3, help="fresh interpreters to time (median)")
+    ap.add_argument("--top", type=int, default=8, help="slowest imports to list")
+    args = ap.parse_args()
+
+    # First run warms the OS page cache / .pyc files; not counted
+    run_probe()
+    runs = [run_probe()[0] for _ in range(args.repeat)]
+    median_ms = statistics.median(r["ms"] for r in runs)
+
+    print(f"import src.webapp: median {median_ms:.0f} ms over {args.repeat} runs (budget {args.budget_ms:.0f} ms)")
+    for label, seconds in runs[-1]["steps"].items():
+        print(f"  {label:<22}{seconds * 1000:>8.0f} ms")
+
+    _, log = run_probe(importtime=True)
+    print("slowest imports:")
+    for us, name in slowest_imports(log, args.top):
+        print(f"  {name:<30}{us / 1000:>8.0f} ms")
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"import time {median_ms:.0f} ms > budget {args.budget_ms:.0f} ms")
+    loaded = runs[-1]["loaded"]
+    if loaded:
+        failures.append(f"imported at boot, must stay lazy: {', '.join(loaded)}")
+
+    for msg in failures:
+        print(f"FAIL: {msg}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+Render regression gate: print quality and speed against a stored baseline.
+
+Usage (from repo root):
+    python tools/check_render_regressions.py --update            # record baseline
+    python tools/check_render_regressions.py                     # check (exit 1 on regression)
+    python tools/check_render_regressions.py --paths webapp,cli --repeat 3
+    python tools/check_render_regressions.py --update --groups 2x3,ISO --source-size 4000x6000 art.jpg
+
+--update writes a fixed corpus (the bench_encode reference images plus
+any image arguments) and renders it through every path:
+  webapp          Batch ZIP, Pro (src.render_backend.run_render_job)
+  webapp_preview  Batch ZIP, free tier (preview size + watermark)
+  webapp_process  Batch ZIP, Pro, RENDER_BACKEND=process (shared-memory source)
+  cli             src/make_print_sets.py (generate_print_zip)
+  runner          the runner's /render via the remote backend (uvicorn + S3 stand-in)
+It stores per output file: pixel size, DPI, bytes, a thumbnail and a few
+full-resolution patches; per path and image: wall time and ZIP bytes.
+
+A check renders the same corpus with the same settings and fails when, for
+any size:
+  - the pixel size or DPI is not what the render plan says (or the baseline had),
+  - a file is missing or extra,
+  - SSIM (luma) or PSNR (RGB) vs the stored reference drops below the limit,
+  - the JPEG grows by more than --bytes-tolerance,
+or when a path/image set gets slower than --time-tolerance (+ --time-slack-s).
+
+Timings depend on the machine: record the baseline on the box that runs the
+check. The baseline directory (default .render_baseline/) is not committed.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench_encode import reference_images  # noqa: E402
+from src.encode import DEFAULT_ENCODE_PROFILE, ENCODE_PROFILE_NAMES  # noqa: E402
+from src.render import DEFAULT_FIT_MODE, FIT_MODES, GROUP_ORDER, PREVIEW_LONG_SIDE, build_render_plan  # noqa: E402
+from src.render_backend import (  # noqa: E402
+    ProcessPoolBackend,
+    RemoteRunnerBackend,
+    print_set_job,
+    run_render_job,
+)
+
+DEFAULT_BASELINE = ROOT / ".render_baseline"
+PATHS = ["webapp", "webapp_preview", "webapp_process", "cli", "runner"]
+RENDER_WORKERS = min(4, os.cpu_count() or 1)  # same as the webapp / CLI
+
+THUMB_SIDE = 256
+PATCH = 192
+PATCH_CENTERS = [(0.5, 0.5), (0.22, 0.27), (0.78, 0.73)]
+_NAME = re.compile(r"_(\d+)x(\d+)(?:_PREVIEW_\d+x\d+)?\.jpg$")
+_PART = re.compile(r"_part\d+$")
+
+
+# ---------------------------------------------------------
+# Render paths: (source, out_dir) -> None, ZIPs land in out_dir
+# ---------------------------------------------------------
+def _webapp(preview: bool):
+    def run(src: Path, out: Path, settings: dict, _ctx: dict):
+        job = print_set_job(src, settings["groups"], settings["profile"], preview=preview,
+                            watermark=preview, fit=settings["fit"], workers=RENDER_WORKERS)
+        run_render_job(job, out)
+    return run
+
+
+def _webapp_process(src: Path, out: Path, settings: dict, ctx: dict):
+    backend = ctx.setdefault("process", ProcessPoolBackend(RENDER_WORKERS))
+    backend.run(print_set_job(src, settings["groups"], settings["profile"], fit=settings["fit"]), out)
+
+
+def _cli(src: Path, out: Path, settings: dict, _ctx: dict):
+    import src.make_print_sets as cli
+
+    cli.output_dir = out
+    cli.RATIOS = {g: cli.RATIOS[g] for g in settings["groups"]}
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        cli.generate_print_zip(src, cli.get_encode_profile(settings["profile"]), settings["fit"], RENDER_WORKERS)
+
+
+def _runner(src: Path, out: Path, settings: dict, ctx: dict):
+    if "runner" not in ctx:
+        import load_test
+        import s3_standin
+
+        s3_url = load_test.serve(s3_standin.make_server("127.0.0.1", load_test.free_port(), 0.0, 0.0))
+        proc, url = load_test.start_runner(s3_url, cas=False)
+        ctx["runner"] = (proc, RemoteRunnerBackend(url, load_test.RUNNER_TOKEN, timeout=900))
+    job = print_set_job(src, settings["groups"], settings["profile"], fit=settings["fit"])
+    ctx["runner"][1].run(job, out)
+
+
+RUNNERS = {
+    "webapp": _webapp(False),
+    "webapp_preview": _webapp(True),
+    "webapp_process": _webapp_process,
+    "cli": _cli,
+    "runner": _runner,
+}
+
+
+# ---------------------------------------------------------
+# Measuring outputs
+# ---------------------------------------------------------
+def _samples(im: Image.Image) -> dict:
+    """Thumbnail (framing, colour) + native-resolution patches (resampling, JPEG detail)."""
+    thumb = im.copy()
+    thumb.thumbnail((THUMB_SIDE, THUMB_SIDE), Image.BOX)
+    out = {"thumb": np.asarray(thumb)}
+    w, h = im.size
+    pw, ph = min(PATCH, w), min(PATCH, h)
+    for i, (fx, fy) in enumerate(PATCH_CENTERS):
+        left = min(max(round(fx * w - pw / 2), 0), w - pw)
+        top = min(max(round(fy * h - ph / 2), 0), h - ph)
+        out[f"patch{i}"] = np.asarray(im.crop((left, top, left + pw, top + ph)))
+    return out
+
+
+def collect(out_dir: Path) -> tuple[dict, dict, int]:
+    """{key: {w, h, dpi, bytes}}, {key: samples}, total ZIP bytes. key = <zip stem>/<entry>."""
+    files, samples, zip_bytes = {}, {}, 0
+    for zip_path in sorted(out_dir.glob("*.zip")):
+        zip_bytes += zip_path.stat().st_size
+        stem = _PART.sub("", zip_path.stem)
+        with zipfile.ZipFile(zip_path) as zf:
+            for info in zf.infolist():
+                with Image.open(io.BytesIO(zf.read(info))) as im:
+                    dpi = [round(float(v)) for v in im.info.get("dpi", (0, 0))]
+                    rgb = im.convert("RGB")
+                key = f"{stem}/{info.filename}"
+                files[key] = {"w": rgb.width, "h": rgb.height, "dpi": dpi, "bytes": info.file_size}
+                samples[key] = _samples(rgb)
+    return files, samples, zip_bytes
+
+
+def ssim(a: np.ndarray, b: np.ndarray, k: int = 7) -> float:
+    """Mean SSIM of two RGB arrays on luma, k x k uniform window."""
+    def luma(x):
+        x = x.astype(np.float64)
+        return 0.299 * x[..., 0] + 0.587 * x[..., 1] + 0.114 * x[..., 2]
+
+    def box(x):
+        c = np.pad(x, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+        return (c[k:, k:] - c[:-k, k:] - c[k:, :-k] + c[:-k, :-k]) / (k * k)
+
+    x, y = luma(a), luma(b)
+    if min(x.shape) < k:
+        return 1.0 if np.array_equal(a, b) else 0.0
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mx, my = box(x), box(y)
+    vx, vy, cxy = box(x * x) - mx * mx, box(y * y) - my * my, box(x * y) - mx * my
+    s = ((2 * mx * my + c1) * (2 * cxy + c2)) / ((mx * mx + my * my + c1) * (vx + vy + c2))
+    return float(s.mean())
+
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = float(np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2))
+    return 99.0 if mse == 0 else min(99.0, 10 * np.log10(255 ** 2 / mse))
+
+
+def expected_sizes(path: str, settings: dict) -> dict:
+    """(w, h) print size -> (out_w, out_h, dpi) from the render plan."""
+    preview = PREVIEW_LONG_SIDE if path == "webapp_preview" else None
+    return {
+        (item["w"], item["h"]): (item["out_w"], item["out_h"], [round(float(d)) for d in item["dpi"]])
+        for item in build_render_plan(settings["groups"], preview)
+    }
+
+
+# ---------------------------------------------------------
+# Run + compare
+# ---------------------------------------------------------
+def render(path: str, src: Path, settings: dict, repeat: int, ctx: dict) -> dict:
+    times = []
+    for _ in range(repeat):
+        out = Path(tempfile.mkdtemp(prefix=f"regress_{path}_"))
+        try:
+            t0 = time.perf_counter()
+            RUNNERS[path](src, out, settings, ctx)
+            times.append(time.perf_counter() - t0)
+            # Every run's outputs are identical; measure the last one
+            if len(times) == repeat:
+                files, samples, zip_bytes = collect(out)
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+    return {"seconds": round(statistics.median(times), 3), "zip_bytes": zip_bytes,
+            "files": files, "samples": samples}
+
+
+def compare(path: str, image: str, now: dict, base: dict, refs, settings: dict, limits) -> list[dict]:
+    """One row per failed check: {path, image, output, check, baseline, now, limit}."""
+    fails = []
+
+    def fail(output, check, baseline, value, limit=""):
+        fails.append({"path": path, "image": image, "output": output, "check": check,
+                      "baseline": baseline, "now": value, "limit": limit})
+
+    expected = expected_sizes(path, settings)
+    seen = set()
+    for key, f in sorted(now["files"].items()):
+        m = _NAME.search(key)
+        plan = expected.get((int(m[1]), int(m[2]))) if m else None
+        if plan is None:
+            fail(key, "unexpected file", "-", "present")
+            continue
+        seen.add((int(m[1]), int(m[2])))
+        if (f["w"], f["h"]) != plan[:2]:
+            fail(key, "pixel size", f"{plan[0]}x{plan[1]} (plan)", f"{f['w']}x{f['h']}")
+        if f["dpi"] != plan[2]:
+            fail(key, "dpi", f"{plan[2]} (plan)", f["dpi"])
+
+        b = base["files"].get(key)
+        if b is None:
+            fail(key, "not in baseline", "-", "present")
+            continue
+        if (f["w"], f["h"]) != (b["w"], b["h"]):
+            fail(key, "pixel size", f"{b['w']}x{b['h']}", f"{f['w']}x{f['h']}")
+        if f["bytes"] > b["bytes"] * (1 + limits.bytes_tolerance):
+            fail(key, "bytes", b["bytes"], f["bytes"], f"+{limits.bytes_tolerance:.0%}")
+
+        # Worst sample per output (thumbnail or patch)
+        scores = []
+        for name, sample in now["samples"][key].items():
+            ref = refs.get(f"{key}|{name}")
+            if ref is None or ref.shape != sample.shape:
+                fail(key, f"{name} shape", getattr(ref, "shape", "-"), sample.shape)
+                continue
+            scores.append((ssim(sample, ref), psnr(sample, ref), name))
+        if scores:
+            s, _, name = min(scores)
+            if s < limits.min_ssim:
+                fail(key, f"ssim ({name})", "ref", f"{s:.4f}", f">= {limits.min_ssim}")
+            _, p, name = min(scores, key=lambda t: t[1])
+            if p < limits.min_psnr:
+                fail(key, f"psnr ({name})", "ref", f"{p:.1f} dB", f">= {limits.min_psnr} dB")
+
+    for size in sorted(set(expected) - seen):
+        fail(f"{size[0]}x{size[1]}", "missing file", "present", "-")
+    for key in sorted(set(base["files"]) - set(now["files"])):
+        fail(key, "missing file", "present", "-")
+
+    budget = base["seconds"] * (1 + limits.time_tolerance) + limits.time_slack_s
+    if now["seconds"] > budget:
+        fail("(whole set)", "seconds", base["seconds"], now["seconds"], f"<= {budget:.2f}")
+    if now["zip_bytes"] > base["zip_bytes"] * (1 + limits.bytes_tolerance):
+        fail("(whole set)", "zip bytes", base["zip_bytes"], now["zip_bytes"], f"+{limits.bytes_tolerance:.0%}")
+    return fails
+
+
+def write_corpus(corpus: Path, images: list[str], size: str):
+    corpus.mkdir(parents=True)
+    w, h = (int(v) for v in size.lower().split("x"))
+    for name, img in reference_images(w, h).items():
+        img.save(corpus / f"{name}.jpg", "JPEG", quality=95)
+    for p in images:
+        Image.open(p).convert("RGB").save(corpus / f"{Path(p).stem}.jpg", "JPEG", quality=95)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("images", nargs="*", help="extra corpus images (with --update)")
+    ap.add_argument("--update", action="store_true", help="record a new baseline (replaces the old one)")
+    ap.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    ap.add_argument("--paths", help=f"comma-separated subset of {','.join(PATHS)} "
+                                    "(default: all for --update, the recorded ones for a check)")
+    ap.add_argument("--repeat", type=int, default=1, help="renders per path/image (median time)")
+    # Recorded with --update, reused by every check
+    ap.add_argument("--groups", default=",".join(GROUP_ORDER))
+    ap.add_argument("--profile", choices=ENCODE_PROFILE_NAMES, default=DEFAULT_ENCODE_PROFILE)
+    ap.add_argument("--fit", choices=FIT_MODES, default=DEFAULT_FIT_MODE)
+    ap.add_argument("--source-size", default="2400x3600", help="WxH of the generated corpus images")
+    # Limits
+    ap.add_argument("--min-ssim", type=float, default=0.98)
+    ap.add_argument("--min-psnr", type=float, default=38.0)
+    ap.add_argument("--bytes-tolerance", type=float, default=0.05, help="allowed JPEG/ZIP growth")
+    ap.add_argument("--time-tolerance", type=float, default=0.25, help="allowed slowdown per set")
+    ap.add_argument("--time-slack-s", type=float, default=0.5, help="absolute slack on top (timer noise)")
+    args = ap.parse_args()
+
+    baseline_json = args.baseline / "baseline.json"
+    corpus = args.baseline / "corpus"
+    if args.update:
+        shutil.rmtree(args.baseline, ignore_errors=True)
+        write_corpus(corpus, args.images, args.source_size)
+        settings = {"groups": [g.strip() for g in args.groups.split(",") if g.strip()],
+                    "profile": args.profile, "fit": args.fit}
+        baseline = {"settings": settings, "results": {}}
+    else:
+        if not baseline_json.exists():
+            sys.exit(f"no baseline at {args.baseline} (record one with --update)")
+        baseline = json.loads(baseline_json.read_text(encoding="utf-8"))
+        settings = baseline["settings"]
+        env = baseline.get("env", {})
+        if env.get("cpus") != os.cpu_count() or env.get("pillow") != Image.__version__:
+            print(f"note: baseline recorded with {env.get('cpus')} CPU(s), Pillow {env.get('pillow')}; "
+                  f"now {os.cpu_count()}, Pillow {Image.__version__}\n")
+
+    if args.paths:
+        paths = [p.strip() for p in args.paths.split(",") if p.strip()]
+    elif args.update:
+        paths = PATHS
+    else:
+        paths = [p for p in PATHS if any(label.startswith(f"{p}/") for label in baseline["results"])]
+    unknown = sorted(set(paths) - set(PATHS))
+    if unknown:
+        sys.exit(f"unknown path(s): {', '.join(unknown)} (use {', '.join(PATHS)})")
+
+    sources = sorted(corpus.glob("*.jpg"))
+    print(f"{len(sources)} image(s) x {', '.join(paths)}; groups={','.join(settings['groups'])}, "
+          f"profile={settings['profile']}, fit={settings['fit']}, {os.cpu_count()} CPU(s)\n")
+
+    ctx, fails, timing = {}, [], []
+    try:
+        for path in paths:
+            for src in sources:
+                label = f"{path}/{src.stem}"
+                now = render(path, src, settings, args.repeat, ctx)
+                if args.update:
+                    np.savez_compressed(args.baseline / f"{path}__{src.stem}.npz", **{
+                        f"{key}|{name}": arr for key, s in now["samples"].items() for name, arr in s.items()
+                    })
+                    baseline["results"][label] = {k: now[k] for k in ("seconds", "zip_bytes", "files")}
+                    print(f"recorded {label}: {len(now['files'])} files, {now['seconds']:.2f}s")
+                    continue
+                base = baseline["results"].get(label)
+                if base is None:
+                    fails.append({"path": path, "image": src.stem, "output": "(whole set)",
+                                  "check": "not in baseline", "baseline": "-", "now": "-", "limit": ""})
+                    continue
+                with np.load(args.baseline / f"{path}__{src.stem}.npz") as refs:
+                    found = compare(path, src.stem, now, base, dict(refs), settings, args)
+                fails += found
+                timing.append((label, base["seconds"], now["seconds"], base["zip_bytes"], now["zip_bytes"]))
+                print(f"{'ok  ' if not found else 'FAIL'} {label}: {len(now['files'])} files, "
+                      f"{now['seconds']:.2f}s (baseline {base['seconds']:.2f}s)")
+    finally:
+        if "runner" in ctx:
+            ctx["runner"][0].terminate()
+            ctx["runner"][0].wait()
+
+    if args.update:
+        baseline["env"] = {"cpus": os.cpu_count(), "pillow": Image.__version__,
+                           "python": platform.python_version(), "recorded_at": time.strftime("%Y-%m-%d %H:%M")}
+        baseline_json.write_text(json.dumps(baseline, indent=2), encoding="utf-8")
+        print(f"\nbaseline written to {args.baseline}")
+        return
+
+    print("\n| set | baseline s | now s | change | baseline MB | now MB |")
+    print("|-----|------------|-------|--------|-------------|--------|")
+    for label, b_s, n_s, b_bytes, n_bytes in timing:
+        print(f"| {label} | {b_s:.2f} | {n_s:.2f} | {(n_s / b_s - 1) * 100:+.0f}% | "
+              f"{b_bytes / 1024 / 1024:.2f} | {n_bytes / 1024 / 1024:.2f} |")
+
+    if not fails:
+        print("\nOK: no quality, size or speed regressions")
+        return
+    print(f"\n{len(fails)} regression(s):\n")
+    print("| path | image | output | check | baseline | now | limit |")
+    print("|------|-------|--------|-------|----------|-----|-------|")
+    for f in fails:
+        print(f"| {f['path']} | {f['image']} | {f['output']} | {f['check']} | {f['baseline']} | {f['now']} | {f['limit']} |")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+"""
+End-to-end load harness (one box, no network).
+
+Usage (from repo root):
+    python tools/load_test.py
+    python tools/load_test.py --concurrency 20 --requests 40 --scenarios generate_zip,runner
+    python tools/load_test.py --backend remote --tier free --json load.json
+
+Starts local stand-ins and drives the real code paths against them:
+
+  image host   serves one generated JPEG under many URLs (/src/<n>.jpg,
+               distinct bytes per n so content-addressed caches miss)
+  S3 store     tools/s3_standin.py (in memory)
+  runner       services/runner/main.py under uvicorn (subprocess), with
+               R2_ENDPOINT_URL pointing at the S3 stand-in
+  worker       /enqueue + /status + /progress (+ /download), calling the
+               runner's /generate like the Cloudflare worker does
+
+Scenarios (each runs --requests calls at --concurrency):
+
+  generate_zip    Batch ZIP handler (src.webapp.generate_zip)
+  single_export   Single Export handler, --single-sizes sizes as one ZIP
+  generate_async  async pipeline: webapp -> worker -> runner -> S3
+  runner          POST /generate on the runner directly (print set)
+
+Reports p50/p95/p99 latency, throughput, error rate and peak RSS
+(VmHWM) of every process: the harness (Gradio handlers + stand-ins),
+the runner and any other child (render pool workers). Linux only (/proc).
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "tools"))
+
+import s3_standin  # noqa: E402
+from bench_ingest import reference_photo  # noqa: E402
+
+SCENARIOS = ["generate_zip", "single_export", "generate_async", "runner"]
+BUCKET = "snaptosize"
+RUNNER_TOKEN = "load-test"
+TIER_SECRET = "load-test"  # signs pro jobs (src/tier_grant.py) for the worker stand-in and the runner
+
+
+# ---------------------------------------------------------
+# Stand-ins
+# ---------------------------------------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(server: ThreadingHTTPServer) -> str:
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def with_comment(jpeg: bytes, text: str) -> bytes:
+    """Same pixels, different bytes: a COM segment right after SOI."""
+    payload = text.encode("ascii")
+    segment = b"\xff\xfe" + (len(payload) + 2).to_bytes(2, "big") + payload
+    return jpeg[:2] + segment + jpeg[2:]
+
+
+class _Quiet(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes = b"", content_type: str = "application/json", head_only=False):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and not head_only:
+            self.wfile.write(body)
+
+
+class ImageHost(_Quiet):
+    """GET/HEAD /src/<n>.jpg -> the reference JPEG tagged with n."""
+
+    def _image(self, head_only: bool):
+        name = self.path.rsplit("/", 1)[-1].split("?")[0]
+        if not name.endswith(".jpg"):
+            return self._reply(404, b"not found", "text/plain", head_only)
+        body = with_comment(self.server.jpeg, name) if self.server.unique else self.server.jpeg
+        self._reply(200, body, "image/jpeg", head_only)
+
+    def do_GET(self):
+        self._image(False)
+
+    def do_HEAD(self):
+        self._image(True)
+
+
+class WorkerStandIn(_Quiet):
+    """The Cloudflare worker's /enqueue, /status/<id>, /progress/<id>, /download/<id> (KV in a dict)."""
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.startswith("/progress/"):
+            return self._progress(self.path.split("/")[2], json.loads(raw))
+        if self.path != "/enqueue":
+            return self._reply(404, b"Not found", "text/plain")
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            payload = {}
+        from src.tier_grant import verify_tier_grant
+
+        # Like the worker: the tier comes from the signed grant, not the body
+        pro = verify_tier_grant(payload.get("tier_grant"), payload.get("image_url"), TIER_SECRET)
+        payload["tier"] = "pro" if pro else "free"
+        if not pro:
+            payload.pop("tier_grant", None)
+        job_id = str(uuid.uuid4())
+        payload["progress_url"] = f"http://127.0.0.1:{self.server.server_address[1]}/progress/{job_id}"
+        job = {"job_id": job_id, "created_at": int(time.time() * 1000), "payload": payload}
+        self.server.jobs[job["job_id"]] = {"status": "queued", "job_id": job["job_id"]}
+        threading.Thread(target=self.server.process_job, args=(job,), daemon=True).start()
+        self._reply(200, json.dumps({"ok": True, "job_id": job["job_id"]}).encode())
+
+    def _progress(self, job_id: str, event: dict):
+        state = self.server.jobs.get(job_id)
+        if state is None:
+            return self._reply(404, b"Not found", "text/plain")
+        if state["status"] == "running":
+            state["progress"] = {k: event.get(k) for k in ("stage", "name", "done", "total", "elapsed_s")}
+            if event.get("stage") == "artifact":
+                parts = state.setdefault("partial_archives", [])
+                parts.extend([None] * (event["index"] + 1 - len(parts)))
+                parts[event["index"]] = {"name": event["name"], "r2_key": event["r2_key"]}
+                base = f"http://127.0.0.1:{self.server.server_address[1]}/download/{job_id}?token=load"
+                state["download_urls"] = [f"{base}&part={i}" for i in range(len(parts))]
+            self.server.progress_events += 1
+        self._reply(200, b'{"ok":true}')
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        state = self.server.jobs.get(parts[1]) if len(parts) == 2 else None
+        if state is None:
+            return self._reply(404, b"Not found", "text/plain")
+        if parts[0] == "status":
+            return self._reply(200, json.dumps(state).encode())
+        if parts[0] == "download" and state.get("r2_key"):
+            obj = s3_standin.OBJECTS.get((BUCKET, state["r2_key"]))
+            if obj:
+                return self._reply(200, obj["data"], "application/zip")
+        self._reply(404, b"Not found", "text/plain")
+
+
+def make_worker(runner_url: str) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", free_port()), WorkerStandIn)
+    server.jobs = {}
+    server.progress_events = 0
+
+    def process_job(job):
+        job_id = job["job_id"]
+        server.jobs[job_id] = {"status": "running", "job_id": job_id}
+        try:
+            result = post_json(f"{runner_url}/generate", job, timeout=600)
+        except Exception as e:
+            server.jobs[job_id] = {"status": "error", "job_id": job_id, "error": str(e)}
+            return
+        archives = result.get("archives") or []
+        keys = [a["r2_key"] for a in archives if a.get("r2_key")] or [k for k in [result.get("r2_key")] if k]
+        origin = f"http://127.0.0.1:{server.server_address[1]}"
+        url = f"{origin}/download/{job_id}?token=load" if keys else None
+        server.jobs[job_id] = {
+            "status": "done",
+            "job_id": job_id,
+            "result": result,
+            "r2_key": keys[0] if keys else None,
+            "r2_keys": keys,
+            "download_url": url,
+            "download_urls": [f"{url}&part={i}" for i in range(len(keys))],
+        }
+
+    server.process_job = process_job
+    return server
+
+
+def post_json(url: str, data: dict, timeout: float = 300) -> dict:
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(data).encode(),
+        headers={"Content-Type": "application/json", "Authorization": f"Bearer {RUNNER_TOKEN}"},
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        return json.loads(r.read())
+
+
+def start_runner(s3_url: str, cas: bool, extra_env: dict | None = None) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = dict(
+        os.environ,
+        RUNNER_TOKEN=RUNNER_TOKEN,
+        TIER_SECRET=TIER_SECRET,
+        R2_ENDPOINT_URL=s3_url,
+        R2_BUCKET=BUCKET,
+        R2_ACCESS_KEY_ID="load",
+        R2_SECRET_ACCESS_KEY="load",
+        CAS_DEDUPE="1" if cas else "0",
+        **(extra_env or {}),
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT / "services" / "runner",
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"runner exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(f"{url}/health", timeout=1).read()
+            return proc, url
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    sys.exit("runner did not become healthy in 60s")
+
+
+# ---------------------------------------------------------
+# Process memory (/proc)
+# ---------------------------------------------------------
+def peak_rss_mb(pid: int) -> float | None:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def child_pids(pid: int) -> list[int]:
+    pids = []
+    for task in Path(f"/proc/{pid}/task").glob("*/children"):
+        try:
+            pids += [int(p) for p in task.read_text().split()]
+        except OSError:
+            pass
+    return pids
+
+
+def memory_snapshot(runner_pid: int) -> dict:
+    snap = {"harness": peak_rss_mb(os.getpid()), "runner": peak_rss_mb(runner_pid)}
+    for pid in child_pids(os.getpid()):
+        if pid != runner_pid:
+            snap[f"child:{pid}"] = peak_rss_mb(pid)
+    return {k: round(v, 1) for k, v in snap.items() if v is not None}
+
+
+# ---------------------------------------------------------
+# Load
+# ---------------------------------------------------------
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def run_scenario(name: str, call, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+
+    def one(i):
+        t0 = time.perf_counter()
+        try:
+            call(i)
+        except Exception as e:
+            key = f"{type(e).__name__}: {str(e)[:120]}"
+            with lock:
+                errors[key] = errors.get(key, 0) + 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - t0
+
+    stats = {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "error_rate": round(sum(errors.values()) / requests, 3),
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "errors": errors,
+    }
+    if latencies:
+        stats.update(
+            p50_s=round(percentile(latencies, 50), 3),
+            p95_s=round(percentile(latencies, 95), 3),
+            p99_s=round(percentile(latencies, 99), 3),
+            mean_s=round(statistics.fmean(latencies), 3),
+        )
+    return stats
+
+
+def build_calls(args, webapp, sources: list[Path], image_url, runner_url: str) -> dict:
+    from src.tier_grant import sign_tier_grant
+
+    is_pro = args.tier == "pro"
+    groups = args.groups.split(",")
+    free_used_at = ""
+
+    def session(i):
+        # Unique session per call: free-tier cooldowns are per client
+        return SimpleNamespace(session_hash=f"load-{uuid.uuid4().hex}", headers={}, client=None)
+
+    def source(i):
+        return str(sources[i % len(sources)])
+
+    def call_generate_zip(i):
+        files, _ = webapp.generate_zip(source(i), groups, is_pro, free_used_at,
+                                       args.profile, args.fit, request=session(i))
+        assert files, "no ZIPs returned"
+
+    choices = webapp.build_single_choices(groups[0], "Portrait")[: args.single_sizes]
+
+    def call_single_export(i):
+        files = webapp.single_export(source(i), choices, True, args.profile, "One ZIP",
+                                     args.fit, request=session(i))
+        assert files, "no files returned"
+
+    def call_generate_async(i):
+        *_, md = webapp.generate_async(image_url(i), [], groups, is_pro)
+        assert "status:** done" in md, md[:200]
+
+    def call_runner(i):
+        job = {"job_id": f"load-{uuid.uuid4().hex[:12]}",
+               "payload": {"image_url": image_url(i), "print_groups": groups,
+                           "tier": args.tier, "encode_profile": args.profile}}
+        if is_pro:
+            job["payload"]["tier_grant"] = sign_tier_grant(image_url(i), TIER_SECRET)
+        out = post_json(f"{runner_url}/generate", job, timeout=600)
+        assert out.get("archives"), str(out)[:200]
+
+    return {
+        "generate_zip": call_generate_zip,
+        "single_export": call_single_export,
+        "generate_async": call_generate_async,
+        "runner": call_runner,
+    }
+
+
+def print_report(results: list[dict], memory: dict):
+    print("\n| scenario | n | conc | ok | err % | p50 s | p95 s | p99 s | req/s | peak RSS MB (harness / runner) |")
+    print("|----------|---|------|----|-------|-------|-------|-------|-------|--------------------------------|")
+    for r in results:
+        mem = r["memory"]
+        print(
+            f"| {r['scenario']} | {r['requests']} | {r['concurrency']} | {r['ok']} | "
+            f"{r['error_rate'] * 100:.0f} | {r.get('p50_s', '-')} | {r.get('p95_s', '-')} | "
+            f"{r.get('p99_s', '-')} | {r['throughput_rps']} | "
+            f"{mem.get('harness')} / {mem.get('runner')} |"
+        )
+    for r in results:
+        for msg, count in r["errors"].items():
+            print(f"  {r['scenario']}: {count}x {msg}")
+
+    print("\npeak RSS per process (MB):")
+    for name, mb in memory.items():
+        print(f"  {name:<16}{mb:>8.1f}")
+    print(f"s3 stand-in: {s3_standin.STATS['requests']} requests, "
+          f"{s3_standin.STATS['bytes_in'] / 1024 / 1024:.1f} MB in")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset")
+    ap.add_argument("--requests", type=int, default=8, help="calls per scenario")
+    ap.add_argument("--concurrency", type=int, default=4, help="concurrent callers (sellers)")
+    ap.add_argument("--size", default="3000x4000", help="WxH of the generated source")
+    ap.add_argument("--groups", default="2x3", help="comma-separated print groups")
+    ap.add_argument("--single-sizes", type=int, default=3, help="sizes per Single Export call")
+    ap.add_argument("--tier", choices=["pro", "free"], default="pro")
+    ap.add_argument("--profile", default="balanced", help="encode profile")
+    ap.add_argument("--fit", default="stretch", help="fit mode")
+    ap.add_argument("--backend", choices=["inprocess", "process", "remote"], default="inprocess",
+                    help="RENDER_BACKEND for the Gradio handlers (remote = the local runner)")
+    ap.add_argument("--same-source", action="store_true",
+                    help="one source for every call (exercises source/CAS caches)")
+    ap.add_argument("--cas", action="store_true", help="enable runner CAS dedupe (CAS_DEDUPE=1)")
+    ap.add_argument("--s3-latency-ms", type=float, default=0.0)
+    ap.add_argument("--s3-fail-rate", type=float, default=0.0)
+    ap.add_argument("--json", help="also write the results to this file")
+    args = ap.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # -- stand-ins --
+    w, h = (int(v) for v in args.size.lower().split("x"))
+    buf = BytesIO()
+    reference_photo(w, h).save(buf, "JPEG", quality=90)
+    jpeg = buf.getvalue()
+
+    s3_url = serve(s3_standin.make_server("127.0.0.1", free_port(), args.s3_fail_rate, args.s3_latency_ms))
+    image_server = ThreadingHTTPServer(("127.0.0.1", free_port()), ImageHost)
+    image_server.jpeg = jpeg
+    image_server.unique = not args.same_source
+    image_base = serve(image_server)
+    runner, runner_url = start_runner(s3_url, args.cas)
+    worker = make_worker(runner_url)
+    worker_url = serve(worker)
+
+    # Gradio handlers read these at import
+    os.environ["WORKER_BASE"] = worker_url
+    os.environ["RENDER_BACKEND"] = args.backend
+    os.environ["RENDER_RUNNER_URL"] = runner_url
+    os.environ["RENDER_RUNNER_TOKEN"] = RUNNER_TOKEN
+    os.environ["TIER_SECRET"] = TIER_SECRET
+    from src import webapp
+
+    tmp = Path(tempfile.mkdtemp(prefix="snaptosize_load_"))
+    count = 1 if args.same_source else args.requests
+    sources = []
+    for n in range(count):
+        path = tmp / f"src_{n}.jpg"
+        path.write_bytes(with_comment(jpeg, f"{n}.jpg") if count > 1 else jpeg)
+        sources.append(path)
+
+    def image_url(i):
+        return f"{image_base}/src/{0 if args.same_source else i}.jpg"
+
+    print(f"source {w}x{h} ({len(jpeg) / 1024 / 1024:.1f} MB), groups={args.groups}, tier={args.tier}, "
+          f"backend={args.backend}, {os.cpu_count()} CPU(s)")
+    print(f"runner {runner_url}  worker {worker_url}  s3 {s3_url}  images {image_base}")
+
+    calls = build_calls(args, webapp, sources, image_url, runner_url)
+    results = []
+    try:
+        for name in scenarios:
+            print(f"\n== {name}: {args.requests} calls at concurrency {args.concurrency}", flush=True)
+            stats = run_scenario(name, calls[name], args.requests, args.concurrency)
+            stats["memory"] = memory_snapshot(runner.pid)
+            results.append(stats)
+            print(json.dumps({k: v for k, v in stats.items() if k != "errors"}), flush=True)
+        memory = memory_snapshot(runner.pid)
+    finally:
+        runner.terminate()
+        runner.wait(timeout=10)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print_report(results, memory)
+    print(f"worker stand-in: {len(worker.jobs)} jobs, {worker.progress_events} progress events")
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "results": results, "memory": memory}, indent=2))
+    if any(r["error_rate"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
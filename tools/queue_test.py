@@ -0,0 +1,196 @@
+"""
+Pull-queue scaling harness (one box, no network).
+
+Usage (from repo root):
+    python tools/queue_test.py
+    python tools/queue_test.py --runners 1,2,4 --jobs 24 --s3-latency-ms 300
+    python tools/queue_test.py --runners 3 --kill-after 2 --lease-s 6
+
+For every runner count N: a fresh SQLite queue, one runner hosting it
+(QUEUE_DB) and N-1 runners pulling from that one (QUEUE_URL), all under
+uvicorn against the S3 stand-in and image host from tools/load_test.py.
+The whole burst of --jobs is enqueued at once through POST /queue/jobs;
+the harness then polls GET /queue until every job is finished.
+
+Reports wall time, jobs/s (and speedup over the first N), enqueue ->
+finish latency p50/p95, peak queue depth and how the jobs spread over
+the runners. On a single box the runners share its CPUs, so scaling
+shows for I/O-bound jobs (--s3-latency-ms) or with as many cores as
+runners.
+
+--kill-after S SIGKILLs the last runner S seconds into the burst: its
+leases expire after --lease-s and other runners finish those jobs
+(counted under "retried").
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from http.server import ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import s3_standin  # noqa: E402
+from bench_ingest import reference_photo  # noqa: E402
+from load_test import (  # noqa: E402
+    RUNNER_TOKEN,
+    TIER_SECRET,
+    ImageHost,
+    free_port,
+    percentile,
+    post_json,
+    serve,
+    start_runner,
+)
+from src.tier_grant import sign_tier_grant  # noqa: E402
+
+
+def get_json(url: str) -> dict:
+    req = urllib.request.Request(url, headers={"Authorization": f"Bearer {RUNNER_TOKEN}"})
+    with urllib.request.urlopen(req, timeout=30) as r:
+        return json.loads(r.read())
+
+
+def job_spec(args, image_url: str) -> dict:
+    payload = {"image_url": image_url, "encode_profile": args.profile}
+    if args.groups:
+        payload.update(print_groups=args.groups.split(","), tier=args.tier)
+        if args.tier == "pro":
+            payload["tier_grant"] = sign_tier_grant(image_url, TIER_SECRET)
+    else:
+        payload["presets"] = args.presets.split(",")
+    return {"job_id": f"queue-{uuid.uuid4().hex[:12]}", "payload": payload}
+
+
+def run_burst(args, runners: int, s3_url: str, image_base: str, tmp: Path) -> dict:
+    queue_env = {"LEASE_S": str(args.lease_s), "QUEUE_POLL_S": "0.2", "QUEUE_RETRY_BASE_S": "1"}
+    db = tmp / f"queue_{runners}.db"
+    procs = []
+    try:
+        host, host_url = start_runner(s3_url, False, dict(queue_env, QUEUE_DB=str(db), RUNNER_ID="runner0"))
+        procs.append(host)
+        for i in range(1, runners):
+            proc, _ = start_runner(s3_url, False, dict(queue_env, QUEUE_URL=host_url, RUNNER_ID=f"runner{i}"))
+            procs.append(proc)
+
+        t0 = time.perf_counter()
+        job_ids = [
+            post_json(f"{host_url}/queue/jobs", {"job": job_spec(args, f"{image_base}/src/{i}.jpg")})["job_id"]
+            for i in range(args.jobs)
+        ]
+        peak_depth = 0
+        killed = None
+        deadline = time.time() + args.timeout
+        while True:
+            stats = get_json(f"{host_url}/queue")
+            peak_depth = max(peak_depth, stats["queued"])
+            if stats["done"] + stats["failed"] + stats["cancelled"] >= args.jobs:
+                break
+            if args.kill_after and killed is None and runners > 1 and time.perf_counter() - t0 >= args.kill_after:
+                killed = procs[-1]
+                os.kill(killed.pid, signal.SIGKILL)
+                print(f"  killed runner{runners - 1} at {time.perf_counter() - t0:.1f}s", flush=True)
+            if time.time() > deadline:
+                sys.exit(f"burst did not finish in {args.timeout}s: {stats}")
+            time.sleep(0.2)
+        wall = time.perf_counter() - t0
+
+        jobs = [get_json(f"{host_url}/queue/jobs/{job_id}") for job_id in job_ids]
+    finally:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=30)
+
+    latencies = [j["updated_at"] - j["created_at"] for j in jobs if j["status"] == "done"]
+    per_runner = {}
+    for j in jobs:
+        if j["status"] == "done":
+            per_runner[j["runner_id"]] = per_runner.get(j["runner_id"], 0) + 1
+    out = {
+        "runners": runners,
+        "jobs": args.jobs,
+        "done": len(latencies),
+        "failed": sum(j["status"] != "done" for j in jobs),
+        "retried": sum(j["attempts"] > 1 for j in jobs),
+        "wall_s": round(wall, 2),
+        "jobs_per_s": round(len(latencies) / wall, 3),
+        "peak_queued": peak_depth,
+        "per_runner": dict(sorted(per_runner.items())),
+        "errors": sorted({j["error"] for j in jobs if j["status"] != "done" and j["error"]}),
+    }
+    if latencies:
+        out.update(p50_s=round(percentile(latencies, 50), 2), p95_s=round(percentile(latencies, 95), 2),
+                   mean_s=round(statistics.fmean(latencies), 2))
+    return out
+
+
+def print_report(results: list[dict]):
+    base = results[0]["jobs_per_s"] or None
+    print("\n| runners | jobs | done | failed | retried | wall s | jobs/s | speedup | p50 s | p95 s | peak queued | per runner |")
+    print("|---------|------|------|--------|---------|--------|--------|---------|-------|-------|-------------|------------|")
+    for r in results:
+        speedup = f"{r['jobs_per_s'] / base:.2f}x" if base else "-"
+        spread = " ".join(f"{k}:{v}" for k, v in r["per_runner"].items())
+        print(f"| {r['runners']} | {r['jobs']} | {r['done']} | {r['failed']} | {r['retried']} | {r['wall_s']} | "
+              f"{r['jobs_per_s']} | {speedup} | {r.get('p50_s', '-')} | {r.get('p95_s', '-')} | "
+              f"{r['peak_queued']} | {spread} |")
+    for r in results:
+        for msg in r["errors"]:
+            print(f"  {r['runners']} runner(s): {msg}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runners", default="1,2", help="comma-separated runner counts to compare")
+    ap.add_argument("--jobs", type=int, default=12, help="jobs per burst")
+    ap.add_argument("--size", default="1200x1600", help="WxH of the generated source")
+    ap.add_argument("--presets", default="thumb_1024", help="presets per job (when --groups is empty)")
+    ap.add_argument("--groups", default="", help="comma-separated print groups (print-set jobs)")
+    ap.add_argument("--tier", choices=["pro", "free"], default="pro")
+    ap.add_argument("--profile", default="balanced", help="encode profile")
+    ap.add_argument("--s3-latency-ms", type=float, default=500.0, help="per S3 request (makes jobs I/O-bound)")
+    ap.add_argument("--lease-s", type=float, default=10.0, help="runner LEASE_S")
+    ap.add_argument("--kill-after", type=float, default=0.0, help="SIGKILL the last runner after S seconds")
+    ap.add_argument("--timeout", type=float, default=600.0, help="max seconds per burst")
+    ap.add_argument("--json", help="also write the results to this file")
+    args = ap.parse_args()
+
+    w, h = (int(v) for v in args.size.lower().split("x"))
+    buf = BytesIO()
+    reference_photo(w, h).save(buf, "JPEG", quality=90)
+
+    s3_url = serve(s3_standin.make_server("127.0.0.1", free_port(), 0.0, args.s3_latency_ms))
+    image_server = ThreadingHTTPServer(("127.0.0.1", free_port()), ImageHost)
+    image_server.jpeg = buf.getvalue()
+    image_server.unique = True
+    image_base = serve(image_server)
+    print(f"source {w}x{h}, {args.jobs} jobs per burst, s3 latency {args.s3_latency_ms:.0f}ms, "
+          f"{os.cpu_count()} CPU(s)")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="snaptosize_queue_") as tmp:
+        for runners in (int(n) for n in args.runners.split(",")):
+            print(f"\n== {runners} runner(s)", flush=True)
+            stats = run_burst(args, runners, s3_url, image_base, Path(tmp))
+            results.append(stats)
+            print(json.dumps({k: v for k, v in stats.items() if k != "errors"}), flush=True)
+
+    print_report(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "results": results}, indent=2))
+    if any(r["failed"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Minimal S3-compatible stand-in for R2 (local testing only).
+
+Usage (from repo root):
+    python tools/s3_standin.py --port 9000
+    python tools/s3_standin.py --port 9000 --fail-rate 0.2 --latency-ms 30
+
+Point the runner at it:
+    R2_ENDPOINT_URL=http://127.0.0.1:9000 R2_BUCKET=snaptosize \
+    R2_ACCESS_KEY_ID=x R2_SECRET_ACCESS_KEY=x uvicorn main:app
+
+Path-style only (http://host/<bucket>/<key>). Supports PUT/GET/HEAD/DELETE
+object, CopyObject, and multipart upload (create, upload part, complete,
+abort). aws-chunked request bodies (botocore streaming checksums) are
+decoded. Signatures are not checked. Objects live in memory.
+
+--fail-rate answers that share of PUT/part requests with 500 InternalError,
+--latency-ms delays every request (exercise retries and concurrency).
+"""
+import argparse
+import hashlib
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+_lock = threading.RLock()
+OBJECTS = {}    # (bucket, key) -> {"data", "etag", "content_type", "meta"}
+UPLOADS = {}    # upload_id -> {"bucket", "key", "parts": {n: bytes}, "content_type", "meta"}
+STATS = {"requests": 0, "bytes_in": 0, "bytes_out": 0, "injected_failures": 0}
+
+
+def _xml(root: str, fields: dict) -> bytes:
+    body = "".join(f"<{k}>{escape(str(v))}</{k}>" for k, v in fields.items())
+    return f'<?xml version="1.0" encoding="UTF-8"?><{root}>{body}</{root}>'.encode()
+
+
+def decode_aws_chunked(raw: bytes) -> bytes:
+    """<hex-size>[;chunk-signature=..]\\r\\n<data>\\r\\n ... 0\\r\\n<trailers>\\r\\n"""
+    out = bytearray()
+    pos = 0
+    while True:
+        eol = raw.index(b"\r\n", pos)
+        size = int(raw[pos:eol].split(b";", 1)[0], 16)
+        pos = eol + 2
+        if size == 0:
+            return bytes(out)
+        out += raw[pos:pos + size]
+        pos += size + 2
+
+
+class S3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "s3-standin"
+
+    # -- plumbing --
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _parse(self):
+        url = urlsplit(self.path)
+        parts = unquote(url.path).lstrip("/").split("/", 1)
+        bucket = parts[0]
+        key = parts[1] if len(parts) > 1 else ""
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        return bucket, key, query
+
+    def _body(self) -> bytes:
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        encoding = self.headers.get("Content-Encoding", "")
+        sha = self.headers.get("x-amz-content-sha256", "")
+        if "aws-chunked" in encoding or sha.startswith("STREAMING-"):
+            raw = decode_aws_chunked(raw)
+        with _lock:
+            STATS["bytes_in"] += len(raw)
+        return raw
+
+    def _send(self, status: int, body: bytes = b"", headers: dict | None = None, head_only=False):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if body and "Content-Type" not in (headers or {}):
+            self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and not head_only:
+            self.wfile.write(body)
+            with _lock:
+                STATS["bytes_out"] += len(body)
+
+    def _error(self, status: int, code: str, message: str = "", head_only=False):
+        self._send(status, _xml("Error", {"Code": code, "Message": message or code}), head_only=head_only)
+
+    def _meta_headers(self) -> dict:
+        return {k.lower(): v for k, v in self.headers.items() if k.lower().startswith("x-amz-meta-")}
+
+    def _begin(self) -> bool:
+        """Common per-request work; False if a failure was injected."""
+        with _lock:
+            STATS["requests"] += 1
+        if self.server.latency_s:
+            time.sleep(self.server.latency_s)
+        if self.command == "PUT" and self.server.fail_rate and random.random() < self.server.fail_rate:
+            self._body()  # drain so the connection stays usable
+            with _lock:
+                STATS["injected_failures"] += 1
+            self._error(500, "InternalError", "injected failure")
+            return False
+        return True
+
+    # -- verbs --
+    def do_PUT(self):
+        if not self._begin():
+            return
+        bucket, key, query = self._parse()
+
+        if "uploadId" in query:
+            data = self._body()
+            with _lock:
+                upload = UPLOADS.get(query["uploadId"])
+                if upload is None:
+                    return self._error(404, "NoSuchUpload")
+                upload["parts"][int(query["partNumber"])] = data
+            return self._send(200, headers={"ETag": f'"{hashlib.md5(data).hexdigest()}"'})
+
+        copy_source = self.headers.get("x-amz-copy-source")
+        if copy_source:
+            self._body()
+            src_bucket, _, src_key = unquote(copy_source).lstrip("/").partition("/")
+            with _lock:
+                src = OBJECTS.get((src_bucket, src_key))
+                if src is None:
+                    return self._error(404, "NoSuchKey")
+                obj = dict(src)
+                if self.headers.get("x-amz-metadata-directive", "").upper() == "REPLACE":
+                    obj["meta"] = self._meta_headers()
+                    obj["content_type"] = self.headers.get("Content-Type", obj["content_type"])
+                OBJECTS[(bucket, key)] = obj
+            return self._send(200, _xml("CopyObjectResult", {"ETag": obj["etag"]}))
+
+        data = self._body()
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with _lock:
+            OBJECTS[(bucket, key)] = {
+                "data": data,
+                "etag": etag,
+                "content_type": self.headers.get("Content-Type", "binary/octet-stream"),
+                "meta": self._meta_headers(),
+            }
+        self._send(200, headers={"ETag": etag})
+
+    def do_POST(self):
+        if not self._begin():
+            return
+        bucket, key, query = self._parse()
+        body = self._body()
+
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            with _lock:
+                UPLOADS[upload_id] = {
+                    "bucket": bucket,
+                    "key": key,
+                    "parts": {},
+                    "content_type": self.headers.get("Content-Type", "binary/octet-stream"),
+                    "meta": self._meta_headers(),
+                }
+            return self._send(200, _xml("InitiateMultipartUploadResult",
+                                        {"Bucket": bucket, "Key": key, "UploadId": upload_id}))
+
+        if "uploadId" in query:
+            # Part list in the body is trusted to match what was uploaded
+            del body
+            with _lock:
+                upload = UPLOADS.pop(query["uploadId"], None)
+                if upload is None:
+                    return self._error(404, "NoSuchUpload")
+                numbers = sorted(upload["parts"])
+                data = b"".join(upload["parts"][n] for n in numbers)
+                digests = b"".join(hashlib.md5(upload["parts"][n]).digest() for n in numbers)
+                etag = f'"{hashlib.md5(digests).hexdigest()}-{len(numbers)}"'
+                OBJECTS[(bucket, key)] = {
+                    "data": data,
+                    "etag": etag,
+                    "content_type": upload["content_type"],
+                    "meta": upload["meta"],
+                }
+            return self._send(200, _xml("CompleteMultipartUploadResult",
+                                        {"Bucket": bucket, "Key": key, "ETag": etag}))
+
+        self._error(400, "InvalidRequest", "unsupported POST")
+
+    def _get(self, head_only: bool):
+        if not self._begin():
+            return
+        bucket, key, _ = self._parse()
+        with _lock:
+            obj = OBJECTS.get((bucket, key))
+        if obj is None:
+            return self._error(404, "NoSuchKey", head_only=head_only)
+        headers = {"ETag": obj["etag"], "Content-Type": obj["content_type"], **obj["meta"]}
+        if head_only:
+            # HEAD reports the object size without a body
+            self.send_response(200)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(obj["data"])))
+            self.end_headers()
+            return
+        self._send(200, obj["data"], headers)
+
+    def do_GET(self):
+        self._get(head_only=False)
+
+    def do_HEAD(self):
+        self._get(head_only=True)
+
+    def do_DELETE(self):
+        if not self._begin():
+            return
+        bucket, key, query = self._parse()
+        with _lock:
+            if "uploadId" in query:
+                UPLOADS.pop(query["uploadId"], None)
+            else:
+                OBJECTS.pop((bucket, key), None)
+        self._send(204)
+
+
+def make_server(host: str = "127.0.0.1", port: int = 9000, fail_rate: float = 0.0,
+                latency_ms: float = 0.0, verbose: bool = False) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), S3Handler)
+    server.fail_rate = fail_rate
+    server.latency_s = latency_ms / 1000
+    server.verbose = verbose
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9000)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="share of PUTs answered with 500")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="added delay per request")
+    ap.add_argument("--verbose", action="store_true", help="log every request")
+    args = ap.parse_args()
+
+    server = make_server(args.host, args.port, args.fail_rate, args.latency_ms, args.verbose)
+    print(f"s3 stand-in on http://{args.host}:{args.port} (fail_rate={args.fail_rate}, latency_ms={args.latency_ms})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"stats: {STATS} objects={len(OBJECTS)}")
+
+
+if __name__ == "__main__":
+    main()